@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import xgboost as xgb
+from pandas import DataFrame
+
+from .telemetry import instrument, record_file_read, record_file_written
+
+FEATURE_COLUMNS = [
+    "Ilman lämpötila (degC)",
+    "hour_of_day",
+    "day_of_week",
+    "day_of_year",
+    "is_business_day",
+]
+
+MISSING_BIN = 255
+
+
+class BoostedModel:
+    def __init__(
+        self,
+        feature_columns: Optional[list[str]] = None,
+        max_bin: int = 64,
+        n_estimators: int = 500,
+        learning_rate: float = 0.1,
+        max_depth: int = 6,
+        early_stopping_rounds: int = 20,
+        validation_fraction: float = 0.1,
+        n_jobs: int = -1,
+        cache_dir: Optional[Path] = None,
+        cache_max_bytes: int = 1 << 30,
+    ):
+        """
+        Gradient boosted tree model of generation, from weather and calendar features
+
+        Features are quantized to at most 'max_bin' quantile bins per column before
+        training, and the bin indices are passed to xgboost as a QuantileDMatrix, whose
+        sketch of at most 'max_bin' distinct values per column keeps them as they are.
+        The binned training matrix is cached in 'cache_dir', keyed by hash of the
+        feature data, so repeated trainings on the same data skip binning. Least
+        recently used cache files are removed when the cache exceeds 'cache_max_bytes'.
+
+        :param feature_columns: dataframe columns used as features
+        :param max_bin: maximum number of bins per feature, at most 255
+        :param n_estimators: maximum number of boosting rounds
+        :param learning_rate: boosting learning rate
+        :param max_depth: maximum tree depth
+        :param early_stopping_rounds: stop if validation error has not improved
+            within this many rounds
+        :param validation_fraction: fraction of training data, taken from the end,
+            that is used for early stopping
+        :param n_jobs: number of threads, -1 for all cores
+        :param cache_dir: where to cache binned training matrices, no caching if None
+        :param cache_max_bytes: size limit of binned matrices in 'cache_dir'
+        """
+        assert 1 < max_bin <= MISSING_BIN
+        self.feature_columns = feature_columns or FEATURE_COLUMNS
+        self.max_bin = max_bin
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.early_stopping_rounds = early_stopping_rounds
+        self.validation_fraction = validation_fraction
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+
+    def __eq__(self, o: object) -> bool:
+        if not isinstance(o, BoostedModel):
+            return NotImplemented
+        return (self.feature_columns == o.feature_columns) and (
+            self.booster.save_raw() == o.booster.save_raw()
+        )
+
+    def feature_matrix(self, df: DataFrame) -> np.ndarray:
+        """Model input from dataframe: contiguous float32 matrix of feature columns"""
+        return np.ascontiguousarray(df[self.feature_columns].to_numpy(np.float32))
+
+    @instrument()
+    def fit(self, X: np.ndarray, y: np.ndarray):
+        logging.info("Training boosted model...")
+        binned = self._binned_training_matrix(X)
+        n_valid = int(len(binned) * self.validation_fraction)
+        n_train = len(binned) - n_valid
+        d_train = self._dmatrix(binned[:n_train], y[:n_train])
+
+        evals = []
+        early_stopping_rounds = None
+        if n_valid > 0:
+            d_valid = self._dmatrix(binned[n_train:], y[n_train:], ref=d_train)
+            evals = [(d_valid, "validation")]
+            early_stopping_rounds = self.early_stopping_rounds
+
+        self.booster = xgb.train(
+            {
+                "tree_method": "hist",
+                "max_bin": self.max_bin,
+                "eta": self.learning_rate,
+                "max_depth": self.max_depth,
+                "nthread": self._n_threads,
+            },
+            d_train,
+            num_boost_round=self.n_estimators,
+            evals=evals,
+            early_stopping_rounds=early_stopping_rounds,
+            verbose_eval=False,
+        )
+        if early_stopping_rounds is not None:
+            logging.info(f"Best iteration {self.booster.best_iteration}")
+
+    @instrument()
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        n_rounds = getattr(self.booster, "best_iteration", self.n_estimators - 1) + 1
+        predictions = self.booster.inplace_predict(
+            self._bin(X), iteration_range=(0, n_rounds), missing=MISSING_BIN
+        )
+        return predictions.astype(np.float64)
+
+    @property
+    def _n_threads(self) -> int:
+        return (os.cpu_count() or 1) if self.n_jobs == -1 else self.n_jobs
+
+    def _dmatrix(
+        self,
+        binned: np.ndarray,
+        y: np.ndarray,
+        ref: Optional[xgb.QuantileDMatrix] = None,
+    ) -> xgb.QuantileDMatrix:
+        return xgb.QuantileDMatrix(
+            binned,
+            label=y,
+            missing=MISSING_BIN,
+            max_bin=self.max_bin,
+            ref=ref,
+            nthread=self._n_threads,
+        )
+
+    def _binned_training_matrix(self, X: np.ndarray) -> np.ndarray:
+        """
+        Fit bin edges to 'X' and return binned matrix, using cache if available
+        """
+        cache_path = None
+        if self.cache_dir is not None:
+            digest = hashlib.sha256(X.tobytes())
+            digest.update(f"{X.shape}{X.dtype}{self.max_bin}".encode())
+            cache_path = self.cache_dir / f"binned-{digest.hexdigest()}.npz"
+            if cache_path.is_file():
+                logging.info(f"Load binned matrix from {cache_path}")
+                with np.load(cache_path) as cached:
+                    self.bin_edges = cached["bin_edges"]
+                    binned = cached["binned"]
+                record_file_read(cache_path)
+                os.utime(cache_path)
+                return binned
+
+        self.bin_edges = self._fit_bin_edges(X)
+        binned = self._bin(X)
+
+        if cache_path is not None:
+            logging.info(f"Save binned matrix to {cache_path}")
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(cache_path, bin_edges=self.bin_edges, binned=binned)
+            record_file_written(cache_path)
+            self._evict_cache()
+        return binned
+
+    def _evict_cache(self):
+        """Remove least recently used binned matrices beyond 'cache_max_bytes'"""
+        cached = [(path, path.stat()) for path in self.cache_dir.glob("binned-*.npz")]
+        cached.sort(key=lambda item: item[1].st_mtime, reverse=True)
+        total = 0
+        for path, stat in cached:
+            total += stat.st_size
+            if total > self.cache_max_bytes:
+                logging.info(f"Evict binned matrix {path}")
+                path.unlink(missing_ok=True)
+
+    def _fit_bin_edges(self, X: np.ndarray) -> np.ndarray:
+        """
+        Quantile bin edges for each feature column
+
+        :return: array of shape (n_features, max_bin - 1), padded with +inf
+        """
+        quantiles = np.linspace(0, 1, self.max_bin + 1)[1:-1]
+        edges = np.full((X.shape[1], self.max_bin - 1), np.inf, dtype=np.float32)
+        for j in range(X.shape[1]):
+            column = X[:, j]
+            column = column[~np.isnan(column)]
+            if len(column) == 0:
+                continue
+            column_edges = np.unique(np.quantile(column, quantiles))
+            edges[j, : len(column_edges)] = column_edges
+        return edges
+
+    def _bin(self, X: np.ndarray) -> np.ndarray:
+        """Map features to bin indices, missing values to MISSING_BIN"""
+        binned = np.empty(X.shape, dtype=np.uint8)
+        for j in range(X.shape[1]):
+            binned[:, j] = np.searchsorted(self.bin_edges[j], X[:, j], side="right")
+            binned[np.isnan(X[:, j]), j] = MISSING_BIN
+        return binned
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from pandas import DataFrame
+from scipy import stats
+
+from .boosted import BoostedModel
+from .evaluate import MetricsAccumulator
+from .helpers import add_utc_epoch_argument, load_intermediate
+from .model import load_model
+from .sweep import SharedFrame
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+
+LOSSES = {
+    "squared": np.square,
+    "absolute": np.abs,
+}
+
+_worker_test: list[DataFrame] = []
+_worker_memory: list[SharedMemory] = []
+_worker_features: dict[tuple, np.ndarray] = {}
+
+
+def _attach_worker(frame: SharedFrame):
+    df, shm = frame.attach()
+    _worker_test.append(df)
+    _worker_memory.append(shm)
+
+
+def _predict_artifact(path: Path) -> tuple[dict[str, float], np.ndarray]:
+    """
+    Predict test set with model artifact in worker process
+
+    Feature matrices are cached per worker, by model type and feature columns.
+
+    :return: metrics, as from :func:`evaluate`, and predictions
+    """
+    df_test = _worker_test[0]
+    model = load_model(path)
+    if isinstance(model, BoostedModel):
+        # Artifacts are predicted in parallel, use one thread each
+        model.n_jobs = 1
+        model.booster.set_param("nthread", 1)
+
+    key = (type(model).__name__, tuple(model.feature_columns))
+    if key not in _worker_features:
+        _worker_features[key] = model.feature_matrix(df_test)
+    predictions = np.asarray(
+        model.predict(_worker_features[key]), dtype=np.float64
+    ).ravel()
+
+    metrics = MetricsAccumulator()
+    metrics.update(df_test["dh_MWh"].to_numpy(), predictions)
+    return metrics.result(), predictions
+
+
+def newey_west_lag(n: int) -> int:
+    """Default bandwidth of Newey-West estimator, floor(4 (n / 100)^(2/9))"""
+    return int(4 * (n / 100) ** (2 / 9))
+
+
+def diebold_mariano(
+    losses: np.ndarray, max_lag: Optional[int] = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pairwise Diebold-Mariano tests of equal predictive accuracy
+
+    The variance of each loss differential is estimated with Newey-West weights.
+    Autocovariances of all differentials are derived from cross-autocovariances of
+    the loss series, so all pairs are tested with (max_lag + 1) matrix products.
+
+    :param losses: loss series of each model, shape (models, observations)
+    :param max_lag: lag truncation of Newey-West estimator, see :func:`newey_west_lag`
+    :return: mean loss differential, test statistic and two-sided p-value, each of
+        shape (models, models), row model minus column model
+    """
+    n_models, n = losses.shape
+    if max_lag is None:
+        max_lag = newey_west_lag(n)
+    mean = losses.mean(axis=1)
+    centered = losses - mean[:, np.newaxis]
+
+    long_run = centered @ centered.T / n
+    for lag in range(1, max_lag + 1):
+        weight = 1 - lag / (max_lag + 1)
+        autocovariance = centered[:, lag:] @ centered[:, :-lag].T / n
+        long_run += weight * (autocovariance + autocovariance.T)
+
+    variance = np.diag(long_run)
+    difference_variance = variance[:, np.newaxis] + variance - 2 * long_run
+    mean_difference = mean[:, np.newaxis] - mean
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        statistic = mean_difference / np.sqrt(difference_variance / n)
+    statistic[difference_variance <= 0] = np.nan
+    p_value = 2 * stats.norm.sf(np.abs(statistic))
+    p_value[np.isnan(statistic)] = 1.0
+    return mean_difference, statistic, p_value
+
+
+@instrument()
+def compare_models(
+    df_test: DataFrame,
+    model_paths: list[Path],
+    n_workers: Optional[int] = None,
+    rank_by: str = "root_mean_squared_error",
+    loss: str = "squared",
+    max_lag: Optional[int] = None,
+) -> tuple[DataFrame, DataFrame]:
+    """
+    Evaluate model artifacts on one test set in a process pool, and compare them
+
+    Numeric test columns are placed in shared memory once; worker processes attach
+    to them, and compute each distinct feature matrix once.
+
+    :param df_test: test dataframe
+    :param model_paths: locations of model artifacts
+    :param n_workers: number of worker processes, defaults to number of CPUs
+    :param rank_by: metric, by which models are ranked, smallest first and
+        missing values last
+    :param loss: loss of Diebold-Mariano tests, one of :data:`LOSSES`
+    :param max_lag: lag truncation of Newey-West estimator, see :func:`diebold_mariano`
+    :return: ranked metrics table, one row per model, and pairwise test table, one
+        row per pair of models, better ranked model first
+    """
+    logging.info(f"Compare {len(model_paths)} models")
+    columns = list(df_test.select_dtypes("number").columns)
+    shared_test, shm_test = SharedFrame.create(df_test, columns)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers or os.cpu_count(),
+            initializer=_attach_worker,
+            initargs=(shared_test,),
+        ) as executor:
+            results = list(executor.map(_predict_artifact, model_paths))
+    finally:
+        shm_test.close()
+        shm_test.unlink()
+
+    ranking = DataFrame(
+        [
+            dict(model=str(path), **metrics)
+            for path, (metrics, _) in zip(model_paths, results)
+        ]
+    )
+    order = ranking[rank_by].rank(method="first", na_option="bottom").to_numpy(int) - 1
+    ranking.insert(0, "rank", order + 1)
+
+    actual = df_test["dh_MWh"].to_numpy(dtype=np.float64)
+    losses = LOSSES[loss](np.stack([p for _, p in results]) - actual)
+    mean_difference, statistic, p_value = diebold_mariano(losses, max_lag=max_lag)
+
+    by_rank = np.argsort(order)
+    pairs: list[dict[str, Any]] = [
+        {
+            "model_a": str(model_paths[i]),
+            "model_b": str(model_paths[j]),
+            "mean_loss_difference": mean_difference[i, j],
+            "dm_statistic": statistic[i, j],
+            "p_value": p_value[i, j],
+        }
+        for i, j in itertools.combinations(by_rank, 2)
+    ]
+    return ranking.sort_values("rank").reset_index(drop=True), DataFrame(pairs)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Compare model artifacts on test data",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--test-path",
+        help="Where to load test dataframe",
+        type=Path,
+        default=Path("data/processed/test.feather"),
+    )
+    parser.add_argument(
+        "--model-paths",
+        help="Where to read model artifacts",
+        type=Path,
+        nargs="+",
+        required=True,
+    )
+    parser.add_argument(
+        "--rank-by",
+        help="Metric, by which models are ranked",
+        choices=[
+            "mean_absolute_error",
+            "mean_absolute_percentage_error",
+            "root_mean_squared_error",
+        ],
+        default="root_mean_squared_error",
+    )
+    parser.add_argument(
+        "--loss",
+        help="Loss function of Diebold-Mariano tests",
+        choices=list(LOSSES),
+        default="squared",
+    )
+    parser.add_argument(
+        "--max-lag",
+        help="Lag truncation of Newey-West variance, default from number of observations",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to save ranked metrics table",
+        type=Path,
+        default=Path("output/compare.csv"),
+    )
+    parser.add_argument(
+        "--pairwise-output",
+        help="Where to save pairwise test table",
+        type=Path,
+        default=Path("output/compare-pairwise.csv"),
+    )
+    parser.add_argument(
+        "--workers", help="Number of worker processes", type=int, default=None
+    )
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "compare")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("compare", profile_path=args.profile_path) as telemetry:
+        df: DataFrame = load_intermediate(
+            path=args.test_path.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+        ranked, pairwise = compare_models(
+            df,
+            [p.absolute() for p in args.model_paths],
+            n_workers=args.workers,
+            rank_by=args.rank_by,
+            loss=args.loss,
+            max_lag=args.max_lag,
+        )
+
+        logging.info(f"Save comparison to {args.output} and {args.pairwise_output}")
+        ranked.to_csv(args.output.absolute(), index=False)
+        pairwise.to_csv(args.pairwise_output.absolute(), index=False)
+
+    telemetry.save(args.telemetry_path.absolute())
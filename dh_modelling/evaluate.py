@@ -2,6 +2,7 @@ import argparse
 import json
 import logging
 from pathlib import Path
+from typing import Union
 
 import numpy as np
 from pandas import DataFrame
@@ -11,15 +12,18 @@ from sklearn.metrics import (
     mean_squared_error,
 )
 
-from .helpers import load_intermediate
+from .boosted import BoostedModel
+from .helpers import add_utc_epoch_argument, load_intermediate
 from .model import Model, load_model
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
 
 
-def evaluate(model: Model, df: DataFrame) -> dict[str, float]:
+@instrument()
+def evaluate(model: Union[Model, BoostedModel], df: DataFrame) -> dict[str, float]:
     logging.info("Evaluating model performance")
     actual: np.ndarray = df["dh_MWh"]
 
-    X: np.ndarray = df["Ilman lämpötila (degC)"].to_numpy()
+    X: np.ndarray = model.feature_matrix(df)
 
     predictions: np.ndarray = model.predict(X)
 
@@ -34,6 +38,35 @@ def evaluate(model: Model, df: DataFrame) -> dict[str, float]:
     }
 
 
+class MetricsAccumulator:
+    """
+    Compute metrics of :func:`evaluate` over a stream of prediction batches
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.absolute_error = 0.0
+        self.absolute_percentage_error = 0.0
+        self.squared_error = 0.0
+
+    def update(self, actual: np.ndarray, predictions: np.ndarray):
+        errors = np.asarray(actual, dtype=np.float64) - predictions
+        epsilon = np.finfo(np.float64).eps
+        self.n += len(errors)
+        self.absolute_error += np.abs(errors).sum()
+        self.absolute_percentage_error += (
+            np.abs(errors) / np.maximum(np.abs(actual), epsilon)
+        ).sum()
+        self.squared_error += np.square(errors).sum()
+
+    def result(self) -> dict[str, float]:
+        return {
+            "mean_absolute_error": self.absolute_error / self.n,
+            "mean_absolute_percentage_error": self.absolute_percentage_error / self.n,
+            "root_mean_squared_error": float(np.sqrt(self.squared_error / self.n)),
+        }
+
+
 def save_metrics(metrics: dict, path: Path):
     logging.info(f"Save metrics to {path=}")
     with open(path, "w") as f:
@@ -66,11 +99,21 @@ if __name__ == "__main__":
         default=Path("output/score.json"),
     )
 
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "evaluate")
+
     args = parser.parse_args()
 
-    df_test: DataFrame = load_intermediate(path=args.test_path.absolute())
+    with StageTelemetry("evaluate", profile_path=args.profile_path) as telemetry:
+        df_test: DataFrame = load_intermediate(
+            path=args.test_path.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+
+        model = load_model(args.model_path.absolute())
+        metrics: dict = evaluate(model, df_test)
 
-    model = load_model(args.model_path.absolute())
-    metrics: dict = evaluate(model, df_test)
+        save_metrics(metrics, args.metrics_path.absolute())
 
-    save_metrics(metrics, args.metrics_path.absolute())
+    telemetry.save(args.telemetry_path.absolute())
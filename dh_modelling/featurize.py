@@ -2,50 +2,112 @@ import argparse
 import logging
 from datetime import timezone
 from pathlib import Path
+from typing import Optional, Union
 
 import holidays
 import numpy as np
 from pandas import DataFrame, DatetimeIndex, Timedelta, Timestamp
 
-from .helpers import load_intermediate, save_intermediate
+from .helpers import add_utc_epoch_argument, load_intermediate, save_intermediate
+from .schema import FEATURES
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+from .timeaxis import calendar_fields
 
+CALENDAR_COLUMNS = [
+    "hour_of_day",
+    "day_of_week",
+    "day_of_year",
+    "epoch_seconds",
+    "is_business_day",
+]
 
-def featurize(df: DataFrame) -> DataFrame:
+
+@instrument()
+def featurize(
+    df: DataFrame,
+    local_timezone: str = "Europe/Helsinki",
+    holiday_dates: Optional[np.ndarray] = None,
+) -> DataFrame:
     """
     Create features from dataframe
 
+    Index is either timezone-aware DatetimeIndex, or int64 UTC epoch seconds. For the
+    latter, calendar features are computed in 'local_timezone' from a vectorized UTC
+    offset lookup, without creating timezone-aware objects.
+
     :param df: input dataframe
-    :return: modified dataframe
+    :param local_timezone: timezone of calendar features, for epoch seconds index
+    :param holiday_dates: precomputed holidays, see :func:`is_business_day`
+    :return: modified dataframe, features with dtypes of :data:`.schema.FEATURES`
     """
-    assert isinstance(df.index, DatetimeIndex)
-    df["hour_of_day"] = df.index.hour
-    df["day_of_week"] = df.index.day_of_week
-    df["day_of_year"] = df.index.dayofyear
-    df["epoch_seconds"] = (
-        df.index.tz_convert(tz=timezone.utc) - Timestamp("1970-01-01", tz=timezone.utc)
-    ) // Timedelta("1 second")
-    df["is_business_day"] = is_business_day(df.index).astype(np.int32)
+    if not isinstance(df.index, DatetimeIndex):
+        epoch = df.index.to_numpy(np.int64)
+        fields = calendar_fields(epoch, local_timezone)
+        df["hour_of_day"] = fields["hour_of_day"]
+        df["day_of_week"] = fields["day_of_week"]
+        df["day_of_year"] = fields["day_of_year"]
+        df["epoch_seconds"] = epoch
+        df["is_business_day"] = is_business_day(
+            fields["date"], holiday_dates=holiday_dates
+        )
+    else:
+        df["hour_of_day"] = df.index.hour
+        df["day_of_week"] = df.index.day_of_week
+        df["day_of_year"] = df.index.dayofyear
+        df["epoch_seconds"] = (
+            df.index.tz_convert(tz=timezone.utc)
+            - Timestamp("1970-01-01", tz=timezone.utc)
+        ) // Timedelta("1 second")
+        df["is_business_day"] = is_business_day(df.index, holiday_dates=holiday_dates)
+
+    for column in CALENDAR_COLUMNS:
+        df[column] = df[column].astype(FEATURES[column].dtype)
     return df
 
 
-def is_business_day(idx: DatetimeIndex, country: str = "Finland") -> np.ndarray:
+@instrument()
+def is_business_day(
+    idx: Union[DatetimeIndex, np.ndarray],
+    country: str = "Finland",
+    holiday_dates: Optional[np.ndarray] = None,
+) -> np.ndarray:
     """
     Determine if timestamps are within business days
 
-    :param idx: datetime index
+    :param idx: datetime index, or datetime64[D] array of local dates
     :param country: string representation of country
+    :param holiday_dates: holidays covering dates of 'idx', e.g. from
+        :func:`holiday_calendar`; looked up for 'country' if None
     :return: boolean array of the same shape as 'idx', containing True for each valid business day
     """
-    holiday_calendar = holidays.CountryHoliday(country)
-    min_date = idx.min().date()
-    max_date = idx.max().date()
-    holidays_in_range: list = holiday_calendar[min_date:max_date]
+    if isinstance(idx, DatetimeIndex):
+        idx_dates: np.ndarray = np.array(idx.date, dtype=np.datetime64)
+    else:
+        idx_dates = np.asarray(idx, dtype="datetime64[D]")
 
-    bcal = np.busdaycalendar(holidays=np.array(holidays_in_range, dtype=np.datetime64))
-    idx_dates: np.ndarray = np.array(idx.date, dtype=np.datetime64)
+    if holiday_dates is None:
+        country_holidays = holidays.CountryHoliday(country)
+        min_date = idx_dates.min().astype(object)
+        # Slice end is exclusive
+        max_date = (idx_dates.max() + 1).astype(object)
+        holiday_dates = np.array(
+            country_holidays[min_date:max_date], dtype="datetime64[D]"
+        )
+
+    bcal = np.busdaycalendar(holidays=holiday_dates)
     return np.is_busday(idx_dates, busdaycal=bcal)
 
 
+def holiday_calendar(country: str, first_year: int, last_year: int) -> np.ndarray:
+    """
+    Holidays of country within years, to share between :func:`is_business_day` calls
+
+    :return: sorted datetime64[D] array of holidays
+    """
+    calendar = holidays.CountryHoliday(country, years=range(first_year, last_year + 1))
+    return np.array(sorted(calendar), dtype="datetime64[D]")
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
 
@@ -66,8 +128,16 @@ if __name__ == "__main__":
         default=Path("data/processed/train.feather"),
     )
 
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "featurize")
+
     args = parser.parse_args()
 
-    df_master: DataFrame = load_intermediate(path=args.input.absolute())
-    df_train: DataFrame = featurize(df_master)
-    save_intermediate(df_train, path=args.output.absolute())
+    with StageTelemetry("featurize", profile_path=args.profile_path) as telemetry:
+        df_master: DataFrame = load_intermediate(
+            path=args.input.absolute(), utc_epoch=args.utc_epoch, schema="checked"
+        )
+        df_train: DataFrame = featurize(df_master)
+        save_intermediate(df_train, path=args.output.absolute(), schema="features")
+
+    telemetry.save(args.telemetry_path.absolute())
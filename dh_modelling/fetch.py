@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+import urllib3
+
+from .prepare import FmiMeta
+from .telemetry import (
+    StageTelemetry,
+    add_telemetry_arguments,
+    instrument,
+    record_file_written,
+)
+
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+META_URL_TEMPLATE = "{base_url}/csv-meta-{file_id}.csv"
+DATA_URL_TEMPLATE = "{base_url}/csv-{file_id}.csv"
+RETRIED_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    urllib3.exceptions.HTTPError,
+)
+
+
+class FetchError(IOError):
+    """Unexpected response from download server"""
+
+
+@dataclass
+class FetchResult:
+    file_id: str
+    status: str
+    bytes_received: int = 0
+
+
+class FmiFetcher:
+    def __init__(
+        self,
+        base_url: str,
+        directory: Path,
+        max_concurrency: int = 4,
+        retries: int = 3,
+        timeout: float = 30,
+        meta_url_template: str = META_URL_TEMPLATE,
+        data_url_template: str = DATA_URL_TEMPLATE,
+    ):
+        """
+        Download FMI weather files concurrently, in the layout of :meth:`FmiData.read_fmi_files`
+
+        For each file id, metadata and data are downloaded from URLs given by
+        'meta_url_template' and 'data_url_template', formatted with 'base_url' and
+        'file_id', and saved as 'csv-meta-{id}.csv' and 'csv-{id}.csv'. Files are
+        skipped, if local metadata has the same data creation time
+        ('Datan luontihetki') as the remote one.
+
+        Data is first written to '.part' files, which are renamed in place when
+        complete; the metadata file is written last. Interrupted downloads are
+        resumed with HTTP range requests, as long as remote metadata is unchanged.
+
+        Downloads run in 'max_concurrency' threads, each with its own
+        :class:`requests.Session`, whose connections are reused across files.
+
+        :param base_url: URL of directory, where files are downloaded from
+        :param directory: local directory, where files are saved
+        :param max_concurrency: maximum number of simultaneous downloads
+        :param retries: number of retries of a failed download
+        :param timeout: timeout in seconds for connecting and for each read
+        :param meta_url_template: URL template of metadata files
+        :param data_url_template: URL template of data files
+        """
+        self.base_url = base_url.rstrip("/")
+        self.directory = directory
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.meta_url_template = meta_url_template
+        self.data_url_template = data_url_template
+
+    @instrument()
+    def fetch(self, file_ids: list[str]) -> list[FetchResult]:
+        """
+        Download files of given ids
+
+        All downloads are attempted, before the first error, if any, is raised.
+
+        :param file_ids: ids of files
+        :return: result of each file: 'skipped', 'downloaded' or 'resumed'
+        """
+        logging.info(f"Fetch {len(file_ids)} FMI files from {self.base_url}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        local = threading.local()
+        sessions: list[requests.Session] = []
+        lock = threading.Lock()
+
+        def fetch_one(file_id: str) -> FetchResult:
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                with lock:
+                    sessions.append(local.session)
+            return self._fetch_with_retries(local.session, file_id)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = [executor.submit(fetch_one, file_id) for file_id in file_ids]
+        finally:
+            for session in sessions:
+                session.close()
+
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise errors[0]
+        return [f.result() for f in futures]
+
+    def _fetch_with_retries(
+        self, session: requests.Session, file_id: str
+    ) -> FetchResult:
+        for attempt in range(self.retries + 1):
+            try:
+                return self._fetch_file(session, file_id)
+            except RETRIED_ERRORS:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"Download of {file_id=} interrupted, retrying")
+                time.sleep(0.1 * 2**attempt)
+        raise AssertionError("unreachable")
+
+    def _fetch_file(self, session: requests.Session, file_id: str) -> FetchResult:
+        meta_path = self.directory / f"csv-meta-{file_id}.csv"
+        data_path = self.directory / f"csv-{file_id}.csv"
+        partial_meta_path = meta_path.with_name(meta_path.name + PARTIAL_SUFFIX)
+        partial_data_path = data_path.with_name(data_path.name + PARTIAL_SUFFIX)
+
+        response = session.get(
+            self._url(self.meta_url_template, file_id), timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise FetchError(f"Metadata of {file_id=}: HTTP {response.status_code}")
+        meta_content = response.content
+        remote_meta = FmiMeta.from_string(meta_content.decode("utf8"))
+
+        if (
+            meta_path.is_file()
+            and data_path.is_file()
+            and FmiMeta.from_file(meta_path).creation_time == remote_meta.creation_time
+        ):
+            logging.info(f"Skip unchanged {file_id=}")
+            return FetchResult(file_id, "skipped")
+
+        if not (
+            partial_meta_path.is_file()
+            and partial_meta_path.read_bytes() == meta_content
+        ):
+            partial_data_path.unlink(missing_ok=True)
+            partial_meta_path.write_bytes(meta_content)
+        offset = partial_data_path.stat().st_size if partial_data_path.is_file() else 0
+
+        # Ranges refer to the file as stored, not to a compressed transfer
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        received = 0
+        with session.get(
+            self._url(self.data_url_template, file_id),
+            headers=headers,
+            stream=True,
+            timeout=self.timeout,
+        ) as response:
+            restart = response.status_code == 416
+            if restart:
+                # Partial file is not a prefix of remote file: discard the error
+                # body, so the connection is reused, and the partial file, and
+                # download from the start
+                response.content
+                partial_data_path.unlink()
+            elif response.status_code not in (200, 206):
+                raise FetchError(f"Data of {file_id=}: HTTP {response.status_code}")
+            else:
+                if response.status_code == 200:
+                    offset = 0
+                # Unlike iter_content, read1 returns data as it arrives, so that
+                # all of it is kept in the partial file if the connection drops
+                with open(partial_data_path, "ab" if offset else "wb") as f:
+                    while chunk := response.raw.read1(CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+        if restart:
+            return self._fetch_file(session, file_id)
+
+        os.replace(partial_data_path, data_path)
+        os.replace(partial_meta_path, meta_path)
+        record_file_written(data_path)
+        record_file_written(meta_path)
+        logging.info(f"Fetched {file_id=}, {received} bytes")
+        return FetchResult(file_id, "resumed" if offset else "downloaded", received)
+
+    def _url(self, template: str, file_id: str) -> str:
+        return template.format(base_url=self.base_url, file_id=file_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Download FMI weather files",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--base-url",
+        help="URL, from where files are downloaded, see --meta-url-template",
+        type=str,
+        required=True,
+    )
+    parser.add_argument(
+        "--meta-url-template",
+        help="URL of metadata files, formatted with {base_url} and {file_id}",
+        type=str,
+        default=META_URL_TEMPLATE,
+    )
+    parser.add_argument(
+        "--data-url-template",
+        help="URL of data files, formatted with {base_url} and {file_id}",
+        type=str,
+        default=DATA_URL_TEMPLATE,
+    )
+    parser.add_argument(
+        "--ids", help="File ids to download", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Directory, where to save FMI files",
+        type=Path,
+        default=Path("data/raw/fmi"),
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        help="Maximum number of simultaneous downloads",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--retries", help="Number of retries of failed download", type=int, default=3
+    )
+    add_telemetry_arguments(parser, "fetch")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("fetch", profile_path=args.profile_path) as telemetry:
+        fetcher = FmiFetcher(
+            args.base_url,
+            args.output_dir.absolute(),
+            max_concurrency=args.max_concurrency,
+            retries=args.retries,
+            meta_url_template=args.meta_url_template,
+            data_url_template=args.data_url_template,
+        )
+        for result in fetcher.fetch(args.ids):
+            logging.info(f"{result.file_id}: {result.status}")
+
+    telemetry.save(args.telemetry_path.absolute())
@@ -1,30 +1,113 @@
+from __future__ import annotations
+
+import argparse
 import logging
 from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+from pandas import DataFrame, DatetimeIndex, Index, read_feather
 
-from pandas import DataFrame, DatetimeIndex, read_feather
+from .schema import apply_schema, validate_schema
+from .telemetry import instrument, record_file_read, record_file_written
+from .timeaxis import to_datetime_index, to_epoch_seconds
 
 
-def save_intermediate(df: DataFrame, path: Path, reset_datetime_index: bool = True):
+@instrument()
+def save_intermediate(
+    df: DataFrame,
+    path: Path,
+    reset_datetime_index: bool = True,
+    schema: Optional[str] = None,
+):
     """
     Save intermediate representation of dataframe to disk
 
     :param df: dataframe to be saved
     :param path: file location
-    :param reset_datetime_index: reset datetime index to normal column, convert timestamp to UTC
+    :param reset_datetime_index: reset datetime index to normal column, convert timestamp to UTC;
+        int64 index is taken as UTC epoch seconds
+    :param schema: if given, validate and cast columns to schema, see :mod:`.schema`
     """
     logging.info(f"Save dataset to {path}")
+    if schema is not None:
+        df = apply_schema(df, schema)
     if reset_datetime_index:
-        index_name: str = df.index.name
-        df = df.reset_index()
-        df[index_name] = DatetimeIndex(df[index_name]).tz_convert("UTC")
+        df = _reset_datetime_index(df)
     df.to_feather(path)
+    record_file_written(path)
+
+
+class IntermediateWriter:
+    def __init__(
+        self,
+        path: Path,
+        reset_datetime_index: bool = True,
+        schema: Optional[str] = None,
+    ):
+        """
+        Save intermediate representation of dataframe to disk, batch by batch
+
+        The file is in the same format as written by :func:`save_intermediate`, and
+        can be read with :func:`load_intermediate`. All batches must have the same
+        columns and dtypes.
+
+        :param path: file location
+        :param reset_datetime_index: reset datetime index to normal column, convert timestamp to UTC
+        :param schema: if given, validate and cast columns to schema, see :mod:`.schema`
+        """
+        self.path = path
+        self.reset_datetime_index = reset_datetime_index
+        self.schema = schema
+        self._writer: Optional[pa.ipc.RecordBatchFileWriter] = None
+
+    def __enter__(self) -> IntermediateWriter:
+        logging.info(f"Save dataset in batches to {self.path}")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
+    def write(self, df: DataFrame):
+        if self.schema is not None:
+            df = apply_schema(df, self.schema)
+        if self.reset_datetime_index:
+            df = _reset_datetime_index(df)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pa.ipc.new_file(
+                str(self.path),
+                table.schema,
+                options=pa.ipc.IpcWriteOptions(compression="lz4"),
+            )
+        self._writer.write_table(table)
 
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            record_file_written(self.path)
+
+
+def _reset_datetime_index(df: DataFrame) -> DataFrame:
+    index_name: str = df.index.name
+    if isinstance(df.index, DatetimeIndex):
+        utc_index = df.index.tz_convert("UTC")
+    else:
+        utc_index = to_datetime_index(df.index.to_numpy())
+    df = df.reset_index(drop=True)
+    df.insert(0, index_name, utc_index)
+    return df
+
+
+@instrument()
 def load_intermediate(
     path: Path,
     set_datetime_index: bool = True,
     date_time_column: str = "date_time",
     timezone: str = "Europe/Helsinki",
+    utc_epoch: bool = False,
+    schema: Optional[str] = None,
 ) -> DataFrame:
     """
     Load dataset from disk
@@ -33,11 +116,32 @@ def load_intermediate(
     :param set_datetime_index: set DatetimeIndex from column 'date_time_column' with timezone 'timezone'
     :param date_time_column: column, which should be set as index
     :param timezone: timezone, at which date_time_column is converted
+    :param utc_epoch: instead of DatetimeIndex, set int64 index of UTC epoch seconds,
+        without timezone conversion
+    :param schema: if given, validate columns against schema, see :mod:`.schema`
     :return: loaded dataframe, with 'date_time_column' as index
     """
     logging.info(f"Load dataset from {path}")
     df: DataFrame = read_feather(path)
+    record_file_read(path)
+    if schema is not None:
+        validate_schema(df, schema)
     if set_datetime_index:
-        df.index = DatetimeIndex(df[date_time_column]).tz_convert(timezone)
+        index = DatetimeIndex(df[date_time_column])
+        if utc_epoch:
+            df.index = Index(to_epoch_seconds(index), name=date_time_column)
+        else:
+            df.index = index.tz_convert(timezone)
         df = df.drop(date_time_column, axis=1)
     return df
+
+
+def add_utc_epoch_argument(parser: argparse.ArgumentParser):
+    """
+    Add command line flag '--utc-epoch', see 'utc_epoch' of :func:`load_intermediate`
+    """
+    parser.add_argument(
+        "--utc-epoch",
+        help="Index data by UTC epoch seconds, instead of local time DatetimeIndex",
+        action="store_true",
+    )
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-$")
+
+
+class MockFmiServer:
+    def __init__(
+        self,
+        directory: Path,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        fail_after_bytes: Optional[int] = None,
+    ):
+        """
+        Local stand-in of FMI download server, serving files from a directory
+
+        Files are served over HTTP/1.1 with persistent connections, and single
+        'bytes=N-' ranges are supported, as needed by :mod:`dh_modelling.fetch`.
+        Requests and opened connections are recorded for inspection in tests.
+
+        :param directory: directory, whose files are served at root path
+        :param host: address to listen at
+        :param port: port to listen at, 0 picks a free port
+        :param fail_after_bytes: if given, first response with body to each path is
+            cut after this many bytes, and the connection is dropped
+        """
+        self.directory = directory
+        self.fail_after_bytes = fail_after_bytes
+        self.requests: list[tuple[str, Optional[str]]] = []
+        self.connections = 0
+        self._failed_paths: set[str] = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> MockFmiServer:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        logging.info(f"Serve {self.directory} at {self.url}")
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.requests.append((self.path, range_header))
+
+                path = server.directory / self.path.lstrip("/")
+                if "/" in self.path.lstrip("/") or not path.is_file():
+                    self.send_error(404)
+                    return
+                content = path.read_bytes()
+
+                start = 0
+                if range_header is not None:
+                    match = RANGE_PATTERN.match(range_header)
+                    if match is None or int(match.group(1)) >= len(content):
+                        body = b"Requested range not satisfiable\n"
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(content)}")
+                        self.send_header("Content-Type", "text/plain")
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                        return
+                    start = int(match.group(1))
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range",
+                        f"bytes {start}-{len(content) - 1}/{len(content)}",
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Length", str(len(content) - start))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+                body = content[start:]
+                with server._lock:
+                    fail = (
+                        server.fail_after_bytes is not None
+                        and len(body) > server.fail_after_bytes
+                        and self.path not in server._failed_paths
+                    )
+                    if fail:
+                        server._failed_paths.add(self.path)
+                if fail:
+                    self.wfile.write(body[: server.fail_after_bytes])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Serve FMI files from a directory, as stand-in of FMI download server",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--directory",
+        help="Directory, whose files are served",
+        type=Path,
+        default=Path("data/raw/fmi"),
+    )
+    parser.add_argument("--port", help="Port to listen at", type=int, default=8000)
+
+    args = parser.parse_args()
+
+    mock_server = MockFmiServer(args.directory.absolute(), port=args.port)
+    mock_server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -1,26 +1,135 @@
 import logging
 from pathlib import Path
+from typing import Iterable
 
 import numpy as np
 from joblib import dump, load
+from pandas import DataFrame
 from scipy import optimize
 
+from .telemetry import instrument, record_file_read, record_file_written
+
 
 class Model:
+    feature_columns = ["Ilman lämpötila (degC)"]
+
+    def __init__(self, hinge_temperature: float = 17, forgetting_factor: float = 1.0):
+        """
+        Piecewise linear model of generation as a function of air temperature
+
+        :param hinge_temperature: temperature (degC) above which generation is constant
+        :param forgetting_factor: weight decay per observation in online updates,
+            1 weights all observations equally, see :meth:`partial_fit`
+        """
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("Forgetting factor must be in (0, 1]")
+        self.hinge_temperature = hinge_temperature
+        self.forgetting_factor = forgetting_factor
+        self.xtx = np.zeros((2, 2))
+        self.xty = np.zeros(2)
+
+    def __setstate__(self, state: dict):
+        # Models saved before configurable hinge have the fixed hinge of 17 degC,
+        # and models saved before online updates have no forgetting factor or state
+        state.setdefault("hinge_temperature", 17)
+        state.setdefault("forgetting_factor", 1.0)
+        state.setdefault("xtx", None)
+        state.setdefault("xty", None)
+        self.__dict__.update(state)
+
     def __eq__(self, o: object) -> bool:
         if not isinstance(o, Model):
             return NotImplemented
-        return self.params == o.params
+        return (self.hinge_temperature == o.hinge_temperature) and (
+            self.params == o.params
+        )
+
+    def feature_matrix(self, df: DataFrame) -> np.ndarray:
+        """Model input from dataframe: air temperature, as 1-D float64 array"""
+        return df[self.feature_columns[0]].to_numpy(dtype=np.float64)
 
+    @instrument()
     def fit(self, X: np.ndarray, y: np.ndarray):
         logging.info("Training model...")
         self.params, _ = optimize.curve_fit(self._piecewise_linear, X, y)
+        A = self._design_matrix(X)
+        self.xtx = A.T @ A
+        self.xty = A.T @ np.asarray(y, dtype=np.float64)
+
+    @instrument()
+    def fit_batches(self, batches: Iterable[tuple[np.ndarray, np.ndarray]]):
+        """
+        Fit model on a stream of (X, y) batches
+
+        The model is linear in its parameters, so the least squares fit is solved
+        from normal equations, which are accumulated batch by batch.
 
+        :param batches: iterable of input and target arrays
+        """
+        logging.info("Training model in batches...")
+        xtx = np.zeros((2, 2))
+        xty = np.zeros(2)
+        for X, y in batches:
+            if not (np.isfinite(X).all() and np.isfinite(y).all()):
+                raise ValueError("Training data contains non-finite values")
+            A = self._design_matrix(X)
+            xtx += A.T @ A
+            xty += A.T @ y
+        self.xtx, self.xty = xtx, xty
+        self.params = np.linalg.solve(xtx, xty)
+
+    @instrument()
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        """
+        Update model online with new observations, by recursive least squares
+
+        The state is the normal equations of all observations so far, weighted by
+        'forgetting_factor' to the power of observation age. Each observation updates
+        the state in constant time, and the state is saved with the model. Updates
+        continue from the state of :meth:`fit` or :meth:`fit_batches`; with forgetting
+        factor 1, parameters equal those of a full refit on all observations.
+
+        Parameters are kept as they are while the state does not determine them,
+        e.g. before any observation below hinge temperature.
+
+        :param X: air temperature of new observations, in chronological order
+        :param y: generation of new observations
+        :raises ValueError: if model was saved without update state, by an earlier
+            version
+        """
+        if self.xtx is None or self.xty is None:
+            raise ValueError(
+                "Model was saved without online update state, retrain it to update"
+            )
+        X = np.atleast_1d(X)
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if not (np.isfinite(X).all() and np.isfinite(y).all()):
+            raise ValueError("Update data contains non-finite values")
+
+        A = self._design_matrix(X)
+        decay = self.forgetting_factor ** np.arange(len(y) - 1, -1, -1)
+        weighted = A * decay[:, np.newaxis]
+        self.xtx = self.forgetting_factor ** len(y) * self.xtx + weighted.T @ A
+        self.xty = self.forgetting_factor ** len(y) * self.xty + weighted.T @ y
+
+        if np.linalg.cond(self.xtx) < 1 / np.finfo(np.float64).eps:
+            self.params = np.linalg.solve(self.xtx, self.xty)
+
+    @instrument()
     def predict(self, X) -> np.ndarray:
         return self._piecewise_linear(X, *self.params)
 
+    def _design_matrix(self, x: np.ndarray) -> np.ndarray:
+        """
+        Columns, whose linear combination with params (y0, k1) gives prediction
+        """
+        x = np.asarray(x, dtype=np.float64)
+        return np.column_stack(
+            [np.ones_like(x), np.minimum(x - self.hinge_temperature, 0)]
+        )
+
     def _piecewise_linear(self, x, y0, k1) -> np.ndarray:
-        x0 = 17
+        x0 = self.hinge_temperature
         k2 = 0
         return np.piecewise(
             x,
@@ -32,8 +141,10 @@ class Model:
 def save_model(model: Model, path: Path):
     logging.info(f"Saving model to {path}")
     dump(model, path)
+    record_file_written(path)
 
 
 def load_model(path: Path) -> Model:
     logging.info(f"Load model from {path}")
+    record_file_read(path)
     return load(path)
@@ -0,0 +1,834 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import yaml
+
+from .boosted import BoostedModel
+from .evaluate import evaluate, save_metrics
+from .featurize import featurize, holiday_calendar
+from .helpers import load_intermediate, save_intermediate
+from .model import Model, load_model, save_model
+from .prepare import FmiData, GenerationData, merge_dataframes
+from .quality import check_quality, save_report
+from .split import train_test_split_sorted
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+from .timeaxis import calendar_fields
+from .train import train
+
+PACKAGE_DIR = Path(__file__).parent
+
+# Source files of each stage, as in dependencies of dvc.yaml. The source file of
+# the node action, this module for the stages, is a dependency of every node.
+STAGE_SOURCES = {
+    "weather": ["prepare.py", "helpers.py", "timeaxis.py", "schema.py"],
+    "holidays": ["featurize.py"],
+    "prepare": ["prepare.py", "helpers.py", "timeaxis.py", "schema.py"],
+    "quality": ["quality.py", "helpers.py", "timeaxis.py", "schema.py"],
+    "featurize": ["featurize.py", "helpers.py", "timeaxis.py", "schema.py"],
+    "split": ["split.py", "helpers.py", "timeaxis.py", "schema.py"],
+    "train": [
+        "train.py",
+        "helpers.py",
+        "timeaxis.py",
+        "schema.py",
+        "model.py",
+        "boosted.py",
+    ],
+    "evaluate": [
+        "evaluate.py",
+        "helpers.py",
+        "timeaxis.py",
+        "schema.py",
+        "model.py",
+        "boosted.py",
+    ],
+}
+
+# CPUs of training a boosted model, unless set by 'cpus' of train parameters
+BOOSTED_TRAIN_CPUS = 4
+
+# Memory of a node, estimated from size of its input files
+INPUT_MEMORY_FACTOR = 8.0
+HASH_CHUNK_BYTES = 2**20
+
+
+@dataclass
+class Node:
+    """
+    Step of a pipeline, calling 'action' with 'kwargs' in a worker process
+
+    Nodes depend on the nodes that produce their input files.
+    """
+
+    name: str
+    action: Callable[..., None]
+    kwargs: dict[str, Any]
+    inputs: list[Path]
+    outputs: list[Path]
+    cpus: int = 1
+    memory_mb: Optional[float] = None
+
+    def estimated_memory_mb(self) -> float:
+        """Declared memory, or estimate from size of existing input files"""
+        if self.memory_mb is not None:
+            return self.memory_mb
+        size = sum(_size(p) for p in self.inputs if p.exists())
+        return INPUT_MEMORY_FACTOR * size / 2**20
+
+
+@dataclass
+class NodeRun:
+    status: str  # 'run', 'skipped', 'failed' or 'blocked'
+    start: float = 0.0  # seconds from start of pipeline run
+    end: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class PipelineReport:
+    runs: dict[str, NodeRun]
+    wall_seconds: float
+    critical_path: list[str]
+    critical_path_seconds: float
+    slack: dict[str, float]
+
+    @property
+    def failed(self) -> list[str]:
+        return [name for name, r in self.runs.items() if r.status == "failed"]
+
+    def to_dict(self) -> dict[str, Any]:
+        busy = sum(r.seconds for r in self.runs.values() if r.status == "run")
+        return {
+            "wall_seconds": self.wall_seconds,
+            "busy_seconds": busy,
+            "critical_path_seconds": self.critical_path_seconds,
+            "critical_path": self.critical_path,
+            "nodes": {
+                name: dict(asdict(r), seconds=r.seconds, slack=self.slack[name])
+                for name, r in self.runs.items()
+            },
+        }
+
+    def save(self, path: Path):
+        logging.info(f"Save pipeline report to {path=}")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class DigestCache:
+    def __init__(self):
+        """
+        Content hashes of files, by location, size and modification time
+
+        A file is hashed again only when its size or modification time changes.
+        """
+        self._digests: dict[tuple[str, int, int], str] = {}
+
+    def digest(self, path: Path) -> str:
+        """sha256 of file content, or of relative names and contents in directory"""
+        if path.is_dir():
+            h = hashlib.sha256()
+            for p in sorted(path.rglob("*")):
+                if p.is_file():
+                    h.update(f"{p.relative_to(path)}:{self.digest(p)}\n".encode())
+            return h.hexdigest()
+
+        key = _stat_key(path)
+        if key not in self._digests:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_BYTES):
+                    h.update(chunk)
+            self._digests[key] = h.hexdigest()
+        return self._digests[key]
+
+    def remember(self, key: tuple[str, int, int], digest: str):
+        self._digests[key] = digest
+
+
+class Pipeline:
+    def __init__(self, nodes: list[Node]):
+        """
+        Directed acyclic graph of nodes, connected by their input and output files
+
+        :param nodes: nodes, with unique names and outputs
+        :raises ValueError: if names or outputs repeat, or nodes form a cycle
+        """
+        self.nodes = {n.name: n for n in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Node names are not unique")
+        producers: dict[Path, str] = {}
+        for node in nodes:
+            for path in node.outputs:
+                if path in producers:
+                    raise ValueError(
+                        f"Output {path} of {node.name!r} is also output of "
+                        f"{producers[path]!r}"
+                    )
+                producers[path] = node.name
+
+        self.upstream = {
+            n.name: sorted({producers[p] for p in n.inputs if p in producers})
+            for n in nodes
+        }
+        self.downstream: dict[str, list[str]] = {name: [] for name in self.nodes}
+        for name, upstream in self.upstream.items():
+            for u in upstream:
+                self.downstream[u].append(name)
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> list[str]:
+        remaining = {name: len(u) for name, u in self.upstream.items()}
+        order = [name for name, count in remaining.items() if count == 0]
+        for name in order:
+            for d in self.downstream[name]:
+                remaining[d] -= 1
+                if remaining[d] == 0:
+                    order.append(d)
+        if len(order) != len(self.nodes):
+            cycle = sorted(set(self.nodes) - set(order))
+            raise ValueError(f"Nodes {cycle} form a cycle")
+        return order
+
+    def node_key(self, node: Node, digests: DigestCache) -> str:
+        """
+        Content hash of node: action and its source file, arguments, and contents of
+        input files
+        """
+        source = inspect.getsourcefile(node.action)
+        definition = {
+            "action": f"{node.action.__module__}.{node.action.__qualname__}",
+            "source": source and digests.digest(Path(source)),
+            "kwargs": node.kwargs,
+            "inputs": {str(p): digests.digest(p) for p in node.inputs},
+            "outputs": [str(p) for p in node.outputs],
+        }
+        encoded = json.dumps(definition, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    @instrument()
+    def run(
+        self,
+        state_dir: Path,
+        max_cpus: Optional[int] = None,
+        max_memory_mb: Optional[float] = None,
+        force: bool = False,
+    ) -> PipelineReport:
+        """
+        Run nodes concurrently in a process pool, skipping up-to-date nodes
+
+        A node is up to date, if its content hash equals the one stored in
+        'state_dir' at its last successful run, and its outputs are unchanged.
+        Ready nodes are started in order of their longest chain of downstream
+        nodes, as long as their CPUs and estimated memory fit in the budgets; a
+        node larger than a budget runs alone. When a node fails, its downstream
+        nodes are blocked, and other nodes continue.
+
+        :param state_dir: where to store content hashes of nodes
+        :param max_cpus: CPU budget, defaults to number of CPUs
+        :param max_memory_mb: memory budget, defaults to :func:`default_memory_mb`
+        :param force: run all nodes, also those up to date
+        :return: report of node runs and critical path
+        """
+        max_cpus = max_cpus or os.cpu_count() or 1
+        max_memory_mb = max_memory_mb or default_memory_mb()
+        state_dir.mkdir(parents=True, exist_ok=True)
+        logging.info(
+            f"Run pipeline of {len(self.nodes)} nodes, {max_cpus=}, {max_memory_mb=:.0f}"
+        )
+
+        scheduler = _Scheduler(self, state_dir, max_cpus, max_memory_mb, force)
+        with ProcessPoolExecutor(max_workers=max_cpus) as executor:
+            while scheduler.ready or scheduler.running:
+                while scheduler.dispatch(executor):
+                    pass
+                if scheduler.running:
+                    scheduler.collect()
+
+        runs = scheduler.runs
+        path, length, slack = critical_path(
+            {name: self.upstream[name] for name in self.order},
+            {name: r.seconds for name, r in runs.items()},
+        )
+        report = PipelineReport(
+            runs={name: runs[name] for name in self.order},
+            wall_seconds=time.time() - scheduler.t0,
+            critical_path=path,
+            critical_path_seconds=length,
+            slack=slack,
+        )
+        logging.info(
+            f"Pipeline finished in {report.wall_seconds:.2f} s, critical path "
+            f"{length:.2f} s: {' > '.join(path)}"
+        )
+        return report
+
+
+@dataclass
+class _Task:
+    name: str
+    key: str
+    cpus: int
+    memory_mb: float
+    submitted: float
+
+
+class _Scheduler:
+    """State of one :meth:`Pipeline.run`"""
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        state_dir: Path,
+        max_cpus: int,
+        max_memory_mb: float,
+        force: bool,
+    ):
+        self.pipeline = pipeline
+        self.state_dir = state_dir
+        self.max_cpus = max_cpus
+        self.max_memory_mb = max_memory_mb
+        self.force = force
+        self.digests = DigestCache()
+        self.runs: dict[str, NodeRun] = {}
+        self.waiting = {name: len(u) for name, u in pipeline.upstream.items()}
+        self.ready = [name for name, count in self.waiting.items() if count == 0]
+        self.running: dict[Future, _Task] = {}
+        self.t0 = time.time()
+
+        # Longest chain of nodes from each node to the end, as priority
+        self.depth: dict[str, int] = {}
+        for name in reversed(pipeline.order):
+            self.depth[name] = 1 + max(
+                (self.depth[d] for d in pipeline.downstream[name]), default=0
+            )
+
+    def now(self) -> float:
+        return time.time() - self.t0
+
+    def finish(self, name: str, run: NodeRun):
+        """Record run of node, and release or block its downstream nodes"""
+        self.runs[name] = run
+        for d in self.pipeline.downstream[name]:
+            if run.status in ("failed", "blocked"):
+                if d not in self.runs:
+                    self.finish(d, NodeRun("blocked", run.end, run.end))
+            else:
+                self.waiting[d] -= 1
+                if self.waiting[d] == 0:
+                    self.ready.append(d)
+
+    def dispatch(self, executor: ProcessPoolExecutor) -> bool:
+        """
+        Start ready nodes that fit in budgets, by priority, and skip up-to-date ones
+
+        :return: True if nodes were skipped or failed, so that more may be ready
+        """
+        progressed = False
+        self.ready.sort(key=lambda n: (-self.depth[n], n))
+        used_cpus = sum(t.cpus for t in self.running.values())
+        used_memory = sum(t.memory_mb for t in self.running.values())
+        for name in list(self.ready):
+            node = self.pipeline.nodes[name]
+            cpus = min(node.cpus, self.max_cpus)
+            memory = node.estimated_memory_mb()
+            fits = (
+                used_cpus + cpus <= self.max_cpus
+                and used_memory + memory <= self.max_memory_mb
+            )
+            if self.running and not fits:
+                continue
+
+            self.ready.remove(name)
+            started = self.now()
+            try:
+                key = self.pipeline.node_key(node, self.digests)
+            except OSError as e:
+                logging.error(f"Cannot hash inputs of {name}: {e}")
+                self.finish(name, NodeRun("failed", started, started, str(e)))
+                progressed = True
+                continue
+            if not self.force and _is_up_to_date(
+                node, key, self.state_dir, self.digests
+            ):
+                logging.info(f"Skip up-to-date {name}")
+                self.finish(name, NodeRun("skipped", started, self.now()))
+                progressed = True
+                continue
+
+            logging.info(f"Start {name}, {cpus=}, {memory=:.0f} MB")
+            for path in node.outputs:
+                path.parent.mkdir(parents=True, exist_ok=True)
+            future = executor.submit(_run_node, node.action, node.kwargs)
+            self.running[future] = _Task(name, key, cpus, memory, started)
+            used_cpus += cpus
+            used_memory += memory
+        return progressed
+
+    def collect(self):
+        """Wait for at least one running node to finish, and record results"""
+        done, _ = wait(self.running, return_when=FIRST_COMPLETED)
+        for future in done:
+            task = self.running.pop(future)
+            try:
+                start, end = future.result()
+            except Exception as e:
+                logging.error(f"{task.name} failed: {e!r}")
+                error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                self.finish(
+                    task.name, NodeRun("failed", task.submitted, self.now(), error)
+                )
+                continue
+            node = self.pipeline.nodes[task.name]
+            _save_stamp(node, task.key, self.state_dir, self.digests)
+            logging.info(f"Finished {task.name} in {end - start:.2f} s")
+            self.finish(task.name, NodeRun("run", start - self.t0, end - self.t0))
+
+
+def critical_path(
+    upstream: dict[str, list[str]], seconds: dict[str, float]
+) -> tuple[list[str], float, dict[str, float]]:
+    """
+    Longest chain of dependent nodes by duration, the lower bound of wall time
+    with unlimited workers
+
+    :param upstream: names of upstream nodes of each node, in topological order
+    :param seconds: duration of each node
+    :return: nodes of critical path, its length in seconds, and slack of each node,
+        by how much the node could take longer without lengthening the critical path
+    """
+    finish: dict[str, float] = {}
+    previous: dict[str, Optional[str]] = {}
+    for name, parents in upstream.items():
+        before = max(parents, key=lambda p: finish[p], default=None)
+        previous[name] = before
+        finish[name] = seconds[name] + (finish[before] if before else 0.0)
+
+    tail: dict[str, float] = {name: 0.0 for name in upstream}
+    for name in reversed(list(upstream)):
+        for p in upstream[name]:
+            tail[p] = max(tail[p], seconds[name] + tail[name])
+
+    if not finish:
+        return [], 0.0, {}
+    last: Optional[str] = max(finish, key=lambda n: finish[n])
+    length = finish[last]
+    path = []
+    while last is not None:
+        path.append(last)
+        last = previous[last]
+    slack = {name: length - finish[name] - tail[name] for name in upstream}
+    return path[::-1], length, slack
+
+
+def default_memory_mb() -> float:
+    """Half of physical memory, unlimited where it cannot be determined"""
+    try:
+        physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return float("inf")
+    return physical / 2 / 2**20
+
+
+def _run_node(
+    action: Callable[..., None], kwargs: dict[str, Any]
+) -> tuple[float, float]:
+    start = time.time()
+    action(**kwargs)
+    return start, time.time()
+
+
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+def _stat_key(path: Path) -> tuple[str, int, int]:
+    stat = path.stat()
+    return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def _stamp_path(node: Node, state_dir: Path) -> Path:
+    return state_dir / f"{_slug(node.name)}.json"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def _save_stamp(node: Node, key: str, state_dir: Path, digests: DigestCache):
+    outputs = {str(p): [*_stat_key(p)[1:], digests.digest(p)] for p in node.outputs}
+    with open(_stamp_path(node, state_dir), "w") as f:
+        json.dump({"key": key, "outputs": outputs}, f, indent=2)
+
+
+def _is_up_to_date(node: Node, key: str, state_dir: Path, digests: DigestCache) -> bool:
+    stamp_path = _stamp_path(node, state_dir)
+    if not stamp_path.is_file():
+        return False
+    with open(stamp_path) as f:
+        stamp = json.load(f)
+    if stamp["key"] != key or set(stamp["outputs"]) != {str(p) for p in node.outputs}:
+        return False
+    for path in node.outputs:
+        if not path.exists():
+            return False
+        size, mtime_ns, digest = stamp["outputs"][str(path)]
+        if path.is_file() and _stat_key(path) == (str(path), size, mtime_ns):
+            digests.remember((str(path), size, mtime_ns), digest)
+        elif digests.digest(path) != digest:
+            return False
+    return True
+
+
+def load_weather(fmi_dir: Path, station_name: str, output: Path):
+    """Load FMI data of one station, shared by all sites of the station"""
+    fmi_loader = FmiData.read_fmi_files(directory=fmi_dir, station_name=station_name)
+    df = fmi_loader.load_and_clean(interpolate=False)
+    save_intermediate(df.rename_axis("date_time"), path=output)
+
+
+def save_holidays(country: str, first_year: int, last_year: int, output: Path):
+    """Save holiday calendar, shared by all sites of the country"""
+    dates = holiday_calendar(country, first_year, last_year)
+    with open(output, "wb") as f:
+        np.savez(f, dates=dates, years=np.array([first_year, last_year]))
+
+
+def prepare_site(generation: dict[str, Any], weather_path: Path, output: Path):
+    df_generation = GenerationData(**generation).load_and_clean()
+    df_weather = load_intermediate(weather_path)
+    df_all = merge_dataframes(df_helen=df_generation, df_fmi=df_weather)
+    save_intermediate(df_all, path=output, schema="prepared")
+
+
+def check_site(
+    input: Path,
+    output: Path,
+    report_path: Path,
+    max_gap_hours: int,
+    flatline_hours: int,
+    outlier_threshold: float,
+):
+    df_prepared = load_intermediate(input, utc_epoch=True, schema="prepared")
+    df_checked, report = check_quality(
+        df_prepared,
+        max_gap_steps=max_gap_hours,
+        flatline_steps=flatline_hours,
+        outlier_threshold=outlier_threshold,
+    )
+    save_intermediate(df_checked, path=output, schema="checked")
+    save_report(report, report_path)
+
+
+def featurize_site(
+    input: Path,
+    holidays_path: Path,
+    output: Path,
+    local_timezone: str = "Europe/Helsinki",
+):
+    df = load_intermediate(input, utc_epoch=True, schema="checked")
+    with np.load(holidays_path) as calendar:
+        dates, (first_year, last_year) = calendar["dates"], calendar["years"]
+    epoch = df.index.to_numpy(np.int64)
+    years = (
+        calendar_fields(np.array([epoch.min(), epoch.max()]), local_timezone)["date"]
+        .astype("datetime64[Y]")
+        .astype(int)
+        + 1970
+    )
+    if years[0] < first_year or years[1] > last_year:
+        raise ValueError(
+            f"Holiday calendar covers years {first_year}-{last_year}, data covers "
+            f"{years[0]}-{years[1]}"
+        )
+    df = featurize(df, local_timezone=local_timezone, holiday_dates=dates)
+    save_intermediate(df, path=output, schema="features")
+
+
+def split_site(input: Path, test_size: float, train_output: Path, test_output: Path):
+    df = load_intermediate(input, utc_epoch=True, schema="features")
+    df_train, df_test = train_test_split_sorted(df, test_size=test_size)
+    save_intermediate(df_train, path=train_output, schema="features")
+    save_intermediate(df_test, path=test_output, schema="features")
+
+
+def train_site(
+    train_path: Path,
+    model_path: Path,
+    model_type: str,
+    hinge_temperature: float,
+    forgetting_factor: float,
+    cache_dir: Path,
+    n_jobs: int = 1,
+):
+    df_train = load_intermediate(train_path, utc_epoch=True, schema="features")
+    model: Union[Model, BoostedModel]
+    if model_type == "boosted":
+        model = BoostedModel(n_jobs=n_jobs, cache_dir=cache_dir)
+    else:
+        model = Model(
+            hinge_temperature=hinge_temperature, forgetting_factor=forgetting_factor
+        )
+    train(df_train, model)
+    save_model(model, model_path)
+
+
+def evaluate_site(model_path: Path, test_path: Path, metrics_path: Path):
+    df_test = load_intermediate(test_path, utc_epoch=True, schema="features")
+    save_metrics(evaluate(load_model(model_path), df_test), metrics_path)
+
+
+def build_pipeline(
+    sites: dict[str, dict[str, Any]],
+    params: dict[str, Any],
+    fmi_dir: Path,
+    work_dir: Path,
+    holiday_country: str = "Finland",
+    holiday_years: tuple[int, int] = (2010, 2030),
+) -> Pipeline:
+    """
+    Expand stages of dvc.yaml into a pipeline for each site
+
+    Weather data is loaded once per FMI station, and the holiday calendar once,
+    and shared by all sites. Outputs of each site are placed in 'work_dir/<site>'.
+
+    :param sites: by site name, 'generation' arguments of :class:`GenerationData`,
+        'fmi_station_name', and optionally 'params' overriding keys of 'params'
+    :param params: stage parameters, as in params.yaml; 'train' may also set 'cpus'
+        of training a boosted model, which defaults to :data:`BOOSTED_TRAIN_CPUS`
+    :param fmi_dir: directory of raw FMI files
+    :param work_dir: where to place outputs
+    :param holiday_country: country of holiday calendar
+    :param holiday_years: first and last year of holiday calendar
+    :return: pipeline
+    """
+
+    def sources(stage: str) -> list[Path]:
+        return [PACKAGE_DIR / name for name in STAGE_SOURCES[stage]]
+
+    shared = work_dir / "shared"
+    holidays_path = shared / f"holidays-{holiday_country}.npz"
+    nodes = [
+        Node(
+            f"holidays[{holiday_country}]",
+            save_holidays,
+            dict(
+                country=holiday_country,
+                first_year=holiday_years[0],
+                last_year=holiday_years[1],
+                output=holidays_path,
+            ),
+            inputs=sources("holidays"),
+            outputs=[holidays_path],
+        )
+    ]
+
+    for station in sorted({s["fmi_station_name"] for s in sites.values()}):
+        weather_path = shared / f"weather-{_slug(station)}.feather"
+        nodes.append(
+            Node(
+                f"weather[{station}]",
+                load_weather,
+                dict(fmi_dir=fmi_dir, station_name=station, output=weather_path),
+                inputs=[fmi_dir, *sources("weather")],
+                outputs=[weather_path],
+            )
+        )
+
+    for site, config in sites.items():
+        site_params = copy.deepcopy(params)
+        for section, values in config.get("params", {}).items():
+            site_params.setdefault(section, {}).update(values)
+        station = config["fmi_station_name"]
+        weather_path = shared / f"weather-{_slug(station)}.feather"
+        generation_path = Path(config["generation"]["raw_file_path"])
+        d = work_dir / site
+        train_params = site_params["train"]
+        train_cpus = 1
+        if train_params["model_type"] == "boosted":
+            train_cpus = train_params.get("cpus", BOOSTED_TRAIN_CPUS)
+        nodes += [
+            Node(
+                f"prepare[{site}]",
+                prepare_site,
+                dict(
+                    generation=config["generation"],
+                    weather_path=weather_path,
+                    output=d / "prepared.feather",
+                ),
+                inputs=[generation_path, weather_path, *sources("prepare")],
+                outputs=[d / "prepared.feather"],
+            ),
+            Node(
+                f"quality[{site}]",
+                check_site,
+                dict(
+                    input=d / "prepared.feather",
+                    output=d / "checked.feather",
+                    report_path=d / "quality.json",
+                    **site_params["quality"],
+                ),
+                inputs=[d / "prepared.feather", *sources("quality")],
+                outputs=[d / "checked.feather", d / "quality.json"],
+            ),
+            Node(
+                f"featurize[{site}]",
+                featurize_site,
+                dict(
+                    input=d / "checked.feather",
+                    holidays_path=holidays_path,
+                    output=d / "features.feather",
+                ),
+                inputs=[d / "checked.feather", holidays_path, *sources("featurize")],
+                outputs=[d / "features.feather"],
+            ),
+            Node(
+                f"split[{site}]",
+                split_site,
+                dict(
+                    input=d / "features.feather",
+                    test_size=site_params["prepare"]["split"],
+                    train_output=d / "train.feather",
+                    test_output=d / "test.feather",
+                ),
+                inputs=[d / "features.feather", *sources("split")],
+                outputs=[d / "train.feather", d / "test.feather"],
+            ),
+            Node(
+                f"train[{site}]",
+                train_site,
+                dict(
+                    train_path=d / "train.feather",
+                    model_path=d / "model.joblib",
+                    model_type=train_params["model_type"],
+                    hinge_temperature=train_params["hinge_temperature"],
+                    forgetting_factor=train_params["forgetting_factor"],
+                    cache_dir=work_dir / "cache",
+                    n_jobs=train_cpus,
+                ),
+                inputs=[d / "train.feather", *sources("train")],
+                outputs=[d / "model.joblib"],
+                cpus=train_cpus,
+            ),
+            Node(
+                f"evaluate[{site}]",
+                evaluate_site,
+                dict(
+                    model_path=d / "model.joblib",
+                    test_path=d / "test.feather",
+                    metrics_path=d / "score.json",
+                ),
+                inputs=[d / "model.joblib", d / "test.feather", *sources("evaluate")],
+                outputs=[d / "score.json"],
+            ),
+        ]
+    return Pipeline(nodes)
+
+
+def load_sites(path: Path) -> dict[str, Any]:
+    """
+    Load site definitions of :func:`build_pipeline` from YAML file; relative file
+    paths are relative to YAML file location
+
+    :return: 'fmi_dir', 'holidays' with 'country' and 'years', and 'sites'
+    """
+    logging.info(f"Load sites from {path}")
+    with open(path) as f:
+        config: dict[str, Any] = yaml.safe_load(f)
+    config["fmi_dir"] = path.parent / config["fmi_dir"]
+    for site in config["sites"].values():
+        generation = site["generation"]
+        generation["raw_file_path"] = path.parent / generation["raw_file_path"]
+    return config
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Run prepare-to-evaluate pipeline of many sites concurrently",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--sites",
+        help="Where to read site definitions",
+        type=Path,
+        default=Path("sites.yaml"),
+    )
+    parser.add_argument(
+        "--params",
+        help="Where to read stage parameters",
+        type=Path,
+        default=Path("params.yaml"),
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="Where to place outputs, one directory per site",
+        type=Path,
+        default=Path("data/intermediate/sites"),
+    )
+    parser.add_argument(
+        "--report-path",
+        help="Where to save timings and critical path",
+        type=Path,
+        default=Path("output/pipeline.json"),
+    )
+    parser.add_argument("--cpus", help="CPU budget", type=int, default=None)
+    parser.add_argument(
+        "--memory-mb",
+        help="Memory budget, in MB, default half of physical memory",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--force", help="Run also up-to-date nodes", action="store_true"
+    )
+    add_telemetry_arguments(parser, "pipeline")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("pipeline", profile_path=args.profile_path) as telemetry:
+        site_config = load_sites(args.sites.absolute())
+        with open(args.params) as f:
+            stage_params = yaml.safe_load(f)
+        work = args.work_dir.absolute()
+        pipeline = build_pipeline(
+            site_config["sites"],
+            stage_params,
+            fmi_dir=site_config["fmi_dir"],
+            work_dir=work,
+            holiday_country=site_config["holidays"]["country"],
+            holiday_years=tuple(site_config["holidays"]["years"]),
+        )
+        pipeline_report = pipeline.run(
+            work / "state",
+            max_cpus=args.cpus,
+            max_memory_mb=args.memory_mb,
+            force=args.force,
+        )
+        pipeline_report.save(args.report_path.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
+    if pipeline_report.failed:
+        parser.exit(1, f"Failed nodes: {', '.join(pipeline_report.failed)}\n")
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from matplotlib.figure import Figure
+from pandas import DataFrame, Timestamp
+
+from .boosted import BoostedModel
+from .helpers import load_intermediate
+from .model import Model, load_model
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+from .timeaxis import local_seconds
+
+DOWNSAMPLING_METHODS = ["minmax", "lttb"]
+
+
+def minmax_downsample(
+    x: np.ndarray, y: np.ndarray, bucket_size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the minimum and maximum point of each bucket of consecutive points
+
+    Missing values are ignored; a bucket of only missing values keeps its first
+    point twice, so that gaps remain visible.
+
+    :param x: sorted point positions
+    :param y: point values
+    :param bucket_size: number of points per bucket
+    :return: positions and values of kept points, two per bucket, in order of 'x'
+    """
+    n = len(x)
+    if n == 0 or bucket_size <= 2:
+        return x, y
+    n_buckets = -(-n // bucket_size)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+    missing = np.isnan(buckets)
+
+    first = np.arange(n_buckets) * bucket_size
+    i_min = first + np.argmin(np.where(missing, np.inf, buckets), axis=1)
+    i_max = first + np.argmax(np.where(missing, -np.inf, buckets), axis=1)
+    kept = np.sort(np.stack([i_min, i_max], axis=1), axis=1).ravel()
+    return x[kept], y[kept]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-triangle-three-buckets downsampling
+
+    The first and last points are kept. Other points are split into 'n_out' - 2
+    buckets, of which the point forming the largest triangle with the previously
+    kept point and the average of the next bucket is kept.
+
+    :param x: sorted point positions
+    :param y: point values
+    :param n_out: number of points to keep
+    :return: positions and values of kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf = np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (
+            (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        )
+        average_x = xf[next_lo:next_hi].mean()
+        average_y = np.nanmean(yf[next_lo:next_hi]) if i + 2 < len(edges) else yf[-1]
+        area = np.abs(
+            (xf[a] - average_x) * (yf[lo:hi] - yf[a])
+            - (xf[a] - xf[lo:hi]) * (average_y - yf[a])
+        )
+        a = lo + int(np.argmax(np.where(np.isnan(area), -1, area)))
+        kept[i + 1] = a
+    return x[kept], y[kept]
+
+
+class SeriesPyramid:
+    def __init__(self, levels: list[tuple[np.ndarray, np.ndarray]]):
+        """
+        Min/max downsampling levels of a time series, finest first
+
+        Level 0 holds all points. Each further level keeps the minimum and maximum
+        point of 'factor' buckets of the previous level, so that extremes are
+        preserved at every level.
+
+        :param levels: positions and values of points at each level
+        """
+        self.levels = levels
+
+    @classmethod
+    def build(cls, x: np.ndarray, y: np.ndarray, factor: int = 8) -> SeriesPyramid:
+        """
+        Build levels, until the coarsest level has at most 'factor' buckets
+
+        :param x: sorted point positions, e.g. UTC epoch seconds
+        :param y: point values
+        :param factor: number of buckets of a level merged into one on the next
+        """
+        levels = [(np.asarray(x), np.asarray(y, dtype=np.float64))]
+        bucket_size = factor
+        while len(levels[-1][0]) > 2 * factor:
+            levels.append(minmax_downsample(*levels[-1], bucket_size))
+            bucket_size = 2 * factor
+        return cls(levels)
+
+    def save(self, directory: Path):
+        """Save levels as .npy files, replacing 'directory' atomically"""
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=directory.parent))
+        for k, (x, y) in enumerate(self.levels):
+            np.save(staging / f"x-{k}.npy", x)
+            np.save(staging / f"y-{k}.npy", y)
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+
+    @classmethod
+    def open(cls, directory: Path) -> SeriesPyramid:
+        """Open saved levels memory-mapped, so that queries read only their range"""
+        n_levels = len(list(directory.glob("x-*.npy")))
+        return cls(
+            [
+                (
+                    np.load(directory / f"x-{k}.npy", mmap_mode="r"),
+                    np.load(directory / f"y-{k}.npy", mmap_mode="r"),
+                )
+                for k in range(n_levels)
+            ]
+        )
+
+    def query(
+        self,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        n_pixels: int = 1600,
+        method: str = "minmax",
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Points to draw between 'start' and 'end' at a width of 'n_pixels'
+
+        The coarsest level with at least two points per pixel in range is read,
+        and downsampled to 'n_pixels' buckets with 'method'.
+
+        :param start: first position to include, from the beginning if None
+        :param end: last position to include, to the end if None
+        :param n_pixels: horizontal resolution
+        :param method: 'minmax' or 'lttb'
+        :return: positions and values of points
+        """
+        for x, y in reversed(self.levels):
+            lo = 0 if start is None else int(np.searchsorted(x, start, side="left"))
+            hi = len(x) if end is None else int(np.searchsorted(x, end, side="right"))
+            if hi - lo >= 2 * n_pixels or (x is self.levels[0][0]):
+                break
+        x, y = np.asarray(x[lo:hi]), np.asarray(y[lo:hi])
+
+        if method == "lttb":
+            return lttb(x, y, 2 * n_pixels)
+        if method == "minmax":
+            return minmax_downsample(x, y, -(-len(x) // n_pixels))
+        raise ValueError(f"Unknown {method=}")
+
+
+def _file_key(path: Path) -> str:
+    stat = path.stat()
+    return f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+@instrument()
+def dataset_pyramids(
+    data_path: Path,
+    model_path: Optional[Path] = None,
+    cache_dir: Optional[Path] = None,
+    factor: int = 8,
+) -> dict[str, SeriesPyramid]:
+    """
+    Pyramids of demand, temperature, and if model is given, predictions and residuals
+
+    Pyramids are cached in 'cache_dir', keyed by location, size and modification
+    time of input files. On cache hit, input files are not read.
+
+    :param data_path: featurized dataset, e.g. test data
+    :param model_path: model artifact
+    :param cache_dir: where to cache pyramids, no caching if None
+    :param factor: see :meth:`SeriesPyramid.build`
+    :return: pyramid of each series, by name
+    """
+    names = ["dh_MWh", "Ilman lämpötila (degC)"]
+    if model_path is not None:
+        names += ["prediction", "residual"]
+
+    key = ":".join(
+        [_file_key(data_path), _file_key(model_path) if model_path else "", str(factor)]
+    )
+    directory = None
+    if cache_dir is not None:
+        directory = cache_dir / f"pyramid-{hashlib.sha256(key.encode()).hexdigest()}"
+        if all((directory / str(i) / "x-0.npy").is_file() for i in range(len(names))):
+            logging.info(f"Open cached pyramids from {directory}")
+            return {
+                name: SeriesPyramid.open(directory / str(i))
+                for i, name in enumerate(names)
+            }
+
+    df: DataFrame = load_intermediate(data_path, utc_epoch=True, schema="features")
+    x = df.index.to_numpy(np.int64)
+    series = {name: df[name].to_numpy(np.float64) for name in names[:2]}
+    if model_path is not None:
+        model: Union[Model, BoostedModel] = load_model(model_path)
+        series["prediction"] = np.asarray(
+            model.predict(model.feature_matrix(df)), dtype=np.float64
+        )
+        series["residual"] = series["dh_MWh"] - series["prediction"]
+
+    logging.info(f"Build pyramids of {len(x)} points")
+    pyramids = {name: SeriesPyramid.build(x, y, factor) for name, y in series.items()}
+    if directory is not None:
+        for i, name in enumerate(names):
+            pyramids[name].save(directory / str(i))
+    return pyramids
+
+
+@instrument()
+def plot_dataset(
+    pyramids: dict[str, SeriesPyramid],
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    width_px: int = 1600,
+    method: str = "minmax",
+    timezone: str = "Europe/Helsinki",
+) -> Figure:
+    """
+    Plot demand and predictions, temperature and residuals, downsampled to width
+
+    :param pyramids: series pyramids, from :func:`dataset_pyramids`
+    :param start: first time to plot, UTC epoch seconds
+    :param end: last time to plot, UTC epoch seconds
+    :param width_px: figure width in pixels, and downsampling resolution
+    :param method: downsampling method, 'minmax' or 'lttb'
+    :param timezone: timezone of time axis
+    :return: figure
+    """
+    dpi = 100
+    figure = Figure(figsize=(width_px / dpi, 9), dpi=dpi)
+    axes = figure.subplots(3, 1, sharex=True)
+
+    def draw(ax, name: str, **kwargs):
+        x, y = pyramids[name].query(start, end, n_pixels=width_px, method=method)
+        if len(x) == 0:
+            logging.warning(f"No {name} data between {start=} and {end=}")
+        local = local_seconds(np.asarray(x, np.int64), timezone)
+        ax.plot(local.astype("datetime64[s]"), y, linewidth=0.6, **kwargs)
+
+    draw(axes[0], "dh_MWh", label="Generation")
+    if "prediction" in pyramids:
+        draw(axes[0], "prediction", label="Prediction")
+        draw(axes[2], "residual", color="tab:red")
+    draw(axes[1], "Ilman lämpötila (degC)", color="tab:green")
+
+    axes[0].set_ylabel("MWh")
+    axes[0].legend(loc="upper right")
+    axes[1].set_ylabel("degC")
+    axes[2].set_ylabel("Residual (MWh)")
+    axes[2].set_xlabel(f"Time ({timezone})")
+    figure.tight_layout()
+    return figure
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Plot generation, temperature, predictions and residuals",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input",
+        help="Where to read featurized dataframe",
+        type=Path,
+        default=Path("data/processed/test.feather"),
+    )
+    parser.add_argument(
+        "--model-path",
+        help="Where to read model, predictions are not plotted if omitted",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to save figure",
+        type=Path,
+        default=Path("output/plot.png"),
+    )
+    parser.add_argument(
+        "--start", help="First time to plot, ISO 8601 with UTC offset", type=Timestamp
+    )
+    parser.add_argument(
+        "--end", help="Last time to plot, ISO 8601 with UTC offset", type=Timestamp
+    )
+    parser.add_argument(
+        "--width", help="Figure width in pixels", type=int, default=1600
+    )
+    parser.add_argument(
+        "--method",
+        help="Downsampling method",
+        choices=DOWNSAMPLING_METHODS,
+        default="minmax",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Where to cache downsampling pyramids",
+        type=Path,
+        default=Path("data/intermediate/cache"),
+    )
+    add_telemetry_arguments(parser, "plot")
+
+    args = parser.parse_args()
+    for bound in (args.start, args.end):
+        if bound is not None and bound.tzinfo is None:
+            parser.error("--start and --end must have UTC offset")
+
+    with StageTelemetry("plot", profile_path=args.profile_path) as telemetry:
+        series_pyramids = dataset_pyramids(
+            args.input.absolute(),
+            args.model_path and args.model_path.absolute(),
+            cache_dir=args.cache_dir.absolute(),
+        )
+        fig = plot_dataset(
+            series_pyramids,
+            start=args.start and args.start.value // 10**9,
+            end=args.end and args.end.value // 10**9,
+            width_px=args.width,
+            method=args.method,
+        )
+        logging.info(f"Save figure to {args.output}")
+        fig.savefig(args.output.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
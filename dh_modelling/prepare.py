@@ -3,21 +3,78 @@ from __future__ import annotations
 import argparse
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from os import PathLike
 from pathlib import Path
+from typing import Iterator, Optional
 
+import numpy as np
 import pandas as pd
-from pandas import DataFrame, concat, merge, read_csv
+import yaml
+from pandas import (
+    DataFrame,
+    DatetimeIndex,
+    Index,
+    Series,
+    Timestamp,
+    concat,
+    merge,
+    read_csv,
+)
 
 from .helpers import save_intermediate
+from .telemetry import (
+    StageTelemetry,
+    add_telemetry_arguments,
+    instrument,
+    record_file_read,
+)
+from .timeaxis import SECONDS_PER_HOUR, to_datetime_index, to_epoch_seconds
 
 
 class GenerationData:
-    def __init__(self, raw_file_path):
+    def __init__(
+        self,
+        raw_file_path,
+        sep: str = ";",
+        decimal: str = ",",
+        date_format: Optional[str] = "%d.%m.%Y %H:%M",
+        date_column: str = "date_time",
+        value_column: str = "dh_MWh",
+        timezone: str = "Europe/Helsinki",
+        aggregation: str = "sum",
+    ):
+        """
+        Generation data loader of one site
+
+        Defaults are those of the Helen open data file. Timestamps without UTC offset
+        are local time of 'timezone'; ambiguous times at the end of daylight saving
+        time must appear in chronological order.
+
+        :param raw_file_path: location of CSV file
+        :param sep: field separator
+        :param decimal: decimal separator
+        :param date_format: strptime format of timestamps, inferred if None
+        :param date_column: column of timestamps, renamed to 'date_time'
+        :param value_column: column of generation, renamed to 'dh_MWh'
+        :param timezone: timezone of timestamps without UTC offset
+        :param aggregation: 'sum' for energy per interval, 'mean' for power, used
+            when resampling to hourly, see :meth:`load_hourly`
+        """
+        if aggregation not in ("sum", "mean"):
+            raise ValueError(f"Unknown {aggregation=}")
         self.raw_file_path = raw_file_path
-
+        self.sep = sep
+        self.decimal = decimal
+        self.date_format = date_format
+        self.date_column = date_column
+        self.value_column = value_column
+        self.timezone = timezone
+        self.aggregation = aggregation
+
+    @instrument()
     def load_and_clean(self) -> DataFrame:
         """
         Load dataframe from disk, clean up features
@@ -25,14 +82,209 @@ class GenerationData:
         :return: Pandas dataframe, with index column 'date_time' and feature column 'dh_MWh'
         """
         logging.info(f"Load and clean Helen raw dataframe from {self.raw_file_path}")
-        df = pd.read_csv(
+        df = self._normalize(self._read_csv()).set_index("date_time")
+        record_file_read(self.raw_file_path)
+        df.index = self._localize(df.index, ambiguous="infer")
+        return df
+
+    def load_batches(self, batch_size: int) -> Iterator[DataFrame]:
+        """
+        Load dataframe from disk in batches of at most 'batch_size' rows
+
+        Rows must be in chronological order. Ambiguous local times at the end of
+        daylight saving time are resolved as in :meth:`load_and_clean`: the first
+        occurrence of a repeated time is taken as daylight saving time, also when
+        the occurrences fall into different batches.
+
+        :param batch_size: number of rows per batch
+        :return: iterator of dataframes, in the format of :meth:`load_and_clean`
+        """
+        logging.info(f"Load Helen raw dataframe in batches from {self.raw_file_path}")
+        previous: Optional[np.datetime64] = None
+        for chunk in self._read_csv(chunksize=batch_size):
+            chunk = self._normalize(chunk)
+            naive = chunk["date_time"].to_numpy()
+            preceding = naive[:1] if previous is None else np.array([previous])
+            is_dst = naive > np.concatenate([preceding, naive[:-1]])
+            is_dst[0] |= previous is None
+            previous = naive[-1]
+
+            df = chunk.set_index("date_time")
+            df.index = self._localize(df.index, ambiguous=is_dst)
+            yield df
+        record_file_read(self.raw_file_path)
+
+    @instrument()
+    def load_hourly(self) -> DataFrame:
+        """
+        Load data and resample it to hourly resolution, on UTC epoch seconds axis
+
+        Timestamps are converted to UTC epoch seconds, and binned to the hour they
+        start in. Binning in UTC is correct across daylight saving time transitions,
+        as long as the UTC offset of 'timezone' is whole hours. Data resolution is
+        inferred, and must divide an hour. Values are summed or averaged, see
+        'aggregation'. Hours that do not have all their values are missing.
+
+        :return: dataframe with int64 UTC epoch seconds index 'date_time', on a
+            continuous hourly grid, and column 'dh_MWh'
+        """
+        logging.info(f"Load hourly generation data from {self.raw_file_path}")
+        df = self._normalize(self._read_csv())
+        record_file_read(self.raw_file_path)
+        epoch = to_epoch_seconds(
+            self._localize(DatetimeIndex(df["date_time"]), ambiguous="infer")
+        )
+        return resample_hourly(
+            epoch, df["dh_MWh"].to_numpy(np.float64), aggregation=self.aggregation
+        )
+
+    def count_rows(self) -> int:
+        """Number of data rows in raw file"""
+        with open(self.raw_file_path) as f:
+            return sum(1 for line in f if line.strip()) - 1
+
+    def _read_csv(self, **kwargs):
+        return pd.read_csv(
             self.raw_file_path,
-            sep=";",
-            decimal=",",
-            parse_dates=["date_time"],
-            date_parser=lambda x: datetime.strptime(x, "%d.%m.%Y %H:%M"),
-        ).set_index("date_time")
-        df.index = df.index.tz_localize(tz="Europe/Helsinki", ambiguous="infer")
+            sep=self.sep,
+            decimal=self.decimal,
+            usecols=[self.date_column, self.value_column],
+            dtype={self.date_column: str},
+            **kwargs,
+        )
+
+    def _normalize(self, df: DataFrame) -> DataFrame:
+        """Rename columns to 'date_time' and 'dh_MWh', parse timestamps"""
+        df = df.rename(
+            columns={self.date_column: "date_time", self.value_column: "dh_MWh"}
+        )[["date_time", "dh_MWh"]]
+        df["date_time"] = pd.to_datetime(df["date_time"], format=self.date_format)
+        return df
+
+    def _localize(self, idx: DatetimeIndex, ambiguous) -> DatetimeIndex:
+        if idx.tz is not None:
+            return idx.tz_convert(self.timezone)
+        return idx.tz_localize(tz=self.timezone, ambiguous=ambiguous)
+
+
+def resample_hourly(
+    epoch: np.ndarray, values: np.ndarray, aggregation: str = "sum"
+) -> DataFrame:
+    """
+    Resample values at UTC epoch seconds to a continuous hourly grid
+
+    :param epoch: int64 UTC epoch seconds, in any order
+    :param values: values at 'epoch', missing values as NaN
+    :param aggregation: 'sum' or 'mean' of values within an hour
+    :return: dataframe with int64 UTC epoch seconds index 'date_time', and column
+        'dh_MWh'; hours with fewer values than the data resolution implies are NaN
+    """
+    if len(epoch) == 0:
+        return DataFrame({"dh_MWh": np.array([], np.float64)}, index=_epoch_index([]))
+    if not np.all(np.diff(epoch) > 0):
+        epoch, first = np.unique(epoch, return_index=True)
+        values = values[first]
+
+    steps = np.diff(epoch)
+    resolution = int(np.median(steps)) if len(steps) else SECONDS_PER_HOUR
+    if resolution > SECONDS_PER_HOUR or SECONDS_PER_HOUR % resolution:
+        raise ValueError(f"Resolution {resolution} s does not divide an hour")
+
+    hour = epoch // SECONDS_PER_HOUR
+    slot = hour - hour[0]
+    n_hours = int(slot[-1]) + 1
+    valid = ~np.isnan(values)
+    totals = np.bincount(slot, weights=np.where(valid, values, 0), minlength=n_hours)
+    counts = np.bincount(slot, weights=valid, minlength=n_hours)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hourly = totals if aggregation == "sum" else totals / counts
+    hourly[counts < SECONDS_PER_HOUR // resolution] = np.nan
+    return DataFrame(
+        {"dh_MWh": hourly},
+        index=_epoch_index((hour[0] + np.arange(n_hours)) * SECONDS_PER_HOUR),
+    )
+
+
+def _epoch_index(epoch) -> Index:
+    return Index(np.asarray(epoch, np.int64), name="date_time")
+
+
+class MultiSiteGenerationData:
+    def __init__(self, sites: dict[str, GenerationData], max_workers: int = 8):
+        """
+        Generation data loader of several sites, on a common hourly grid
+
+        :param sites: loader of each site, by site name
+        :param max_workers: maximum number of files read concurrently
+        """
+        self.sites = sites
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_yaml(cls, path: Path, **kwargs) -> MultiSiteGenerationData:
+        """
+        Create loader from YAML file, mapping site names to :class:`GenerationData`
+        arguments; relative file paths are relative to YAML file location
+        """
+        with open(path) as f:
+            config: dict[str, dict] = yaml.safe_load(f)
+        sites = {
+            name: GenerationData(
+                **dict(args, raw_file_path=path.parent / args["raw_file_path"])
+            )
+            for name, args in config.items()
+        }
+        return cls(sites, **kwargs)
+
+    @instrument()
+    def load(
+        self,
+        layout: str = "wide",
+        utc_epoch: bool = False,
+        timezone: str = "Europe/Helsinki",
+    ) -> DataFrame:
+        """
+        Read all sites concurrently, and resample them to a common hourly grid
+
+        :param layout: 'wide' for one column per site, 'long' for columns 'site'
+            and 'dh_MWh', sorted by site and time
+        :param utc_epoch: index by int64 UTC epoch seconds, instead of DatetimeIndex
+        :param timezone: timezone of DatetimeIndex
+        :return: dataframe with index 'date_time', for :func:`merge_dataframes`
+        """
+        if layout not in ("wide", "long"):
+            raise ValueError(f"Unknown {layout=}")
+        names = list(self.sites)
+        logging.info(f"Load generation data of {len(names)} sites")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = list(executor.map(lambda s: s.load_hourly(), self.sites.values()))
+
+        non_empty = [f.index.to_numpy() for f in frames if len(f)]
+        start = min((e[0] for e in non_empty), default=0)
+        end = max((e[-1] for e in non_empty), default=-SECONDS_PER_HOUR)
+        grid = np.arange(start, end + 1, SECONDS_PER_HOUR, dtype=np.int64)
+
+        values = np.full((len(grid), len(names)), np.nan)
+        for j, frame in enumerate(frames):
+            if len(frame):
+                offset = (frame.index[0] - start) // SECONDS_PER_HOUR
+                values[offset : offset + len(frame), j] = frame["dh_MWh"].to_numpy()
+
+        if layout == "wide":
+            df = DataFrame(values, columns=names, index=_epoch_index(grid))
+        else:
+            df = DataFrame(
+                {
+                    "site": np.repeat(names, len(grid)),
+                    "dh_MWh": values.T.ravel(),
+                },
+                index=_epoch_index(np.tile(grid, len(names))),
+            )
+        if not utc_epoch:
+            df.index = to_datetime_index(df.index.to_numpy(), timezone).rename(
+                "date_time"
+            )
         return df
 
 
@@ -57,9 +309,12 @@ class FmiData:
     def __repr__(self) -> str:
         return f"{self.__class__}({self.__dict__!r})"
 
-    def load_and_clean(self) -> DataFrame:
+    @instrument()
+    def load_and_clean(self, interpolate: bool = True) -> DataFrame:
         """
         Load data files from disk, clean up features
+        :param interpolate: interpolate all missing values, leave them to data quality
+            stage if False
         :return: Pandas dataframe, with index column 'datetime'
         """
         logging.info("Load and clean up data files")
@@ -72,21 +327,120 @@ class FmiData:
         df = df[["Ilman lämpötila (degC)"]]
 
         # Clean up
-        df["Ilman lämpötila (degC)"].interpolate(inplace=True)
+        if interpolate:
+            df["Ilman lämpötila (degC)"].interpolate(inplace=True)
 
         return df
 
+    def load_batches(
+        self,
+        batch_size: int,
+        interpolate: bool = True,
+        max_pending_rows: int = 100_000,
+    ) -> Iterator[DataFrame]:
+        """
+        Load data files from disk in batches, clean up features
+
+        Files are read in order of their first timestamp. Each file must be in
+        chronological order, and files may overlap only with identical records.
+        Missing values are interpolated as in :meth:`load_and_clean`, also across
+        batch boundaries: a run of missing values is held back until the next valid
+        value arrives. A run longer than 'max_pending_rows' is not held back, but
+        filled with the last valid value, which then differs from
+        :meth:`load_and_clean`.
+
+        :param batch_size: number of rows to read from file at a time
+        :param interpolate: interpolate missing values, as in :meth:`load_and_clean`
+        :param max_pending_rows: maximum number of missing values held back
+        :return: iterator of dataframes, in the format of :meth:`load_and_clean`
+        """
+        logging.info("Load and clean up data files in batches")
+        column = "Ilman lämpötila (degC)"
+        last_time: Optional[Timestamp] = None
+        last_valid: Optional[float] = None
+        pending: list[Series] = []
+
+        for chunk in self._read_chunks(batch_size):
+            if last_time is not None:
+                chunk = chunk.loc[chunk.index > last_time]
+            if chunk.empty:
+                continue
+            if not chunk.index.is_monotonic_increasing:
+                raise ValueError("FMI data file is not in chronological order")
+            last_time = chunk.index[-1]
+            if not interpolate:
+                yield chunk[[column]]
+                continue
+
+            values = concat(pending + [chunk[column].astype(np.float64)])
+            valid = values.notna().to_numpy().nonzero()[0]
+            if len(valid) == 0:
+                pending = [values] if last_valid is not None else []
+                if last_valid is None:
+                    yield values.to_frame()
+                elif len(values) > max_pending_rows:
+                    logging.warning(
+                        f"Fill {len(values)} missing values with last valid value,"
+                        f" more than {max_pending_rows=}"
+                    )
+                    pending = []
+                    yield values.fillna(last_valid).rename(column).to_frame()
+                continue
+
+            n_ready = valid[-1] + 1
+            ready = values.iloc[:n_ready]
+            if last_valid is not None:
+                anchored = concat([Series([last_valid]), ready], ignore_index=True)
+                ready = Series(anchored.interpolate().to_numpy()[1:], index=ready.index)
+            else:
+                ready = ready.interpolate()
+            last_valid = ready.iloc[-1]
+            pending = [values.iloc[n_ready:]]
+            yield ready.rename(column).to_frame()
+
+        if pending and len(pending[0]):
+            yield pending[0].fillna(last_valid).rename(column).to_frame()
+
+    def _read_chunks(self, batch_size: int) -> Iterator[DataFrame]:
+        """
+        Read all files in chunks, files in order of their first timestamp
+        """
+
+        def first_time(filepath: PathLike) -> Timestamp:
+            return self._to_local_time(self._read_csv(filepath, nrows=1)).index[0]
+
+        for filepath in sorted(self.raw_file_paths, key=first_time):
+            logging.info(f"Read FMI weather data in batches: {filepath=}")
+            for chunk in self._read_csv(filepath, chunksize=batch_size):
+                yield self._to_local_time(chunk)
+            record_file_read(filepath)
+
     @staticmethod
+    @instrument()
     def _read_file(filepath_or_buffer: PathLike) -> DataFrame:
         """
         Read FMI weather data into pandas data frame
         """
         logging.info(f"Read FMI weather data: {filepath_or_buffer=}")
-        d = read_csv(
-            filepath_or_buffer, parse_dates=[["Vuosi", "Kk", "Pv", "Klo"]]
-        ).rename(columns={"Vuosi_Kk_Pv_Klo": "date_time"})
+        d = FmiData._read_csv(filepath_or_buffer)
+        record_file_read(filepath_or_buffer)
+        return FmiData._to_local_time(d)
 
-        assert (d["Aikavyöhyke"] == "UTC").all()
+    @staticmethod
+    def _read_csv(filepath_or_buffer: PathLike, **kwargs):
+        return read_csv(
+            filepath_or_buffer, parse_dates=[["Vuosi", "Kk", "Pv", "Klo"]], **kwargs
+        )
+
+    @staticmethod
+    def _to_local_time(d: DataFrame) -> DataFrame:
+        """
+        Set index from parsed UTC date columns, convert to local time
+        """
+        d = d.rename(columns={"Vuosi_Kk_Pv_Klo": "date_time"})
+
+        if not (d["Aikavyöhyke"] == "UTC").all():
+            raise ValueError("FMI data must have timestamps in UTC")
 
         d = d.drop(["Aikavyöhyke"], axis=1).set_index("date_time")
 
@@ -142,8 +496,11 @@ class FmiMeta:
 
     @classmethod
     def from_file(cls, path: Path) -> FmiMeta:
-        content = path.read_text("utf8")
-        lines = content.split("\n")
+        return cls.from_string(path.read_text("utf8"))
+
+    @classmethod
+    def from_string(cls, content: str) -> FmiMeta:
+        lines = content.strip("\r\n").split("\n")
         assert len(lines) == 2
         keys = lines[0].split(",")
         values = lines[1].split(",")
@@ -165,6 +522,7 @@ class FmiMeta:
         )
 
 
+@instrument()
 def merge_dataframes(df_helen: DataFrame, df_fmi: DataFrame) -> DataFrame:
     logging.info("Left join fmi on helen")
     return merge(df_helen, df_fmi, how="left", left_index=True, right_index=True)
@@ -205,17 +563,28 @@ if __name__ == "__main__":
         default=Path("data/intermediate/master.feather"),
     )
 
+    parser.add_argument(
+        "--no-fmi-interpolation",
+        help="Leave missing weather values for the data quality stage to interpolate",
+        dest="fmi_interpolation",
+        action="store_false",
+    )
+    add_telemetry_arguments(parser, "prepare")
+
     args = parser.parse_args()
 
-    generation_loader = GenerationData(raw_file_path=args.input.absolute())
-    df_generation: DataFrame = generation_loader.load_and_clean()
+    with StageTelemetry("prepare", profile_path=args.profile_path) as telemetry:
+        generation_loader = GenerationData(raw_file_path=args.input.absolute())
+        df_generation: DataFrame = generation_loader.load_and_clean()
 
-    # TODO 2021-04-14 feed in required date range from df_generation, warn if dates missing
-    fmi_loader: FmiData = FmiData.read_fmi_files(
-        directory=args.fmi_dir.absolute(), station_name=args.fmi_station_name
-    )
-    df_weather = fmi_loader.load_and_clean()
+        # TODO 2021-04-14 feed in required date range from df_generation, warn if dates missing
+        fmi_loader: FmiData = FmiData.read_fmi_files(
+            directory=args.fmi_dir.absolute(), station_name=args.fmi_station_name
+        )
+        df_weather = fmi_loader.load_and_clean(interpolate=args.fmi_interpolation)
+
+        df_all: DataFrame = merge_dataframes(df_helen=df_generation, df_fmi=df_weather)
 
-    df_all: DataFrame = merge_dataframes(df_helen=df_generation, df_fmi=df_weather)
+        save_intermediate(df_all, path=args.output.absolute(), schema="prepared")
 
-    save_intermediate(df_all, path=args.output.absolute())
+    telemetry.save(args.telemetry_path.absolute())
@@ -0,0 +1,274 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, Index, Series, factorize
+
+from .helpers import load_intermediate, save_intermediate
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+from .timeaxis import UtcOffsetTable, to_datetime_index, to_epoch_seconds
+
+MAD_TO_STANDARD_DEVIATION = 1.4826
+
+
+@instrument()
+def check_quality(
+    df: DataFrame,
+    columns: Optional[list[str]] = None,
+    group_column: Optional[str] = None,
+    step_seconds: int = 3600,
+    max_gap_steps: int = 3,
+    flatline_steps: int = 12,
+    outlier_threshold: float = 6.0,
+    drop_incomplete: bool = True,
+    local_timezone: str = "Europe/Helsinki",
+) -> tuple[DataFrame, dict[str, Any]]:
+    """
+    Check data quality of a time series dataframe, fill short gaps
+
+    All checks are vectorized passes over int64 UTC epoch seconds, linear in data
+    size apart from sorting unsorted input:
+
+    - duplicates: repeated timestamps, of which the first row is kept
+    - misaligned: timestamps that are not on the 'step_seconds' grid
+    - gaps: missing timestamps; gaps of at most 'max_gap_steps' are filled with rows
+    - DST anomalies: duplicates and gaps next to a DST transition of 'local_timezone'
+    - flatlines: runs of at least 'flatline_steps' identical values
+    - outliers: values further than 'outlier_threshold' robust standard deviations
+      (scaled median absolute deviation) from the median
+
+    Missing values, including the filled gap rows, are linearly interpolated in
+    time, only if the run of missing values is at most 'max_gap_steps' long.
+    Flatlines and outliers are only reported.
+
+    :param df: input dataframe, with DatetimeIndex or int64 UTC epoch seconds index
+    :param columns: value columns to check, defaults to all numeric columns
+    :param group_column: column identifying separate series, e.g. weather station
+    :param step_seconds: expected interval between timestamps
+    :param max_gap_steps: longest gap, in steps, that is interpolated
+    :param flatline_steps: shortest run of identical values reported as flatline
+    :param outlier_threshold: outlier limit, in robust standard deviations
+    :param drop_incomplete: drop rows that have missing values after interpolation
+    :param local_timezone: timezone, whose DST transitions are checked
+    :return: cleaned dataframe with the same index type, and quality report
+    """
+    logging.info("Check data quality")
+    columns = columns or [
+        c for c in df.select_dtypes("number").columns if c != group_column
+    ]
+    tz = df.index.tz if isinstance(df.index, DatetimeIndex) else None
+    t = to_epoch_seconds(df.index) if tz is not None else df.index.to_numpy(np.int64)
+    if group_column is not None:
+        g, groups = factorize(df[group_column])
+    else:
+        g = np.zeros(len(df), np.int64)
+    values = {c: df[c].to_numpy(np.float64) for c in columns}
+
+    if np.any((np.diff(g) < 0) | ((np.diff(g) == 0) & (np.diff(t) < 0))):
+        order = np.lexsort((t, g))
+        t, g = t[order], g[order]
+        values = {c: v[order] for c, v in values.items()}
+
+    report: dict[str, Any] = {"rows_in": len(df)}
+
+    # Duplicates
+    duplicate = np.concatenate([[False], (np.diff(t) == 0) & (np.diff(g) == 0)])
+    duplicate_times = t[duplicate]
+    report["duplicates"] = int(duplicate.sum())
+    t, g = t[~duplicate], g[~duplicate]
+    values = {c: v[~duplicate] for c, v in values.items()}
+
+    report["misaligned"] = int(np.count_nonzero(t % step_seconds))
+
+    # Gaps
+    same_group = np.diff(g) == 0
+    gap_steps = np.where(same_group, np.diff(t) // step_seconds - 1, 0)
+    is_gap = gap_steps > 0
+    report["gaps"] = {
+        "count": int(is_gap.sum()),
+        "missing_steps": int(gap_steps.sum()),
+        "longest_steps": int(gap_steps.max(initial=0)),
+    }
+    report["dst_anomalies"] = _count_near_dst_transition(
+        np.concatenate([duplicate_times, t[:-1][is_gap]]),
+        local_timezone,
+        tolerance=step_seconds,
+    )
+
+    report["columns"] = {
+        c: {
+            "missing": int(np.isnan(v).sum()),
+            **_flatlines(v, g, flatline_steps),
+            "outliers": _count_outliers(v, g, outlier_threshold),
+        }
+        for c, v in values.items()
+    }
+
+    # Insert rows into short gaps, to be interpolated
+    fill_gap = is_gap & (gap_steps <= max_gap_steps)
+    n_new = gap_steps[fill_gap]
+    positions = np.repeat(np.flatnonzero(fill_gap) + 1, n_new)
+    offsets = np.arange(n_new.sum()) - np.repeat(np.cumsum(n_new) - n_new, n_new) + 1
+    t = np.insert(t, positions, t[positions - 1] + offsets * step_seconds)
+    g = np.insert(g, positions, g[positions - 1])
+    values = {c: np.insert(v, positions, np.nan) for c, v in values.items()}
+
+    for c, v in values.items():
+        report["columns"][c]["interpolated"] = _interpolate_short_runs(
+            v, t, g, max_gap_steps, step_seconds
+        )
+
+    incomplete = np.zeros(len(t), dtype=bool)
+    if drop_incomplete:
+        for v in values.values():
+            incomplete |= np.isnan(v)
+    report["rows_dropped"] = int(incomplete.sum())
+
+    index = Index(t[~incomplete], name=df.index.name)
+    if tz is not None:
+        index = to_datetime_index(index.to_numpy(), tz).rename(df.index.name)
+    df_out = DataFrame({c: v[~incomplete] for c, v in values.items()}, index=index)
+    if group_column is not None:
+        df_out.insert(0, group_column, groups.take(g[~incomplete]))
+    df_out = df_out[[c for c in df.columns if c in df_out.columns]]
+
+    report["rows_out"] = len(df_out)
+    return df_out, report
+
+
+def _count_near_dst_transition(times: np.ndarray, timezone: str, tolerance: int) -> int:
+    """Number of 'times' within 'tolerance' seconds from a UTC offset transition"""
+    if len(times) == 0:
+        return 0
+    table = UtcOffsetTable.for_range(int(times.min()), int(times.max()), timezone)
+    transitions = table.transitions[1:]
+    if len(transitions) == 0:
+        return 0
+    idx = np.clip(np.searchsorted(transitions, times), 1, len(transitions))
+    nearest = np.minimum(
+        np.abs(times - transitions[idx - 1]),
+        np.abs(times - transitions[np.minimum(idx, len(transitions) - 1)]),
+    )
+    return int(np.count_nonzero(nearest <= tolerance))
+
+
+def _flatlines(v: np.ndarray, g: np.ndarray, min_steps: int) -> dict[str, int]:
+    """Runs of at least 'min_steps' identical non-missing values, within groups"""
+    if len(v) == 0:
+        return {"flatline_runs": 0, "flatline_points": 0}
+    change = np.concatenate([[True], (v[1:] != v[:-1]) | (g[1:] != g[:-1])])
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, len(v)))
+    flat = (lengths >= min_steps) & ~np.isnan(v[starts])
+    return {
+        "flatline_runs": int(flat.sum()),
+        "flatline_points": int(lengths[flat].sum()),
+    }
+
+
+def _count_outliers(v: np.ndarray, g: np.ndarray, threshold: float) -> int:
+    """Number of values beyond 'threshold' robust standard deviations, within groups"""
+    median = Series(v).groupby(g).transform("median").to_numpy()
+    deviation = np.abs(v - median)
+    scale = Series(deviation).groupby(g).transform("median").to_numpy()
+    scale *= MAD_TO_STANDARD_DEVIATION
+    return int(np.count_nonzero((scale > 0) & (deviation > threshold * scale)))
+
+
+def _interpolate_short_runs(
+    v: np.ndarray, t: np.ndarray, g: np.ndarray, max_steps: int, step_seconds: int
+) -> int:
+    """
+    Interpolate, in place and linearly in time, runs of at most 'max_steps' missing values
+
+    :return: number of interpolated values
+    """
+    n = len(v)
+    positions = np.arange(n)
+    valid = ~np.isnan(v)
+    previous = np.maximum.accumulate(np.where(valid, positions, -1))
+    following = np.minimum.accumulate(np.where(valid, positions, n)[::-1])[::-1]
+
+    candidate = ~valid & (previous >= 0) & (following < n)
+    rows = np.flatnonzero(candidate)
+    p, f = previous[rows], following[rows]
+    fillable = (
+        (f - p - 1 <= max_steps)
+        & (g[p] == g[f])
+        & (t[f] - t[p] <= (max_steps + 1) * step_seconds)
+    )
+    rows, p, f = rows[fillable], p[fillable], f[fillable]
+    v[rows] = v[p] + (v[f] - v[p]) * (t[rows] - t[p]) / (t[f] - t[p])
+    return len(rows)
+
+
+def save_report(report: dict, path: Path):
+    logging.info(f"Save quality report to {path=}")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Check data quality, interpolate short gaps",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input",
+        help="Where to read prepared dataframe",
+        type=Path,
+        default=Path("data/intermediate/prepared.feather"),
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to save checked dataframe",
+        type=Path,
+        default=Path("data/intermediate/checked.feather"),
+    )
+    parser.add_argument(
+        "--report-path",
+        help="Where to save quality report",
+        type=Path,
+        default=Path("output/quality.json"),
+    )
+    parser.add_argument(
+        "--max-gap-hours",
+        help="Longest gap, in hours, that is interpolated",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--flatline-hours",
+        help="Shortest run of identical values, in hours, reported as flatline",
+        type=int,
+        default=12,
+    )
+    parser.add_argument(
+        "--outlier-threshold",
+        help="Outlier limit, in robust standard deviations from median",
+        type=float,
+        default=6.0,
+    )
+    add_telemetry_arguments(parser, "quality")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("quality", profile_path=args.profile_path) as telemetry:
+        df_prepared: DataFrame = load_intermediate(
+            path=args.input.absolute(), utc_epoch=True, schema="prepared"
+        )
+        df_checked, quality_report = check_quality(
+            df_prepared,
+            max_gap_steps=args.max_gap_hours,
+            flatline_steps=args.flatline_hours,
+            outlier_threshold=args.outlier_threshold,
+        )
+        save_intermediate(df_checked, path=args.output.absolute(), schema="checked")
+        save_report(quality_report, args.report_path.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from pandas import Timestamp
+
+from .model import Model, load_model
+from .telemetry import (
+    StageTelemetry,
+    add_telemetry_arguments,
+    instrument,
+    record_file_read,
+    record_file_written,
+)
+from .timeaxis import SECONDS_PER_HOUR, calendar_fields
+
+# Temporaries of one predicted tile, in float64 values per input value
+TILE_TEMPORARIES = 4
+
+
+@dataclass
+class ScenarioForecast:
+    """
+    Aggregated generation forecast of a scenario cube, in MWh
+
+    Array axes are named by shape: M members, D local days, S sites, H hours,
+    Q quantile levels.
+    """
+
+    days: np.ndarray  # (D,) local dates, datetime64[D]
+    hours_per_day: np.ndarray  # (D,) hours of horizon in each day
+    daily_totals: np.ndarray  # (M, D, S)
+    peak: np.ndarray  # (M, S) peak hourly generation of each site
+    total_peak: np.ndarray  # (M,) peak hourly generation of all sites together
+    quantile_levels: np.ndarray  # (Q,)
+    hourly_quantiles: np.ndarray  # (Q, H, S)
+    daily_quantiles: np.ndarray  # (Q, D, S)
+    peak_quantiles: np.ndarray  # (Q, S)
+
+
+@instrument()
+def forecast_scenarios(
+    temperatures: np.ndarray,
+    models: Sequence[Model],
+    start: int,
+    quantile_levels: Sequence[float] = (0.05, 0.5, 0.95),
+    max_tile_bytes: int = 64 * 2**20,
+    local_timezone: str = "Europe/Helsinki",
+) -> ScenarioForecast:
+    """
+    Forecast generation for an ensemble of hourly temperature scenarios
+
+    The cube is processed in tiles of consecutive hours, over all members and sites,
+    so that memory use is bounded by 'max_tile_bytes' also when 'temperatures' is a
+    memory-mapped file. Each tile is predicted by broadcasting model over the tile,
+    and reduced into daily totals, peaks and hourly quantiles across members.
+
+    :param temperatures: air temperature (degC), shape (members, hours, sites)
+    :param models: one model for all sites, or one model per site
+    :param start: time of first hour, as UTC epoch seconds
+    :param quantile_levels: quantiles to compute across members
+    :param max_tile_bytes: approximate memory limit of tile computations
+    :param local_timezone: timezone, in which days are determined
+    :return: aggregated forecast
+    :raises ValueError: if a model is not a hinge model, whose prediction alone
+        broadcasts over the scenario cube
+    """
+    for model in models:
+        if not isinstance(model, Model):
+            raise ValueError(
+                f"Scenario forecasts need hinge models, got {type(model).__name__}"
+            )
+    if temperatures.ndim != 3:
+        raise ValueError("Temperatures must have shape (members, hours, sites)")
+    n_members, n_hours, n_sites = temperatures.shape
+    if len(models) not in (1, n_sites):
+        raise ValueError(f"Expected 1 or {n_sites} models, got {len(models)}")
+    quantile_levels = np.asarray(quantile_levels, dtype=np.float64)
+
+    dates = calendar_fields(
+        start + np.arange(n_hours) * SECONDS_PER_HOUR, local_timezone
+    )["date"]
+    days, day_index, hours_per_day = np.unique(
+        dates, return_inverse=True, return_counts=True
+    )
+
+    bytes_per_hour = n_members * n_sites * 8 * TILE_TEMPORARIES
+    tile_hours = max(1, max_tile_bytes // bytes_per_hour)
+    logging.info(f"Forecast {temperatures.shape=} scenarios, {tile_hours=}")
+
+    daily_totals = np.zeros((n_members, len(days), n_sites))
+    peak = np.full((n_members, n_sites), -np.inf)
+    total_peak = np.full(n_members, -np.inf)
+    hourly_quantiles = np.empty((len(quantile_levels), n_hours, n_sites))
+
+    for h0 in range(0, n_hours, tile_hours):
+        h1 = min(h0 + tile_hours, n_hours)
+        tile = np.asarray(temperatures[:, h0:h1, :], dtype=np.float64)
+        if not np.isfinite(tile).all():
+            raise ValueError(
+                f"Temperatures contain non-finite values in hours {h0}-{h1}"
+            )
+
+        if len(models) == 1:
+            predictions = models[0].predict(tile)
+        else:
+            predictions = np.empty_like(tile)
+            for s, model in enumerate(models):
+                predictions[:, :, s] = model.predict(tile[:, :, s])
+
+        segment_starts = np.flatnonzero(
+            np.diff(day_index[h0:h1], prepend=day_index[h0] - 1)
+        )
+        daily_totals[:, day_index[h0 + segment_starts], :] += np.add.reduceat(
+            predictions, segment_starts, axis=1
+        )
+        np.maximum(peak, predictions.max(axis=1), out=peak)
+        np.maximum(total_peak, predictions.sum(axis=2).max(axis=1), out=total_peak)
+        hourly_quantiles[:, h0:h1, :] = np.quantile(
+            predictions, quantile_levels, axis=0
+        )
+
+    return ScenarioForecast(
+        days=days,
+        hours_per_day=hours_per_day,
+        daily_totals=daily_totals,
+        peak=peak,
+        total_peak=total_peak,
+        quantile_levels=quantile_levels,
+        hourly_quantiles=hourly_quantiles,
+        daily_quantiles=np.quantile(daily_totals, quantile_levels, axis=0),
+        peak_quantiles=np.quantile(peak, quantile_levels, axis=0),
+    )
+
+
+def load_scenarios(path: Path) -> np.ndarray:
+    """Load scenario cube from .npy file, memory-mapped"""
+    logging.info(f"Load scenarios from {path}")
+    temperatures = np.load(path, mmap_mode="r")
+    record_file_read(path)
+    return temperatures
+
+
+def save_forecast(forecast: ScenarioForecast, path: Path):
+    """Save forecast arrays to .npz file, with field names as keys"""
+    logging.info(f"Save scenario forecast to {path}")
+    np.savez_compressed(path, **asdict(forecast))
+    record_file_written(path)
+
+
+def load_forecast(path: Path) -> ScenarioForecast:
+    logging.info(f"Load scenario forecast from {path}")
+    with np.load(path) as data:
+        forecast = ScenarioForecast(**{key: data[key] for key in data.files})
+    record_file_read(path)
+    return forecast
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Forecast generation for temperature scenarios",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--scenarios",
+        help="Where to read temperature scenarios, .npy array of shape (members, hours, sites)",
+        type=Path,
+        required=True,
+    )
+    parser.add_argument(
+        "--start",
+        help="Time of first scenario hour, ISO 8601 with UTC offset",
+        type=Timestamp,
+        required=True,
+    )
+    parser.add_argument(
+        "--model-paths",
+        help="Where to read models, one for all sites or one per site",
+        type=Path,
+        nargs="+",
+        default=[Path("models/model.joblib")],
+    )
+    parser.add_argument(
+        "--quantiles",
+        help="Quantile levels across members",
+        type=float,
+        nargs="+",
+        default=[0.05, 0.5, 0.95],
+    )
+    parser.add_argument(
+        "--max-tile-mb",
+        help="Approximate memory limit of tile computations, in MB",
+        type=float,
+        default=64,
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to save forecast .npz",
+        type=Path,
+        default=Path("output/scenario-forecast.npz"),
+    )
+    add_telemetry_arguments(parser, "scenario")
+
+    args = parser.parse_args()
+    if args.start.tzinfo is None:
+        parser.error("--start must have UTC offset")
+
+    with StageTelemetry("scenario", profile_path=args.profile_path) as telemetry:
+        scenario_models = [load_model(p.absolute()) for p in args.model_paths]
+        result = forecast_scenarios(
+            load_scenarios(args.scenarios.absolute()),
+            scenario_models,
+            start=args.start.value // 10**9,
+            quantile_levels=args.quantiles,
+            max_tile_bytes=int(args.max_tile_mb * 2**20),
+        )
+        save_forecast(result, args.output.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
@@ -0,0 +1,123 @@
+"""
+Declared column schemas of intermediate datasets
+
+Datasets are stored and held in memory with the narrowest dtypes that keep their
+precision. Precision contract:
+
+- Calendar features are exact integers, range-checked before narrowing.
+- Generation (MWh, 3 decimals in source) and air temperature (degC, 1 decimal) are
+  float32. Relative rounding error is at most 2**-24 (6e-8); for generation below
+  2048 MWh the absolute error is below 1.3e-4 MWh, under half of source resolution,
+  so source values are recovered exactly when rounded to their decimals.
+- Models compute in float64: :meth:`Model.feature_matrix` and the fitting routines
+  upcast float32 inputs. Fitted parameters and metrics stay within relative
+  tolerance 1e-6 of those computed from float64 data.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    dtype: str
+    nullable: bool = False
+    minimum: Optional[int] = None
+    maximum: Optional[int] = None
+
+
+PREPARED = {
+    "dh_MWh": ColumnSpec("float32"),
+    "Ilman lämpötila (degC)": ColumnSpec("float32", nullable=True),
+}
+
+CHECKED = {
+    "dh_MWh": ColumnSpec("float32"),
+    "Ilman lämpötila (degC)": ColumnSpec("float32"),
+}
+
+FEATURES = {
+    **CHECKED,
+    "hour_of_day": ColumnSpec("int8", minimum=0, maximum=23),
+    "day_of_week": ColumnSpec("int8", minimum=0, maximum=6),
+    "day_of_year": ColumnSpec("int16", minimum=1, maximum=366),
+    "epoch_seconds": ColumnSpec("int64"),
+    "is_business_day": ColumnSpec("int8", minimum=0, maximum=1),
+}
+
+SCHEMAS: dict[str, dict[str, ColumnSpec]] = {
+    "prepared": PREPARED,
+    "checked": CHECKED,
+    "features": FEATURES,
+}
+
+
+def apply_schema(df: DataFrame, schema: str) -> DataFrame:
+    """
+    Cast columns of dataframe to dtypes of schema, after validating their values
+
+    Columns not declared in schema are kept as they are.
+
+    :param df: input dataframe
+    :param schema: name of schema in :data:`SCHEMAS`
+    :return: dataframe with cast columns
+    :raises ValueError: if a column is missing, or its values violate the schema
+    """
+    columns = SCHEMAS[schema]
+    _check_columns(df, schema)
+    cast = {}
+    for name, spec in columns.items():
+        values = df[name].to_numpy()
+        _check_values(values, name, spec)
+        if (
+            values.dtype.kind == "f"
+            and np.dtype(spec.dtype).kind == "i"
+            and np.any(values != np.round(values))
+        ):
+            raise ValueError(f"Column {name!r} has non-integer values")
+        cast[name] = values.astype(spec.dtype)
+        _check_values(cast[name], name, spec)
+    return df.assign(**cast)
+
+
+def validate_schema(df: DataFrame, schema: str):
+    """
+    Check that dataframe columns have the dtypes and values declared in schema
+
+    :param df: dataframe
+    :param schema: name of schema in :data:`SCHEMAS`
+    :raises ValueError: if a column is missing, or has other dtype or invalid values
+    """
+    columns = SCHEMAS[schema]
+    _check_columns(df, schema)
+    for name, spec in columns.items():
+        if df[name].dtype != np.dtype(spec.dtype):
+            raise ValueError(
+                f"Column {name!r} has dtype {df[name].dtype}, expected {spec.dtype} "
+                f"of schema {schema!r}"
+            )
+        _check_values(df[name].to_numpy(), name, spec)
+
+
+def _check_columns(df: DataFrame, schema: str):
+    missing = [c for c in SCHEMAS[schema] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} of schema {schema!r} are missing")
+
+
+def _check_values(values: np.ndarray, name: str, spec: ColumnSpec):
+    if values.dtype.kind == "f":
+        finite = np.isfinite(values)
+        allowed = finite | (np.isnan(values) if spec.nullable else False)
+        if not allowed.all():
+            raise ValueError(f"Column {name!r} has missing or infinite values")
+        values = values[finite]
+    if spec.minimum is not None and np.any(values < spec.minimum):
+        raise ValueError(f"Column {name!r} has values below {spec.minimum}")
+    if spec.maximum is not None and np.any(values > spec.maximum):
+        raise ValueError(f"Column {name!r} has values above {spec.maximum}")
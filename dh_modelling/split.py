@@ -4,9 +4,15 @@ from pathlib import Path
 
 from pandas import DataFrame
 
-from dh_modelling.helpers import load_intermediate, save_intermediate
+from dh_modelling.helpers import (
+    add_utc_epoch_argument,
+    load_intermediate,
+    save_intermediate,
+)
+from dh_modelling.telemetry import StageTelemetry, add_telemetry_arguments, instrument
 
 
+@instrument()
 def train_test_split_sorted(
     df: DataFrame, test_size: float = 0.2
 ) -> tuple[DataFrame, DataFrame]:
@@ -54,10 +60,20 @@ if __name__ == "__main__":
         default=Path("data/processed/test.feather"),
     )
 
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "split")
+
     args = parser.parse_args()
 
-    df_all: DataFrame = load_intermediate(args.input.absolute())
+    with StageTelemetry("split", profile_path=args.profile_path) as telemetry:
+        df_all: DataFrame = load_intermediate(
+            args.input.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+
+        train, test = train_test_split_sorted(df_all, test_size=args.test_size)
+        save_intermediate(train, path=args.train_output.absolute(), schema="features")
+        save_intermediate(test, path=args.test_output.absolute(), schema="features")
 
-    train, test = train_test_split_sorted(df_all, test_size=args.test_size)
-    save_intermediate(train, path=args.train_output.absolute())
-    save_intermediate(test, path=args.test_output.absolute())
+    telemetry.save(args.telemetry_path.absolute())
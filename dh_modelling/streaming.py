@@ -0,0 +1,214 @@
+import argparse
+import itertools
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, Series, concat
+
+from .evaluate import MetricsAccumulator, save_metrics
+from .featurize import featurize
+from .helpers import IntermediateWriter
+from .model import Model, save_model
+from .prepare import FmiData, GenerationData, merge_dataframes
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+
+
+def merge_batches(
+    generation: Iterable[DataFrame], weather: Iterable[DataFrame]
+) -> Iterator[DataFrame]:
+    """
+    Left join weather batches on generation batches, as :func:`merge_dataframes`
+
+    Both streams must be in chronological order. Weather batches are buffered only
+    until they cover the current generation batch. Generation rows after the end of
+    the weather stream get missing weather values.
+
+    :param generation: generation data batches
+    :param weather: weather data batches
+    :return: iterator of merged batches
+    """
+    weather = iter(weather)
+    buffer: list[DataFrame] = []
+    weather_end = None
+    generation_end = None
+
+    for batch in generation:
+        if batch.empty:
+            continue
+        if not batch.index.is_monotonic_increasing or (
+            generation_end is not None and batch.index[0] <= generation_end
+        ):
+            raise ValueError("Generation data is not in chronological order")
+        generation_end = batch.index[-1]
+
+        while weather_end is None or weather_end < generation_end:
+            weather_batch = next(weather, None)
+            if weather_batch is None:
+                break
+            if not weather_batch.empty:
+                buffer.append(weather_batch)
+                weather_end = weather_batch.index[-1]
+
+        df_weather = concat(buffer) if buffer else _empty_weather(batch)
+        yield merge_dataframes(df_helen=batch, df_fmi=df_weather)
+        buffer = [df_weather.loc[df_weather.index > generation_end]]
+
+
+def _empty_weather(generation: DataFrame) -> DataFrame:
+    """Weather batch without rows, indexed as 'generation'"""
+    index = DatetimeIndex([], tz=generation.index.tz, name=generation.index.name)
+    return DataFrame({"Ilman lämpötila (degC)": Series(dtype=np.float64)}, index=index)
+
+
+def write_batches(batches: Iterable[DataFrame], path: Path) -> Iterator[DataFrame]:
+    """
+    Pass batches through, saving them to intermediate file 'path' on the way
+    """
+    with IntermediateWriter(path, schema="features") as writer:
+        for batch in batches:
+            writer.write(batch)
+            yield batch
+
+
+@instrument()
+def run_streaming(
+    generation: GenerationData,
+    weather: FmiData,
+    model: Model,
+    test_size: float = 0.2,
+    batch_size: int = 10_000,
+    features_path: Optional[Path] = None,
+) -> dict[str, float]:
+    """
+    Run prepare, featurize, split, train and evaluate chain in batches
+
+    Data is never held in memory as a whole: peak memory is bounded by batch size.
+    Results match the in-memory stages. Generation data must be in chronological
+    order, as the test set is taken from its end.
+
+    :param generation: generation data loader
+    :param weather: weather data loader
+    :param model: model to fit on train batches
+    :param test_size: fraction of test size of all points
+    :param batch_size: number of rows per batch
+    :param features_path: if given, save featurized batches to this location
+    :return: test metrics, as from :func:`evaluate`
+    """
+    n_train = int(generation.count_rows() * (1 - test_size))
+    logging.info(f"Run streaming chain, {batch_size=}, {n_train=}")
+
+    batches: Iterator[DataFrame] = (
+        featurize(batch)
+        for batch in merge_batches(
+            generation.load_batches(batch_size), weather.load_batches(batch_size)
+        )
+    )
+    if features_path is not None:
+        batches = write_batches(batches, features_path)
+
+    test_head: list[DataFrame] = []
+
+    def train_batches() -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        n_seen = 0
+        for batch in batches:
+            n_take = min(len(batch), n_train - n_seen)
+            n_seen += n_take
+            if n_take > 0:
+                train_batch = batch.iloc[:n_take]
+                X = model.feature_matrix(train_batch)
+                yield X, train_batch["dh_MWh"].to_numpy()
+            if n_take < len(batch):
+                test_head.append(batch.iloc[n_take:])
+                return
+
+    model.fit_batches(train_batches())
+
+    metrics = MetricsAccumulator()
+    for batch in itertools.chain(test_head, batches):
+        metrics.update(
+            batch["dh_MWh"].to_numpy(), model.predict(model.feature_matrix(batch))
+        )
+    return metrics.result()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Run prepare, featurize, split, train and evaluate in batches",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input",
+        help="Where to read raw generation data",
+        type=Path,
+        default=Path("data/raw/hki_dh_2015_2020_a.csv"),
+    )
+    parser.add_argument(
+        "--fmi-dir",
+        help="Directory, where to read raw FMI weather files",
+        type=Path,
+        default=Path("data/raw/fmi"),
+    )
+    parser.add_argument(
+        "--fmi-station-name",
+        help="Station name, which to use in FMI csv lookup in fmi-dir",
+        type=str,
+        default="Helsinki Kaisaniemi",
+    )
+    parser.add_argument(
+        "--test-size", help="Test data size, fraction of total", type=float, default=0.2
+    )
+    parser.add_argument(
+        "--batch-size", help="Number of rows per batch", type=int, default=10_000
+    )
+    parser.add_argument(
+        "--hinge-temperature",
+        help="Temperature (degC), above which generation is constant",
+        type=float,
+        default=17,
+    )
+    parser.add_argument(
+        "--features-output",
+        help="Where to save featurized dataframe, not saved if omitted",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--model-path",
+        help="Where to save model",
+        type=Path,
+        default=Path("models/model.joblib"),
+    )
+    parser.add_argument(
+        "--metrics-path",
+        help="Where to save test metrics",
+        type=Path,
+        default=Path("output/score.json"),
+    )
+    add_telemetry_arguments(parser, "streaming")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("streaming", profile_path=args.profile_path) as telemetry:
+        generation_loader = GenerationData(raw_file_path=args.input.absolute())
+        fmi_loader: FmiData = FmiData.read_fmi_files(
+            directory=args.fmi_dir.absolute(), station_name=args.fmi_station_name
+        )
+        model = Model(hinge_temperature=args.hinge_temperature)
+
+        metrics: dict = run_streaming(
+            generation_loader,
+            fmi_loader,
+            model,
+            test_size=args.test_size,
+            batch_size=args.batch_size,
+            features_path=args.features_output and args.features_output.absolute(),
+        )
+
+        save_model(model, args.model_path.absolute())
+        save_metrics(metrics, args.metrics_path.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
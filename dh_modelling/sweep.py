@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+import yaml
+from pandas import DataFrame
+
+from .boosted import BoostedModel
+from .evaluate import evaluate
+from .helpers import add_utc_epoch_argument, load_intermediate
+from .model import Model
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+from .timeaxis import SECONDS_PER_HOUR
+from .train import train
+
+_worker_frames: dict[str, DataFrame] = {}
+_worker_memory: list[SharedMemory] = []
+
+
+@dataclass(frozen=True)
+class SharedFrame:
+    """
+    Handle to numeric dataframe columns, stored in a shared memory block
+
+    The handle is small and picklable: worker processes use it to attach to the
+    block and get a read-only dataframe view, without copying the data.
+    """
+
+    name: str
+    columns: tuple[str, ...]
+    n_rows: int
+
+    @classmethod
+    def create(
+        cls, df: DataFrame, columns: list[str]
+    ) -> tuple[SharedFrame, SharedMemory]:
+        """
+        Copy 'columns' of 'df' into a new shared memory block, as float64
+
+        :return: handle, and the shared memory block that the caller must unlink
+        """
+        array = df[columns].to_numpy(dtype=np.float64)
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf)[:] = array
+        return cls(name=shm.name, columns=tuple(columns), n_rows=len(array)), shm
+
+    def attach(self) -> tuple[DataFrame, SharedMemory]:
+        """
+        Attach to shared block from another process
+
+        :return: read-only dataframe view, and the block that must be kept open while
+            the view is in use
+        """
+        shm = SharedMemory(name=self.name)
+        array = np.ndarray(
+            (self.n_rows, len(self.columns)), dtype=np.float64, buffer=shm.buf
+        )
+        array.flags.writeable = False
+        return DataFrame(array, columns=list(self.columns), copy=False), shm
+
+
+@dataclass(frozen=True)
+class SweepConfig:
+    model_type: str = "hinge"
+    hinge_temperature: float = 17
+    train_window_hours: Optional[int] = None
+    features: Optional[tuple[str, ...]] = None
+
+    def create_model(self) -> Union[Model, BoostedModel]:
+        if self.model_type == "boosted":
+            # Sweep workers run in parallel, use one thread each
+            features = list(self.features) if self.features else None
+            return BoostedModel(feature_columns=features, n_jobs=1)
+        return Model(hinge_temperature=self.hinge_temperature)
+
+    @staticmethod
+    def grid(space: dict[str, list]) -> list[SweepConfig]:
+        """
+        Cartesian product of parameter values
+
+        :param space: mapping from parameter name to list of values, feature subsets
+            given as lists of column names
+        :return: list of configurations
+        """
+        keys = list(space)
+        values = [
+            [tuple(v) if isinstance(v, list) else v for v in space[k]] for k in keys
+        ]
+        return [SweepConfig(**dict(zip(keys, p))) for p in itertools.product(*values)]
+
+
+def _attach_worker(frames: dict[str, SharedFrame]):
+    for key, frame in frames.items():
+        _worker_frames[key], shm = frame.attach()
+        _worker_memory.append(shm)
+
+
+def _training_window(df: DataFrame, hours: int) -> DataFrame:
+    """
+    Rows of last 'hours' hours, by column 'epoch_seconds' of time-sorted dataframe
+
+    Shared frames have no index, and after gaps or quality filtering a row is not
+    an hour, so the window is selected by timestamp rather than row count.
+    """
+    epoch = df["epoch_seconds"].to_numpy()
+    start = epoch[-1] - hours * SECONDS_PER_HOUR
+    return df.iloc[np.searchsorted(epoch, start, side="right") :]
+
+
+def _subsample(df: DataFrame, fraction: float) -> DataFrame:
+    """
+    Evenly spaced 'fraction' of rows, spread over the whole dataframe
+
+    Taking the most recent rows instead would cover only part of the seasonal cycle,
+    e.g. only summer, which misleads screening of heating models.
+    """
+    n_rows = max(int(len(df) * fraction), 1)
+    if n_rows >= len(df):
+        return df
+    return df.iloc[np.linspace(0, len(df) - 1, n_rows).round().astype(np.int64)]
+
+
+def _run_config(config: SweepConfig, train_fraction: float = 1.0) -> dict[str, Any]:
+    df_train = _worker_frames["train"]
+    if config.train_window_hours is not None:
+        df_train = _training_window(df_train, config.train_window_hours)
+
+    model = config.create_model()
+    train(_subsample(df_train, train_fraction), model)
+    return evaluate(model, _worker_frames["test"])
+
+
+@instrument()
+def run_sweep(
+    df_train: DataFrame,
+    df_test: DataFrame,
+    configs: list[SweepConfig],
+    n_workers: Optional[int] = None,
+    screening_fraction: Optional[float] = None,
+    abandon_ratio: float = 1.5,
+) -> DataFrame:
+    """
+    Train and evaluate all configurations in a process pool, sharing data between workers
+
+    Numeric columns of train and test data are placed in shared memory once, worker
+    processes attach to them without copying.
+
+    With 'screening_fraction', all configurations are first trained on that fraction
+    of their training window, evenly spaced over the window. Configurations with screening mean
+    absolute error above 'abandon_ratio' times the best one are abandoned, and only
+    the rest are trained on full training window.
+
+    :param df_train: train dataframe
+    :param df_test: test dataframe
+    :param configs: configurations to run
+    :param n_workers: number of worker processes, defaults to number of CPUs
+    :param screening_fraction: fraction of training window in screening round,
+        no screening if None
+    :param abandon_ratio: error ratio to best screening result, above which
+        configuration is abandoned
+    :return: results table, one row per configuration, sorted by mean absolute error
+    """
+    logging.info(f"Run sweep over {len(configs)} configurations")
+    columns = list(df_train.select_dtypes("number").columns)
+    shared_train, shm_train = SharedFrame.create(df_train, columns)
+    shared_test, shm_test = SharedFrame.create(df_test, columns)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers or os.cpu_count(),
+            initializer=_attach_worker,
+            initargs=({"train": shared_train, "test": shared_test},),
+        ) as executor:
+            results = [dict(config.__dict__, status="complete") for config in configs]
+            candidates = list(range(len(configs)))
+
+            if screening_fraction is not None:
+                screening = list(
+                    executor.map(
+                        _run_config,
+                        configs,
+                        itertools.repeat(screening_fraction),
+                    )
+                )
+                best = min(m["mean_absolute_error"] for m in screening)
+                for result, metrics in zip(results, screening):
+                    result["screening_mean_absolute_error"] = metrics[
+                        "mean_absolute_error"
+                    ]
+                candidates = [
+                    i
+                    for i, metrics in enumerate(screening)
+                    if metrics["mean_absolute_error"] <= abandon_ratio * best
+                ]
+                logging.info(
+                    f"Abandon {len(configs) - len(candidates)} configurations after screening"
+                )
+                for i in set(range(len(configs))) - set(candidates):
+                    results[i]["status"] = "abandoned"
+
+            full = executor.map(_run_config, [configs[i] for i in candidates])
+            for i, metrics in zip(candidates, full):
+                results[i].update(metrics)
+    finally:
+        for shm in (shm_train, shm_test):
+            shm.close()
+            shm.unlink()
+
+    return (
+        DataFrame(results)
+        .sort_values("mean_absolute_error", na_position="last")
+        .reset_index(drop=True)
+    )
+
+
+def load_sweep_params(path: Path) -> dict:
+    """
+    Load sweep definition from 'sweep' section of params file
+
+    :param path: location of params.yaml
+    :return: sweep section
+    """
+    logging.info(f"Load sweep parameters from {path}")
+    with open(path) as f:
+        return yaml.safe_load(f)["sweep"]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Sweep model parameters",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--train-path",
+        help="Where to read train dataframe",
+        type=Path,
+        default=Path("data/processed/train.feather"),
+    )
+    parser.add_argument(
+        "--test-path",
+        help="Where to load test dataframe",
+        type=Path,
+        default=Path("data/processed/test.feather"),
+    )
+    parser.add_argument(
+        "--params-path",
+        help="Where to read sweep definition",
+        type=Path,
+        default=Path("params.yaml"),
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to save results table",
+        type=Path,
+        default=Path("output/sweep.csv"),
+    )
+    parser.add_argument(
+        "--workers", help="Number of worker processes", type=int, default=None
+    )
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "sweep")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("sweep", profile_path=args.profile_path) as telemetry:
+        params: dict = load_sweep_params(args.params_path.absolute())
+
+        df_train: DataFrame = load_intermediate(
+            path=args.train_path.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+        df_test: DataFrame = load_intermediate(
+            path=args.test_path.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+
+        results: DataFrame = run_sweep(
+            df_train,
+            df_test,
+            SweepConfig.grid(params["grid"]),
+            n_workers=args.workers,
+            screening_fraction=params.get("screening_fraction"),
+            abandon_ratio=params.get("abandon_ratio", 1.5),
+        )
+
+        logging.info(f"Save sweep results to {args.output}")
+        results.to_csv(args.output.absolute(), index=False)
+
+    telemetry.save(args.telemetry_path.absolute())
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, cast
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_active: list[StageTelemetry] = []
+
+
+@dataclass
+class StepMetrics:
+    """Resource usage of one stage or sub-step, accumulated over all its calls"""
+
+    calls: int = 0
+    wall_time_s: float = 0.0
+    cpu_time_s: float = 0.0
+    # ru_maxrss is a process-wide high-water mark: steps after the largest one
+    # report the same process peak, and only the step that raised it has growth
+    process_peak_rss_mb: float = 0.0
+    peak_rss_growth_mb: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+
+class StageTelemetry:
+    def __init__(self, stage: str, profile_path: Optional[Path] = None):
+        """
+        Record resource usage of a pipeline stage and its instrumented sub-steps
+
+        Use as a context manager around the stage body. While active, functions
+        decorated with :func:`instrument` are recorded as sub-steps of the stage.
+        Totals of the whole stage are kept apart from the sub-steps, in 'total', so
+        that a sub-step may have the same name as the stage.
+
+        :param stage: name of stage, e.g. 'prepare'
+        :param profile_path: if given, run cProfile over the stage and dump
+            statistics to this location
+        """
+        self.stage = stage
+        self.profile_path = profile_path
+        self.total = StepMetrics()
+        self.steps: dict[str, StepMetrics] = {}
+        self._open_steps: list[StepMetrics] = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._stage_started: Optional[tuple[float, float, float]] = None
+
+    def __enter__(self) -> StageTelemetry:
+        _active.append(self)
+        if self.profile_path is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._stage_started = self._start(self.total)
+        return self
+
+    def __exit__(self, *exc_info):
+        assert self._stage_started is not None
+        self._end(self.total, self._stage_started)
+        if self._profiler is not None:
+            self._profiler.disable()
+            logging.info(f"Save profile to {self.profile_path}")
+            self._profiler.dump_stats(str(self.profile_path))
+            self._profiler = None
+        _active.remove(self)
+
+    def start_step(self, name: str, rows_in: int = 0) -> tuple[float, float, float]:
+        """
+        Open step 'name', return start times and process peak RSS for :meth:`end_step`
+        """
+        return self._start(self.steps.setdefault(name, StepMetrics()), rows_in)
+
+    def end_step(
+        self, name: str, started: tuple[float, float, float], rows_out: int = 0
+    ):
+        self._end(self.steps[name], started, rows_out)
+
+    def _start(
+        self, metrics: StepMetrics, rows_in: int = 0
+    ) -> tuple[float, float, float]:
+        metrics.calls += 1
+        metrics.rows_in += rows_in
+        self._open_steps.append(metrics)
+        return time.perf_counter(), time.process_time(), peak_rss_mb()
+
+    def _end(
+        self,
+        metrics: StepMetrics,
+        started: tuple[float, float, float],
+        rows_out: int = 0,
+    ):
+        wall_start, cpu_start, rss_start = started
+        assert self._open_steps.pop() is metrics
+        metrics.wall_time_s += time.perf_counter() - wall_start
+        metrics.cpu_time_s += time.process_time() - cpu_start
+        metrics.rows_out += rows_out
+        peak = peak_rss_mb()
+        metrics.process_peak_rss_mb = max(metrics.process_peak_rss_mb, peak)
+        metrics.peak_rss_growth_mb = max(metrics.peak_rss_growth_mb, peak - rss_start)
+
+    def add_bytes(self, read: int = 0, written: int = 0):
+        """Attribute I/O volume to all currently open steps"""
+        for metrics in self._open_steps:
+            metrics.bytes_read += read
+            metrics.bytes_written += written
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "total": asdict(self.total),
+            "steps": {name: asdict(metrics) for name, metrics in self.steps.items()},
+        }
+
+    def save(self, path: Path):
+        logging.info(f"Save telemetry to {path=}")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in megabytes
+
+    :return: high-water mark of memory usage, 0 if not available on platform
+    """
+    if resource is None:  # pragma: no cover
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    divisor = 1024**2 if sys.platform == "darwin" else 1024
+    return max_rss / divisor
+
+
+def _row_count(obj: Any) -> int:
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(obj, tuple):
+        return sum(_row_count(o) for o in obj)
+    return 0
+
+
+def instrument(name: Optional[str] = None) -> Callable[[F], F]:
+    """
+    Record calls of decorated function as sub-steps of the active stage telemetry
+
+    Rows in are counted from the first array-like argument, rows out from the
+    return value (summed over tuple members). Without active telemetry, the
+    function is called as such.
+
+    :param name: step name, defaults to qualified name of the function
+    """
+
+    def decorator(func: F) -> F:
+        step_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return func(*args, **kwargs)
+            telemetry = _active[-1]
+            first_array = next(
+                (a for a in (*args, *kwargs.values()) if hasattr(a, "shape")), None
+            )
+            started = telemetry.start_step(step_name, rows_in=_row_count(first_array))
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                telemetry.end_step(step_name, started, rows_out=_row_count(result))
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def record_file_read(path: os.PathLike):
+    """Add size of file 'path' to bytes read of active stage telemetry"""
+    if _active and isinstance(path, (str, os.PathLike)):
+        _active[-1].add_bytes(read=os.path.getsize(path))
+
+
+def record_file_written(path: os.PathLike):
+    """Add size of file 'path' to bytes written of active stage telemetry"""
+    if _active and isinstance(path, (str, os.PathLike)):
+        _active[-1].add_bytes(written=os.path.getsize(path))
+
+
+def add_telemetry_arguments(parser: argparse.ArgumentParser, stage: str):
+    """
+    Add command line arguments '--telemetry-path' and '--profile-path'
+
+    :param parser: stage argument parser
+    :param stage: stage name, used in default telemetry file name
+    """
+    parser.add_argument(
+        "--telemetry-path",
+        help="Where to save stage telemetry",
+        type=Path,
+        default=Path(f"output/telemetry-{stage}.json"),
+    )
+    parser.add_argument(
+        "--profile-path",
+        help="Where to save cProfile statistics of stage, not profiled if omitted",
+        type=Path,
+        default=None,
+    )
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import numpy as np
+from pandas import DatetimeIndex
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+
+class UtcOffsetTable:
+    def __init__(self, transitions: np.ndarray, offsets: np.ndarray):
+        """
+        Vectorized lookup of UTC offset of a timezone
+
+        :param transitions: sorted epoch seconds, from which the respective offset applies
+        :param offsets: UTC offset in seconds, from each transition on
+        """
+        self.transitions = transitions
+        self.offsets = offsets
+
+    @classmethod
+    def for_range(cls, start: int, end: int, timezone: str) -> UtcOffsetTable:
+        """
+        Find UTC offset transitions of 'timezone' between epoch seconds 'start' and 'end'
+
+        Offsets are sampled daily; days where offset changes are resampled at minute
+        resolution to locate the transition.
+
+        :param start: first epoch second, that must be covered
+        :param end: last epoch second, that must be covered
+        :param timezone: timezone name, e.g. 'Europe/Helsinki'
+        :return: offset table
+        """
+        first_day = start // SECONDS_PER_DAY - 1
+        last_day = end // SECONDS_PER_DAY + 1
+        days = np.arange(first_day, last_day + 1) * SECONDS_PER_DAY
+        day_offsets = _utc_offsets(days, timezone)
+
+        transitions = [days[0]]
+        offsets = [day_offsets[0]]
+        for i in np.flatnonzero(np.diff(day_offsets)):
+            minutes = days[i] + np.arange(0, SECONDS_PER_DAY + 1, 60)
+            minute_offsets = _utc_offsets(minutes, timezone)
+            for j in np.flatnonzero(np.diff(minute_offsets)):
+                transitions.append(minutes[j + 1])
+                offsets.append(minute_offsets[j + 1])
+
+        return cls(np.array(transitions, np.int64), np.array(offsets, np.int64))
+
+    def lookup(self, epoch_seconds: np.ndarray) -> np.ndarray:
+        """UTC offset in seconds at each of 'epoch_seconds'"""
+        idx = np.searchsorted(self.transitions, epoch_seconds, side="right") - 1
+        return self.offsets[idx]
+
+
+def _utc_offsets(epoch_seconds: np.ndarray, timezone: str) -> np.ndarray:
+    utc = DatetimeIndex(epoch_seconds * 10**9, tz="UTC")
+    local = utc.tz_convert(timezone).tz_localize(None)
+    return (local.asi8 - utc.tz_localize(None).asi8) // 10**9
+
+
+def local_seconds(epoch_seconds: np.ndarray, timezone: str) -> np.ndarray:
+    """
+    Local wall clock time of UTC 'epoch_seconds', as seconds since 1970-01-01 00:00
+
+    :param epoch_seconds: int64 array of seconds since epoch, UTC
+    :param timezone: timezone name
+    :return: int64 array of local seconds
+    """
+    if len(epoch_seconds) == 0:
+        return epoch_seconds.astype(np.int64)
+    table = UtcOffsetTable.for_range(
+        int(epoch_seconds.min()), int(epoch_seconds.max()), timezone
+    )
+    return epoch_seconds + table.lookup(epoch_seconds)
+
+
+def calendar_fields(epoch_seconds: np.ndarray, timezone: str) -> dict[str, np.ndarray]:
+    """
+    Local calendar fields of UTC epoch seconds, without timezone-aware objects
+
+    :param epoch_seconds: int64 array of seconds since epoch, UTC
+    :param timezone: timezone, in which calendar fields are determined
+    :return: dictionary of int64 arrays 'hour_of_day', 'day_of_week' (Monday=0) and
+        'day_of_year', and 'date' as datetime64[D] array of local dates
+    """
+    local = local_seconds(np.asarray(epoch_seconds, np.int64), timezone)
+    days = local // SECONDS_PER_DAY
+    dates = days.astype("datetime64[D]")
+    return {
+        "hour_of_day": (local % SECONDS_PER_DAY) // SECONDS_PER_HOUR,
+        # 1970-01-01 was a Thursday
+        "day_of_week": (days + 3) % 7,
+        "day_of_year": (dates - dates.astype("datetime64[Y]")).astype(np.int64) + 1,
+        "date": dates,
+    }
+
+
+def to_epoch_seconds(idx: DatetimeIndex) -> np.ndarray:
+    """Seconds since epoch of timezone-aware index, as int64 array"""
+    return idx.asi8 // 10**9
+
+
+def to_datetime_index(epoch: np.ndarray, timezone: str = "UTC") -> DatetimeIndex:
+    """Timezone-aware index from int64 epoch seconds, for use at API edges"""
+    return DatetimeIndex(np.asarray(epoch, np.int64) * 10**9, tz="UTC").tz_convert(
+        timezone
+    )
@@ -1,18 +1,24 @@
 import argparse
 import logging
 from pathlib import Path
+from typing import Union
 
 import numpy as np
 from pandas import DataFrame
 
-from .helpers import load_intermediate
+from .boosted import BoostedModel
+from .helpers import add_utc_epoch_argument, load_intermediate
 from .model import Model, save_model
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
 
+MODEL_TYPES = {"hinge": Model, "boosted": BoostedModel}
 
-def train(df: DataFrame, model: Model):
+
+@instrument()
+def train(df: DataFrame, model: Union[Model, BoostedModel]):
     logging.info("Train model")
 
-    X: np.ndarray = df["Ilman lämpötila (degC)"].to_numpy()
+    X: np.ndarray = model.feature_matrix(df)
     y: np.ndarray = df["dh_MWh"].to_numpy()
 
     model.fit(X, y)
@@ -37,12 +43,53 @@ if __name__ == "__main__":
         type=Path,
         default=Path("models/model.joblib"),
     )
+    parser.add_argument(
+        "--model-type",
+        help="Type of model to train",
+        choices=list(MODEL_TYPES),
+        default="hinge",
+    )
+    parser.add_argument(
+        "--hinge-temperature",
+        help="Temperature (degC), above which generation is constant, in hinge model",
+        type=float,
+        default=17,
+    )
+    parser.add_argument(
+        "--forgetting-factor",
+        help="Weight decay per observation in online updates of hinge model",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Where to cache binned training matrices of boosted model",
+        type=Path,
+        default=Path("data/intermediate/cache"),
+    )
+
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "train")
 
     args = parser.parse_args()
 
-    df_train: DataFrame = load_intermediate(path=args.train_path.absolute())
+    with StageTelemetry("train", profile_path=args.profile_path) as telemetry:
+        df_train: DataFrame = load_intermediate(
+            path=args.train_path.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+
+        model: Union[Model, BoostedModel]
+        if args.model_type == "boosted":
+            model = BoostedModel(cache_dir=args.cache_dir.absolute())
+        else:
+            model = Model(
+                hinge_temperature=args.hinge_temperature,
+                forgetting_factor=args.forgetting_factor,
+            )
+        train(df_train, model)
 
-    model: Model = Model()
-    train(df_train, model)
+        save_model(model, args.model_path.absolute())
 
-    save_model(model, args.model_path.absolute())
+    telemetry.save(args.telemetry_path.absolute())
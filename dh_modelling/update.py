@@ -0,0 +1,68 @@
+import argparse
+import logging
+from pathlib import Path
+
+from pandas import DataFrame
+
+from .helpers import add_utc_epoch_argument, load_intermediate
+from .model import Model, load_model, save_model
+from .telemetry import StageTelemetry, add_telemetry_arguments, instrument
+
+
+@instrument()
+def update(df: DataFrame, model: Model):
+    """
+    Update trained model online with new featurized observations
+
+    :param df: new observations, in chronological order
+    :param model: model to update, see :meth:`Model.partial_fit`
+    :raises ValueError: if model is not a hinge model, which alone supports
+        online updates
+    """
+    if not isinstance(model, Model):
+        raise ValueError(
+            f"Online updates need a hinge model, got {type(model).__name__}; "
+            "retrain it instead"
+        )
+    logging.info(f"Update model with {len(df)} observations")
+
+    model.partial_fit(model.feature_matrix(df), df["dh_MWh"].to_numpy())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Update model online with new observations",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input",
+        help="Where to read featurized dataframe of new observations",
+        type=Path,
+        required=True,
+    )
+    parser.add_argument(
+        "--model-path",
+        help="Where to read model, and save updated model",
+        type=Path,
+        default=Path("models/model.joblib"),
+    )
+
+    add_utc_epoch_argument(parser)
+    add_telemetry_arguments(parser, "update")
+
+    args = parser.parse_args()
+
+    with StageTelemetry("update", profile_path=args.profile_path) as telemetry:
+        df_new: DataFrame = load_intermediate(
+            path=args.input.absolute(),
+            utc_epoch=args.utc_epoch,
+            schema="features",
+        )
+        model: Model = load_model(args.model_path.absolute())
+        update(df_new, model)
+
+        save_model(model, args.model_path.absolute())
+
+    telemetry.save(args.telemetry_path.absolute())
@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from dh_modelling.boosted import MISSING_BIN, BoostedModel
+from dh_modelling.evaluate import evaluate, save_metrics
+from dh_modelling.model import load_model, save_model
+
+
+def _features(n: int, seed: int = 0) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n)
+    temperature = rng.uniform(-25, 30, n)
+    df = DataFrame(
+        {
+            "Ilman lämpötila (degC)": temperature,
+            "hour_of_day": hours % 24,
+            "day_of_week": (hours // 24) % 7,
+            "day_of_year": (hours // 24) % 365 + 1,
+            "is_business_day": ((hours // 24) % 7 < 5).astype(np.int32),
+        }
+    )
+    df["dh_MWh"] = (
+        np.where(temperature < 17, 700 - 35 * (temperature - 17), 700)
+        + 50 * df["is_business_day"]
+        + rng.normal(0, 5, n)
+    )
+    return df
+
+
+def test_feature_matrix():
+    df = _features(5)
+    X = BoostedModel().feature_matrix(df)
+
+    assert X.dtype == np.float32
+    assert X.flags["C_CONTIGUOUS"]
+    assert X.shape == (5, 5)
+
+
+def test_boosted_model():
+    df = _features(2000)
+    model = BoostedModel(n_estimators=50, early_stopping_rounds=5)
+    X = model.feature_matrix(df)
+
+    model.fit(X, df["dh_MWh"].to_numpy())
+    predictions = model.predict(X)
+
+    assert predictions.shape == (2000,)
+    assert np.mean(np.abs(predictions - df["dh_MWh"])) < 50
+
+
+def test_evaluate_boosted_model(tmp_path):
+    df = _features(200)
+    model = BoostedModel(n_estimators=3)
+    model.fit(model.feature_matrix(df), df["dh_MWh"].to_numpy())
+
+    assert model.predict(model.feature_matrix(df)).dtype == np.float64
+    metrics = evaluate(model, df)
+    save_metrics(metrics, tmp_path / "score.json")
+
+    with open(tmp_path / "score.json") as f:
+        assert json.load(f) == pytest.approx(metrics)
+
+
+def test_boosted_model_without_validation():
+    df = _features(20)
+    model = BoostedModel(n_estimators=3, validation_fraction=0)
+    X = model.feature_matrix(df)
+
+    model.fit(X, df["dh_MWh"].to_numpy())
+
+    assert model.predict(X).shape == (20,)
+
+
+def test_binning():
+    model = BoostedModel(max_bin=4)
+    X = np.array([[0.0, 1.0], [1.0, 1.0], [2.0, np.nan], [3.0, 1.0]], np.float32)
+
+    model.bin_edges = model._fit_bin_edges(X)
+    received = model._bin(X)
+
+    np.testing.assert_array_equal(received[:, 0], [0, 1, 2, 3])
+    np.testing.assert_array_equal(received[:, 1], [1, 1, MISSING_BIN, 1])
+
+
+def test_binned_matrix_cache(tmp_path, mocker):
+    df = _features(100)
+    X = BoostedModel().feature_matrix(df)
+
+    first = BoostedModel(cache_dir=tmp_path)
+    expected = first._binned_training_matrix(X)
+    assert len(list(tmp_path.glob("binned-*.npz"))) == 1
+
+    second = BoostedModel(cache_dir=tmp_path)
+    fit_bin_edges = mocker.patch.object(second, "_fit_bin_edges")
+    received = second._binned_training_matrix(X)
+
+    fit_bin_edges.assert_not_called()
+    np.testing.assert_array_equal(received, expected)
+    np.testing.assert_array_equal(second.bin_edges, first.bin_edges)
+
+
+def test_binned_matrix_cache_eviction(tmp_path):
+    model = BoostedModel(cache_dir=tmp_path)
+    X = model.feature_matrix(_features(100))
+    model._binned_training_matrix(X)
+    (size,) = [path.stat().st_size for path in tmp_path.glob("binned-*.npz")]
+
+    model.cache_max_bytes = 2 * size
+    for seed in range(1, 4):
+        model._binned_training_matrix(model.feature_matrix(_features(100, seed)))
+
+    assert len(list(tmp_path.glob("binned-*.npz"))) == 2
+
+
+def test_save_load_boosted_model(tmp_path):
+    df = _features(100)
+    model = BoostedModel(n_estimators=3)
+    model.fit(model.feature_matrix(df), df["dh_MWh"].to_numpy())
+
+    save_model(model, tmp_path / "model.joblib")
+    received = load_model(tmp_path / "model.joblib")
+
+    assert received == model
+    np.testing.assert_array_equal(
+        received.predict(received.feature_matrix(df)),
+        model.predict(model.feature_matrix(df)),
+    )
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from dh_modelling.compare import compare_models, diebold_mariano
+from dh_modelling.evaluate import evaluate
+from dh_modelling.model import Model, save_model
+
+
+def _test_data(n: int) -> DataFrame:
+    rng = np.random.default_rng(0)
+    temperature = rng.uniform(-25, 30, n)
+    return DataFrame(
+        {
+            "Ilman lämpötila (degC)": temperature,
+            "dh_MWh": np.where(temperature < 17, 700 - 35 * (temperature - 17), 700)
+            + rng.normal(0, 10, n),
+        }
+    )
+
+
+def test_compare_models(tmp_path):
+    df = _test_data(500)
+    paths = []
+    models = []
+    for i, (y0, k1) in enumerate([(650, -35), (700, -35), (700, -30)]):
+        model = Model()
+        model.params = np.array([y0, k1])
+        save_model(model, tmp_path / f"model-{i}.joblib")
+        paths.append(tmp_path / f"model-{i}.joblib")
+        models.append(model)
+
+    ranking, pairwise = compare_models(df, paths, n_workers=2)
+
+    assert ranking["model"].tolist() == [str(paths[i]) for i in [1, 0, 2]]
+    assert ranking["rank"].tolist() == [1, 2, 3]
+    for path, model in zip(paths, models):
+        row = ranking.set_index("model").loc[str(path)]
+        for metric, value in evaluate(model, df).items():
+            assert row[metric] == pytest.approx(value)
+
+    assert len(pairwise) == 3
+    first = pairwise.iloc[0]
+    assert (first["model_a"], first["model_b"]) == (str(paths[1]), str(paths[0]))
+    assert first["mean_loss_difference"] < 0
+    assert (pairwise["p_value"] < 0.01).all()
+
+
+def test_compare_models_missing_metric(tmp_path):
+    df = _test_data(100)
+    paths = []
+    for i, params in enumerate([(np.nan, np.nan), (700, -35)]):
+        model = Model()
+        model.params = np.array(params)
+        save_model(model, tmp_path / f"model-{i}.joblib")
+        paths.append(tmp_path / f"model-{i}.joblib")
+
+    ranking, pairwise = compare_models(df, paths, n_workers=1)
+
+    assert ranking["model"].tolist() == [str(paths[1]), str(paths[0])]
+    assert ranking["rank"].tolist() == [1, 2]
+    assert np.isnan(ranking["root_mean_squared_error"].iloc[1])
+    assert len(pairwise) == 1
+
+
+def test_diebold_mariano():
+    rng = np.random.default_rng(0)
+    n = 2000
+    # Autocorrelated loss differential with zero mean
+    noise = np.convolve(rng.normal(0, 1, n + 9), np.ones(10) / 10, mode="valid")
+    base = rng.uniform(1, 2, n)
+    losses = np.stack([base, base + noise, base + 1 + noise])
+
+    mean_difference, statistic, p_value = diebold_mariano(losses, max_lag=10)
+
+    np.testing.assert_allclose(mean_difference, -mean_difference.T)
+    np.testing.assert_allclose(statistic, -statistic.T)
+    assert p_value[0, 1] > 0.05
+    assert p_value[0, 2] < 1e-6
+    assert np.isnan(statistic[0, 0]) and p_value[0, 0] == 1
+
+    # Matches direct estimate of a single pair
+    d = losses[0] - losses[1]
+    dc = d - d.mean()
+    long_run = dc @ dc / n + sum(
+        2 * (1 - lag / 11) * (dc[lag:] @ dc[:-lag]) / n for lag in range(1, 11)
+    )
+    assert statistic[0, 1] == pytest.approx(d.mean() / np.sqrt(long_run / n))
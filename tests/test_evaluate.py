@@ -1,8 +1,10 @@
 import json
 
+import numpy as np
+import pytest
 from pandas import DataFrame
 
-from dh_modelling.evaluate import evaluate, save_metrics
+from dh_modelling.evaluate import MetricsAccumulator, evaluate, save_metrics
 from dh_modelling.model import Model
 
 
@@ -41,3 +43,27 @@ def test_save_metrics(tmp_path):
         received = json.load(f)
 
     assert received == metrics
+
+
+def test_metrics_accumulator():
+    model = Model()
+    model.params = np.array([700.0, -35.0])
+    df = DataFrame(
+        {
+            "dh_MWh": [1100.0, 950.0, 700.0, 690.0, 1500.0],
+            "Ilman lämpötila (degC)": [5.0, 10.0, 20.0, 18.0, -5.0],
+        }
+    )
+    expected = evaluate(model, df)
+
+    accumulator = MetricsAccumulator()
+    for batch in [df.iloc[:2], df.iloc[2:]]:
+        accumulator.update(
+            batch["dh_MWh"].to_numpy(), model.predict(model.feature_matrix(batch))
+        )
+
+    received = accumulator.result()
+
+    assert received.keys() == expected.keys()
+    for key, value in expected.items():
+        assert received[key] == pytest.approx(value)
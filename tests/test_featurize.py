@@ -1,8 +1,8 @@
 import numpy as np
-from pandas import DataFrame, DatetimeIndex, to_datetime
+from pandas import DataFrame, DatetimeIndex, Index, date_range, to_datetime
 from pandas.testing import assert_frame_equal
 
-from dh_modelling.featurize import featurize
+from dh_modelling.featurize import featurize, holiday_calendar, is_business_day
 
 
 def test_featurize():
@@ -29,14 +29,45 @@ def test_featurize():
     df_input = df_input.drop("date_time", axis=1)
 
     expected = df_input.copy()
-    expected["hour_of_day"] = np.array([2, 3, 4, 5]).astype(np.int64)
-    expected["day_of_week"] = np.array([0, 0, 0, 0]).astype(np.int64)
-    expected["day_of_year"] = np.array([335, 335, 335, 335]).astype(np.int64)
+    expected["hour_of_day"] = np.array([2, 3, 4, 5]).astype(np.int8)
+    expected["day_of_week"] = np.array([0, 0, 0, 0]).astype(np.int8)
+    expected["day_of_year"] = np.array([335, 335, 335, 335]).astype(np.int16)
     expected["epoch_seconds"] = np.array(
         [1417392000, 1417395600, 1417399200, 1417402800]
     ).astype(np.int64)
-    expected["is_business_day"] = np.array([1, 1, 1, 1])
+    expected["is_business_day"] = np.array([1, 1, 1, 1]).astype(np.int8)
 
     received: DataFrame = featurize(df_input)
 
     assert_frame_equal(received, expected)
+
+
+def test_featurize_utc_epoch():
+    idx = date_range("2020-03-27", "2020-04-14", freq="H", tz="UTC", name="date_time")
+    df_local = DataFrame({"dh_MWh": np.arange(len(idx), dtype=float)}, index=idx)
+    df_local.index = df_local.index.tz_convert("Europe/Helsinki")
+    df_epoch = DataFrame(
+        {"dh_MWh": np.arange(len(idx), dtype=float)},
+        index=Index(idx.asi8 // 10**9, name="date_time"),
+    )
+
+    expected = featurize(df_local)
+    received = featurize(df_epoch)
+
+    assert_frame_equal(received.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_is_business_day_holiday_calendar():
+    dates = np.array(["2017-12-29", "2017-12-30", "2018-01-01"], dtype="M8[D]")
+    calendar = holiday_calendar("Finland", 2017, 2018)
+
+    assert np.datetime64("2018-01-06") in calendar
+    np.testing.assert_array_equal(
+        is_business_day(dates, holiday_dates=calendar), [True, False, False]
+    )
+
+
+def test_is_business_day_holiday_on_last_date():
+    dates = np.array(["2017-12-29", "2018-01-01"], dtype="M8[D]")
+
+    np.testing.assert_array_equal(is_business_day(dates), [True, False])
@@ -0,0 +1,148 @@
+import pytest
+
+from dh_modelling.fetch import FetchError, FmiFetcher
+from dh_modelling.mock_fmi import MockFmiServer
+from dh_modelling.prepare import FmiData
+
+META_HEADER = "Havaintoasema,Asemakoodi,Latitudi (desimaaliasteita),Longitudi (desimaaliasteita),Alkuhetki,Loppuhetki,Datan luontihetki"
+
+
+def _write_station_files(directory, file_id, year, created="2021-04-10T19:51:25.231Z"):
+    (directory / f"csv-meta-{file_id}.csv").write_text(
+        f"""{META_HEADER}
+Helsinki Kaisaniemi,100971,60.17523,24.94459,{year}-01-01T00:00:00.000Z,{year + 1}-01-01T00:00:00.000Z,{created}""",
+        "utf8",
+    )
+    rows = "\n".join(
+        f"{year},1,{day},{hour:02d}:00,UTC,{day - hour / 10:.1f}"
+        for day in range(1, 29)
+        for hour in range(24)
+    )
+    (directory / f"csv-{file_id}.csv").write_text(
+        f"Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)\n{rows}", "utf8"
+    )
+
+
+@pytest.fixture
+def remote(tmp_path):
+    directory = tmp_path / "remote"
+    directory.mkdir()
+    for i, year in enumerate(range(2015, 2021)):
+        _write_station_files(directory, f"f{i}", year)
+    return directory
+
+
+def test_fetch(tmp_path, remote):
+    local = tmp_path / "local"
+    file_ids = [f"f{i}" for i in range(6)]
+
+    with MockFmiServer(remote) as server:
+        results = FmiFetcher(server.url, local, max_concurrency=2).fetch(file_ids)
+
+    assert [r.status for r in results] == ["downloaded"] * 6
+    for file_id in file_ids:
+        for name in [f"csv-meta-{file_id}.csv", f"csv-{file_id}.csv"]:
+            assert (local / name).read_bytes() == (remote / name).read_bytes()
+    assert server.connections <= 2
+    assert (
+        FmiData.read_fmi_files(local, "Helsinki Kaisaniemi")
+        .load_and_clean()
+        .equals(FmiData.read_fmi_files(remote, "Helsinki Kaisaniemi").load_and_clean())
+    )
+
+
+def test_fetch_skip_unchanged(tmp_path, remote):
+    local = tmp_path / "local"
+
+    with MockFmiServer(remote) as server:
+        FmiFetcher(server.url, local).fetch(["f0", "f1"])
+        _write_station_files(remote, "f1", 2016, created="2022-01-01T00:00:00.000Z")
+        server.requests.clear()
+        results = FmiFetcher(server.url, local).fetch(["f0", "f1"])
+
+    assert [r.status for r in results] == ["skipped", "downloaded"]
+    assert sorted(path for path, _ in server.requests) == [
+        "/csv-f1.csv",
+        "/csv-meta-f0.csv",
+        "/csv-meta-f1.csv",
+    ]
+    assert (local / "csv-meta-f1.csv").read_bytes() == (
+        remote / "csv-meta-f1.csv"
+    ).read_bytes()
+
+
+def test_fetch_resume(tmp_path, remote):
+    local = tmp_path / "local"
+
+    with MockFmiServer(remote, fail_after_bytes=1000) as server:
+        results = FmiFetcher(server.url, local).fetch(["f0"])
+
+    assert results[0].status == "resumed"
+    assert ("/csv-f0.csv", "bytes=1000-") in server.requests
+    assert (local / "csv-f0.csv").read_bytes() == (remote / "csv-f0.csv").read_bytes()
+    assert not list(local.glob("*.part"))
+
+
+def test_fetch_restart_changed_partial(tmp_path, remote):
+    local = tmp_path / "local"
+    local.mkdir()
+    (local / "csv-meta-f0.csv.part").write_bytes(b"outdated")
+    (local / "csv-f0.csv.part").write_bytes(b"outdated content")
+
+    with MockFmiServer(remote) as server:
+        results = FmiFetcher(server.url, local).fetch(["f0"])
+
+    assert results[0].status == "downloaded"
+    assert (local / "csv-f0.csv").read_bytes() == (remote / "csv-f0.csv").read_bytes()
+
+
+def test_fetch_restart_unsatisfiable_range(tmp_path, remote):
+    local = tmp_path / "local"
+    local.mkdir()
+    (local / "csv-meta-f0.csv.part").write_bytes(
+        (remote / "csv-meta-f0.csv").read_bytes()
+    )
+    (local / "csv-f0.csv.part").write_bytes(
+        (remote / "csv-f0.csv").read_bytes() + b"\nlonger than remote"
+    )
+
+    with MockFmiServer(remote) as server:
+        results = FmiFetcher(server.url, local).fetch(["f0"])
+
+    assert results[0].status == "downloaded"
+    assert (local / "csv-f0.csv").read_bytes() == (remote / "csv-f0.csv").read_bytes()
+
+
+def test_fetch_missing(tmp_path, remote):
+    with MockFmiServer(remote) as server:
+        with pytest.raises(FetchError):
+            FmiFetcher(server.url, tmp_path / "local").fetch(["f0", "missing"])
+
+    assert (tmp_path / "local" / "csv-f0.csv").is_file()
+
+
+def test_connection_reuse(tmp_path, remote):
+    local = tmp_path / "local"
+
+    with MockFmiServer(remote) as server:
+        FmiFetcher(server.url, local, max_concurrency=1).fetch(
+            [f"f{i}" for i in range(6)]
+        )
+
+    assert len(server.requests) == 12
+    assert server.connections == 1
+
+
+def test_fetch_url_template(tmp_path, remote):
+    local = tmp_path / "local"
+    (remote / "csv-meta-f0.csv").rename(remote / "f0-meta.csv")
+
+    with MockFmiServer(remote) as server:
+        FmiFetcher(
+            server.url, local, meta_url_template="{base_url}/{file_id}-meta.csv"
+        ).fetch(["f0"])
+
+    assert ("/f0-meta.csv", None) in server.requests
+    assert (local / "csv-meta-f0.csv").read_bytes() == (
+        remote / "f0-meta.csv"
+    ).read_bytes()
@@ -1,7 +1,12 @@
-from pandas import DataFrame, DatetimeIndex, to_datetime
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, read_feather, to_datetime
 from pandas.testing import assert_frame_equal
 
-from dh_modelling.helpers import load_intermediate, save_intermediate
+from dh_modelling.helpers import (
+    IntermediateWriter,
+    load_intermediate,
+    save_intermediate,
+)
 
 
 def test_save_and_load_intermediate(tmp_path):
@@ -29,3 +34,55 @@ def test_save_and_load_intermediate(tmp_path):
     received: DataFrame = load_intermediate(fpath)
 
     assert_frame_equal(original, received)
+
+
+def test_intermediate_writer(tmp_path):
+    original = DataFrame(
+        data={
+            "dh_MWh": [958.673, 930.965, 921.5],
+            "hour_of_day": [0, 1, 3],
+        },
+        index=DatetimeIndex(
+            to_datetime(
+                [
+                    "2015-03-29 00:00:00+02:00",
+                    "2015-03-29 01:00:00+02:00",
+                    "2015-03-29 04:00:00+03:00",
+                ],
+                utc=True,
+            ),
+            name="date_time",
+        ).tz_convert("Europe/Helsinki"),
+    )
+
+    fpath = tmp_path / "test.feather"
+    with IntermediateWriter(fpath) as writer:
+        writer.write(original.iloc[:2])
+        writer.write(original.iloc[2:])
+
+    received: DataFrame = load_intermediate(fpath)
+
+    assert_frame_equal(original, received, check_names=False)
+
+
+def test_save_and_load_intermediate_utc_epoch(tmp_path):
+    original = DataFrame(
+        data={"dh_MWh": [958.673, 930.965]},
+        index=DatetimeIndex(
+            to_datetime(
+                ["2015-03-29 00:00:00+02:00", "2015-03-29 04:00:00+03:00"], utc=True
+            ),
+            name="date_time",
+        ).tz_convert("Europe/Helsinki"),
+    )
+    fpath = tmp_path / "test.feather"
+    save_intermediate(original, path=fpath)
+
+    received: DataFrame = load_intermediate(fpath, utc_epoch=True)
+
+    assert received.index.dtype == np.int64
+    assert list(received.index) == [1427580000, 1427590800]
+
+    epoch_path = tmp_path / "epoch.feather"
+    save_intermediate(received, path=epoch_path)
+    assert_frame_equal(read_feather(epoch_path), read_feather(fpath))
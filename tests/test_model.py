@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 
 from dh_modelling.model import Model, load_model, save_model
 
@@ -24,3 +25,109 @@ def test_model():
     model.fit(X, y)
     assert isinstance(model.params, np.ndarray)
     assert model.predict(np.array([10, 25])).shape == (2,)
+
+
+def test_model_hinge_temperature():
+    model = Model(hinge_temperature=10)
+    model.params = np.array([300.0, -50.0])
+
+    received = model.predict(np.array([0.0, 10.0, 20.0]))
+
+    np.testing.assert_allclose(received, [800.0, 300.0, 300.0])
+
+
+def test_model_fit_batches():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-25, 30, 100)
+    y = np.where(X < 17, 700 - 35 * (X - 17), 700) + rng.normal(0, 10, 100)
+
+    expected = Model()
+    expected.fit(X, y)
+
+    model = Model()
+    model.fit_batches((X[i : i + 30], y[i : i + 30]) for i in range(0, 100, 30))
+
+    np.testing.assert_allclose(model.params, expected.params, rtol=1e-6)
+
+
+def test_model_fit_batches_non_finite():
+    model = Model()
+    with pytest.raises(ValueError):
+        model.fit_batches([(np.array([1.0, np.nan]), np.array([1.0, 2.0]))])
+
+
+def test_model_partial_fit():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-25, 30, 200)
+    y = np.where(X < 17, 700 - 35 * (X - 17), 700) + rng.normal(0, 10, 200)
+
+    expected = Model()
+    expected.fit(X, y)
+
+    model = Model()
+    model.fit(X[:50], y[:50])
+    for i in range(50, 200):
+        model.partial_fit(X[i], y[i])
+
+    np.testing.assert_allclose(model.params, expected.params, rtol=1e-6)
+
+
+def test_model_partial_fit_cold_start():
+    model = Model()
+    model.partial_fit(np.array([20.0, 25.0]), np.array([700.0, 700.0]))
+    assert not hasattr(model, "params")
+
+    model.partial_fit(np.array([-3.0, 7.0]), np.array([1300.0, 1000.0]))
+    np.testing.assert_allclose(model.params, [700.0, -30.0], rtol=1e-6)
+
+
+def test_model_partial_fit_forgetting():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-25, 15, 100)
+    y = 700 - 35 * (X - 17) + rng.normal(0, 10, 100)
+    forgetting_factor = 0.95
+
+    online = Model(forgetting_factor=forgetting_factor)
+    online.partial_fit(X[:40], y[:40])
+    for i in range(40, 100):
+        online.partial_fit(X[i], y[i])
+
+    weights = forgetting_factor ** np.arange(99, -1, -1)
+    A = online._design_matrix(X)
+    expected = np.linalg.solve((A * weights[:, None]).T @ A, (A.T * weights) @ y)
+    np.testing.assert_allclose(online.params, expected, rtol=1e-8)
+
+
+def test_model_partial_fit_saved(tmp_path):
+    X = np.array([-20.0, 0, 15, 20, 30])
+    y = np.array([2200.0, 1000, 400, 300, 300])
+    model = Model(forgetting_factor=0.9)
+    model.fit(X, y)
+
+    save_model(model, tmp_path / "model.joblib")
+    received = load_model(tmp_path / "model.joblib")
+    model.partial_fit(np.array([5.0]), np.array([800.0]))
+    received.partial_fit(np.array([5.0]), np.array([800.0]))
+
+    np.testing.assert_array_equal(received.params, model.params)
+
+
+def test_model_invalid_forgetting_factor():
+    with pytest.raises(ValueError):
+        Model(forgetting_factor=0)
+
+
+def test_load_model_saved_without_update_state(tmp_path):
+    # Models saved by the first version have only fitted parameters
+    model = Model.__new__(Model)
+    model.__dict__ = {"params": np.array([700.0, -35.0])}
+    save_model(model, tmp_path / "model.joblib")
+
+    received = load_model(tmp_path / "model.joblib")
+
+    assert received.hinge_temperature == 17
+    assert received.forgetting_factor == 1.0
+    np.testing.assert_array_equal(received.predict(np.array([7.0])), [1050.0])
+    np.testing.assert_array_equal(received.predict(np.array([17.0])), [700.0])
+    with pytest.raises(ValueError, match="retrain"):
+        received.partial_fit(np.array([5.0]), np.array([800.0]))
@@ -0,0 +1,184 @@
+import importlib.util
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from dh_modelling.pipeline import (
+    PACKAGE_DIR,
+    DigestCache,
+    Node,
+    Pipeline,
+    build_pipeline,
+    critical_path,
+)
+
+
+def _concatenate(inputs: list[Path], output: Path, text: str = ""):
+    time.sleep(0.05)
+    output.write_text("".join(p.read_text() for p in inputs) + text)
+
+
+def _fail(output: Path):
+    raise RuntimeError("broken")
+
+
+def _node(name: str, inputs: list[Path], output: Path, **kwargs) -> Node:
+    return Node(
+        name,
+        _concatenate,
+        dict(inputs=inputs, output=output, text=name),
+        inputs=inputs,
+        outputs=[output],
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def diamond(tmp_path) -> Pipeline:
+    source = tmp_path / "source.txt"
+    source.write_text("x")
+    paths = {name: tmp_path / f"{name}.txt" for name in "abcd"}
+    return Pipeline(
+        [
+            _node("d", [paths["b"], paths["c"]], paths["d"]),
+            _node("a", [source], paths["a"]),
+            _node("b", [paths["a"]], paths["b"]),
+            _node("c", [paths["a"]], paths["c"]),
+        ]
+    )
+
+
+def test_pipeline_run(diamond, tmp_path):
+    assert diamond.order == ["a", "b", "c", "d"]
+    assert diamond.upstream["d"] == ["b", "c"]
+
+    report = diamond.run(tmp_path / "state", max_cpus=2)
+
+    assert (tmp_path / "d.txt").read_text() == "xabxacd"
+    assert {r.status for r in report.runs.values()} == {"run"}
+    assert report.runs["d"].start >= report.runs["c"].end
+    assert report.critical_path in (["a", "b", "d"], ["a", "c", "d"])
+    assert report.critical_path_seconds >= 0.15
+    assert min(report.slack.values()) == pytest.approx(0)
+
+    # Unchanged content is skipped, also with new modification time
+    os.utime(tmp_path / "source.txt")
+    report = diamond.run(tmp_path / "state", max_cpus=2)
+    assert {r.status for r in report.runs.values()} == {"skipped"}
+
+    # Changed output reruns its node, and unchanged results stop propagation
+    (tmp_path / "b.txt").write_text("changed")
+    report = diamond.run(tmp_path / "state", max_cpus=2)
+    assert [n for n, r in report.runs.items() if r.status == "run"] == ["b"]
+
+    (tmp_path / "source.txt").write_text("y")
+    report = diamond.run(tmp_path / "state", max_cpus=2)
+    assert {r.status for r in report.runs.values()} == {"run"}
+    assert (tmp_path / "d.txt").read_text() == "yabyacd"
+
+
+def test_pipeline_memory_budget(diamond, tmp_path):
+    for node in diamond.nodes.values():
+        node.memory_mb = 60
+
+    report = diamond.run(tmp_path / "state", max_cpus=4, max_memory_mb=100)
+
+    b, c = report.runs["b"], report.runs["c"]
+    assert b.end <= c.start or c.end <= b.start
+
+
+def test_pipeline_failure(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text("x")
+    pipeline = Pipeline(
+        [
+            Node(
+                "a",
+                _fail,
+                dict(output=tmp_path / "a.txt"),
+                inputs=[source],
+                outputs=[tmp_path / "a.txt"],
+            ),
+            _node("b", [tmp_path / "a.txt"], tmp_path / "b.txt"),
+            _node("c", [source], tmp_path / "c.txt"),
+        ]
+    )
+
+    report = pipeline.run(tmp_path / "state", max_cpus=2)
+
+    assert report.failed == ["a"]
+    assert "broken" in report.runs["a"].error
+    assert report.runs["b"].status == "blocked"
+    assert report.runs["c"].status == "run"
+
+
+def test_node_key_action_source(tmp_path):
+    module_path = tmp_path / "actions.py"
+    module_path.write_text("def action(output):\n    pass\n")
+    spec = importlib.util.spec_from_file_location("actions", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    node = Node("a", module.action, {}, inputs=[], outputs=[tmp_path / "a.txt"])
+    pipeline = Pipeline([node])
+
+    key = pipeline.node_key(node, DigestCache())
+    module_path.write_text("def action(output):\n    return None\n")
+
+    assert pipeline.node_key(node, DigestCache()) != key
+
+
+def test_pipeline_invalid(tmp_path):
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline([_node("a", [b], a), _node("b", [a], b)])
+    with pytest.raises(ValueError, match="also output"):
+        Pipeline([_node("a", [], a), _node("b", [], a)])
+
+
+def test_critical_path():
+    upstream = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": []}
+    seconds = {"a": 1.0, "b": 3.0, "c": 1.0, "d": 2.0, "e": 4.0}
+
+    path, length, slack = critical_path(upstream, seconds)
+
+    assert path == ["a", "b", "d"]
+    assert length == 6.0
+    assert slack == {"a": 0.0, "b": 0.0, "c": 2.0, "d": 0.0, "e": 2.0}
+
+
+def test_build_pipeline(tmp_path):
+    params = {
+        "prepare": {"split": 0.2},
+        "quality": {"max_gap_hours": 3, "flatline_hours": 12, "outlier_threshold": 6},
+        "train": {
+            "model_type": "hinge",
+            "hinge_temperature": 17,
+            "forgetting_factor": 1.0,
+        },
+    }
+    sites = {
+        name: {
+            "fmi_station_name": station,
+            "generation": {"raw_file_path": tmp_path / f"{name}.csv"},
+        }
+        for name, station in [("a", "X"), ("b", "Y"), ("c", "X")]
+    }
+    sites["b"]["params"] = {"train": {"hinge_temperature": 16}}
+    sites["c"]["params"] = {"train": {"model_type": "boosted", "cpus": 2}}
+
+    pipeline = build_pipeline(sites, params, tmp_path / "fmi", tmp_path / "work")
+
+    assert len(pipeline.nodes) == 2 + 1 + 3 * 6
+    assert pipeline.upstream["prepare[a]"] == ["weather[X]"]
+    assert pipeline.upstream["prepare[c]"] == ["weather[X]"]
+    assert pipeline.upstream["featurize[b]"] == ["holidays[Finland]", "quality[b]"]
+    assert pipeline.upstream["evaluate[a]"] == ["split[a]", "train[a]"]
+    assert pipeline.nodes["train[a]"].kwargs["hinge_temperature"] == 17
+    assert pipeline.nodes["train[b]"].kwargs["hinge_temperature"] == 16
+    assert params["train"]["hinge_temperature"] == 17
+    assert PACKAGE_DIR / "helpers.py" in pipeline.nodes["split[a]"].inputs
+    assert pipeline.nodes["train[a]"].cpus == 1
+    assert pipeline.nodes["train[c]"].cpus == 2
+    assert pipeline.nodes["train[c]"].kwargs["n_jobs"] == 2
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+
+from dh_modelling import plotting
+from dh_modelling.helpers import save_intermediate
+from dh_modelling.model import Model, save_model
+from dh_modelling.plotting import (
+    SeriesPyramid,
+    dataset_pyramids,
+    lttb,
+    minmax_downsample,
+    plot_dataset,
+)
+
+
+def _series(n: int = 10_000) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    x = 1_600_000_000 + 3600 * np.arange(n, dtype=np.int64)
+    y = np.cumsum(rng.normal(size=n))
+    y[n // 8] += 100
+    y[7 * n // 8] -= 100
+    return x, y
+
+
+def test_minmax_downsample():
+    x = np.arange(7)
+    y = np.array([3.0, 1.0, 2.0, np.nan, 5.0, np.nan, np.nan])
+
+    received_x, received_y = minmax_downsample(x, y, 3)
+
+    np.testing.assert_array_equal(received_x, [0, 1, 4, 4, 6, 6])
+    np.testing.assert_array_equal(received_y, [3, 1, 5, 5, np.nan, np.nan])
+
+
+def test_lttb():
+    x, y = _series()
+
+    received_x, received_y = lttb(x, y, 100)
+
+    assert len(received_x) == 100
+    assert received_x[0] == x[0] and received_x[-1] == x[-1]
+    assert np.all(np.diff(received_x) > 0)
+    assert y.max() in received_y and y.min() in received_y
+
+
+def test_pyramid_query(tmp_path):
+    x, y = _series()
+    SeriesPyramid.build(x, y, factor=4).save(tmp_path / "pyramid")
+    pyramid = SeriesPyramid.open(tmp_path / "pyramid")
+
+    assert len(pyramid.levels) > 3
+    assert isinstance(pyramid.levels[-1][0], np.memmap)
+
+    received_x, received_y = pyramid.query(n_pixels=50)
+    assert len(received_x) <= 100
+    assert y.max() in received_y and y.min() in received_y
+
+    # Narrow range is read from full resolution level
+    start, end = x[1000], x[1099]
+    received_x, received_y = pyramid.query(start, end, n_pixels=200)
+    np.testing.assert_array_equal(received_x, x[1000:1100])
+    np.testing.assert_array_equal(received_y, y[1000:1100])
+
+    received_x, received_y = pyramid.query(start, x[2000], n_pixels=50, method="lttb")
+    assert received_x[0] >= start and received_x[-1] <= x[2000]
+    assert y[1250] in received_y
+
+    with pytest.raises(ValueError):
+        pyramid.query(method="unknown")
+
+
+@pytest.fixture
+def features_path(tmp_path):
+    x, y = _series(500)
+    df = DataFrame(
+        {
+            "dh_MWh": 500 + y,
+            "Ilman lämpötila (degC)": y / 10,
+            "hour_of_day": 0,
+            "day_of_week": 0,
+            "day_of_year": 1,
+            "epoch_seconds": x,
+            "is_business_day": 1,
+        },
+        index=date_range(
+            "2020-01-01", periods=500, freq="H", tz="UTC", name="date_time"
+        ),
+    )
+    path = tmp_path / "features.feather"
+    save_intermediate(df, path, schema="features")
+    return path
+
+
+def test_dataset_pyramids_cache(features_path, tmp_path, monkeypatch):
+    model = Model()
+    model.params = np.array([700.0, -35.0])
+    model_path = tmp_path / "model.joblib"
+    save_model(model, model_path)
+    cache_dir = tmp_path / "cache"
+
+    built = dataset_pyramids(features_path, model_path, cache_dir=cache_dir)
+    assert set(built) == {"dh_MWh", "Ilman lämpötila (degC)", "prediction", "residual"}
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Input read on cache hit")
+
+    monkeypatch.setattr(plotting, "load_intermediate", fail)
+    cached = dataset_pyramids(features_path, model_path, cache_dir=cache_dir)
+    for name, pyramid in built.items():
+        for (x0, y0), (x1, y1) in zip(pyramid.levels, cached[name].levels):
+            np.testing.assert_array_equal(x0, x1)
+            np.testing.assert_array_equal(y0, y1)
+
+
+def test_plot_dataset(features_path, tmp_path):
+    pyramids = dataset_pyramids(features_path)
+
+    figure = plot_dataset(pyramids, width_px=400, method="lttb")
+
+    assert len(figure.axes) == 3
+    figure.savefig(tmp_path / "plot.png")
+    assert (tmp_path / "plot.png").stat().st_size > 0
@@ -1,10 +1,19 @@
 from datetime import datetime, timezone
 from io import StringIO
 
-from pandas import DataFrame, DatetimeIndex, read_csv, to_datetime
+import numpy as np
+import pytest
+from pandas import DataFrame, DatetimeIndex, concat, date_range, read_csv, to_datetime
 from pandas.testing import assert_frame_equal
 
-from dh_modelling.prepare import FmiData, FmiMeta, GenerationData, merge_dataframes
+from dh_modelling.prepare import (
+    FmiData,
+    FmiMeta,
+    GenerationData,
+    MultiSiteGenerationData,
+    merge_dataframes,
+    resample_hourly,
+)
 
 
 def test_read_fmi_files(tmp_path):
@@ -210,3 +219,228 @@ Helsinki Kaisaniemi,100971,60.17523,24.94459,2018-01-01T01:00:00.000Z,2019-01-01
     assert fm.creation_time == datetime(
         2021, 4, 10, 19, 51, 25, 231000, tzinfo=timezone.utc
     )
+
+
+def test_load_batches(tmp_path):
+    raw_file_path = tmp_path / "test.csv"
+    raw_file_path.write_text(
+        """date_time;dh_MWh
+29.3.2015 2:00;919,913
+29.3.2015 4:00;913,885
+29.3.2015 5:00;908,093
+25.10.2020 2:00;848,808
+25.10.2020 3:00;851,583
+25.10.2020 3:00;842,317
+25.10.2020 4:00;840,123
+"""
+    )
+    g = GenerationData(raw_file_path)
+    expected = g.load_and_clean()
+
+    for batch_size in [1, 2, 3, 5]:
+        batches = list(g.load_batches(batch_size))
+        assert max(len(b) for b in batches) <= batch_size
+        assert_frame_equal(concat(batches), expected)
+
+    assert g.count_rows() == 7
+
+
+def test_load_batches_fmi(tmp_path):
+    header = "Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilmanpaine (msl) (hPa),Ilman lämpötila (degC)"
+    file_path_1 = tmp_path / "test1.csv"
+    file_path_1.write_text(
+        f"""{header}
+2014,12,1,06:00,UTC,1032.7,
+2014,12,1,07:00,UTC,1032.7,-3.0
+2014,12,1,08:00,UTC,1032.7,
+2014,12,1,09:00,UTC,1032.7,
+2014,12,1,10:00,UTC,1032.7,-2.0
+2014,12,1,11:00,UTC,1032.7,
+2014,12,1,12:00,UTC,1032.7,
+2014,12,1,13:00,UTC,1032.7,""",
+        "utf8",
+    )
+    file_path_2 = tmp_path / "test2.csv"
+    file_path_2.write_text(
+        f"""{header}
+2014,12,1,00:00,UTC,1033.2,
+2014,12,1,01:00,UTC,1032.8,
+2014,12,1,02:00,UTC,1032.8,-4.2
+2014,12,1,03:00,UTC,1032.7,-3.1
+2014,12,1,04:00,UTC,1032.7,
+2014,12,1,05:00,UTC,1032.5,
+2014,12,1,06:00,UTC,1032.7,""",
+        "utf8",
+    )
+
+    data = FmiData("test_station", file_path_1, file_path_2)
+    expected = data.load_and_clean()
+
+    for batch_size in [1, 2, 3, 4, 20]:
+        received = concat(data.load_batches(batch_size))
+        assert_frame_equal(received, expected)
+
+
+def test_load_batches_fmi_unordered(tmp_path):
+    file_path = tmp_path / "test.csv"
+    file_path.write_text(
+        """Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)
+2014,12,1,00:00,UTC,-2.9
+2014,12,1,02:00,UTC,-4.2
+2014,12,1,01:00,UTC,-4""",
+        "utf8",
+    )
+
+    with pytest.raises(ValueError):
+        list(FmiData("test_station", file_path).load_batches(5))
+
+
+def test_load_batches_fmi_long_missing_run(tmp_path):
+    file_path = tmp_path / "test.csv"
+    file_path.write_text(
+        """Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)
+2014,12,1,00:00,UTC,-3.0
+2014,12,1,01:00,UTC,
+2014,12,1,02:00,UTC,
+2014,12,1,03:00,UTC,
+2014,12,1,04:00,UTC,
+2014,12,1,05:00,UTC,-1.0""",
+        "utf8",
+    )
+    data = FmiData("test_station", file_path)
+
+    received = concat(data.load_batches(1, max_pending_rows=2))
+
+    assert received["Ilman lämpötila (degC)"].tolist() == [-3, -3, -3, -3, -2, -1]
+    expected = data.load_and_clean()
+    assert_frame_equal(concat(data.load_batches(1, max_pending_rows=4)), expected)
+
+
+def test_load_fmi_without_interpolation(tmp_path):
+    file_path = tmp_path / "test.csv"
+    file_path.write_text(
+        """Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)
+2014,12,1,00:00,UTC,-2.9
+2014,12,1,01:00,UTC,
+2014,12,1,02:00,UTC,-4.2""",
+        "utf8",
+    )
+    data = FmiData("test_station", file_path)
+
+    received = data.load_and_clean(interpolate=False)
+
+    assert received["Ilman lämpötila (degC)"].isna().tolist() == [False, True, False]
+    assert_frame_equal(concat(data.load_batches(2, interpolate=False)), received)
+
+
+def test_load_fmi_not_utc(tmp_path):
+    file_path = tmp_path / "test.csv"
+    file_path.write_text(
+        """Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)
+2014,12,1,00:00,EET,-2.9""",
+        "utf8",
+    )
+
+    with pytest.raises(ValueError):
+        FmiData("test_station", file_path).load_and_clean()
+
+
+def _quarter_hourly_file(path, start, periods):
+    times = date_range(start, periods=periods, freq="15min", tz="UTC").tz_convert(
+        "Europe/Helsinki"
+    )
+    lines = [
+        f"{t.strftime('%Y-%m-%d %H:%M')},{i % 4 + 1}.5" for i, t in enumerate(times)
+    ]
+    path.write_text("aika,teho_MW\n" + "\n".join(lines), "utf8")
+    return times
+
+
+def test_resample_hourly():
+    epoch = np.array([0, 900, 1800, 2700, 3600, 4500, 10800, 11700, 12600, 13500])
+    values = np.array([1.0, 1, 1, 1, 2, 2, 3, 3, 3, np.nan])
+
+    received = resample_hourly(epoch, values)
+
+    assert received.index.tolist() == [0, 3600, 7200, 10800]
+    np.testing.assert_array_equal(received["dh_MWh"], [4.0, np.nan, np.nan, np.nan])
+
+    received = resample_hourly(epoch[::-1], values[::-1], aggregation="mean")
+    np.testing.assert_array_equal(received["dh_MWh"], [1.0, np.nan, np.nan, np.nan])
+
+
+def test_resample_hourly_invalid_resolution():
+    with pytest.raises(ValueError):
+        resample_hourly(np.array([0, 7200, 14400]), np.ones(3))
+
+
+def test_load_hourly_dst(tmp_path):
+    # Both DST transitions of 2020 in Europe/Helsinki, in local time
+    path = tmp_path / "site.csv"
+    spring = _quarter_hourly_file(path, "2020-03-28 22:00", 24)
+    data = GenerationData(
+        path,
+        sep=",",
+        decimal=".",
+        date_format="%Y-%m-%d %H:%M",
+        date_column="aika",
+        value_column="teho_MW",
+        aggregation="mean",
+    )
+
+    received = data.load_hourly()
+
+    assert received.index.tolist() == list(spring.asi8[::4] // 10**9)
+    np.testing.assert_array_equal(received["dh_MWh"], np.full(6, 3.0))
+
+    autumn = _quarter_hourly_file(path, "2020-10-24 23:00", 24)
+    received = data.load_hourly()
+    assert received.index.tolist() == list(autumn.asi8[::4] // 10**9)
+
+
+def test_multi_site_generation_data(tmp_path):
+    (tmp_path / "a.csv").write_text(
+        """date_time;dh_MWh
+1.12.2014 2:00;919,913
+1.12.2014 3:00;913,885
+1.12.2014 4:00;908,093
+""",
+        "utf8",
+    )
+    _quarter_hourly_file(tmp_path / "b.csv", "2014-12-01 01:00", 8)
+    (tmp_path / "sites.yaml").write_text(
+        """a:
+  raw_file_path: a.csv
+b:
+  raw_file_path: b.csv
+  sep: ","
+  decimal: "."
+  date_format: null
+  date_column: aika
+  value_column: teho_MW
+""",
+        "utf8",
+    )
+    loader = MultiSiteGenerationData.from_yaml(tmp_path / "sites.yaml")
+
+    wide = loader.load()
+
+    assert wide.index.equals(
+        date_range(
+            "2014-12-01 00:00", periods=3, freq="H", tz="UTC", name="date_time"
+        ).tz_convert("Europe/Helsinki")
+    )
+    np.testing.assert_array_equal(wide["a"], [919.913, 913.885, 908.093])
+    np.testing.assert_array_equal(wide["b"], [np.nan, 12.0, 12.0])
+
+    long = loader.load(layout="long", utc_epoch=True)
+
+    assert long["site"].tolist() == ["a"] * 3 + ["b"] * 3
+    assert long.index.tolist() == [1417392000, 1417395600, 1417399200] * 2
+    np.testing.assert_array_equal(long["dh_MWh"], wide.to_numpy().T.ravel())
+
+    weather = DataFrame(
+        {"Ilman lämpötila (degC)": [-2.9, -4.0, -4.2]}, index=wide.index
+    )
+    merged = merge_dataframes(df_helen=wide, df_fmi=weather)
+    assert merged.columns.tolist() == ["a", "b", "Ilman lämpötila (degC)"]
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+from pandas import DataFrame, Index, date_range
+from pandas.testing import assert_frame_equal
+
+from dh_modelling.quality import check_quality
+from dh_modelling.timeaxis import to_epoch_seconds
+
+HOUR = 3600
+START = 1_420_070_400  # 2015-01-01 00:00 UTC
+
+
+def _hourly(values: dict, hours: list[int], start: int = START) -> DataFrame:
+    index = Index(start + np.array(hours, np.int64) * HOUR, name="date_time")
+    return DataFrame(values, index=index)
+
+
+def test_clean_data_passes():
+    df = _hourly({"a": [1.0, 2.0, 3.0, 4.0]}, [0, 1, 2, 3])
+
+    received, report = check_quality(df)
+
+    assert_frame_equal(received, df)
+    assert report["duplicates"] == 0
+    assert report["gaps"]["count"] == 0
+    assert report["columns"]["a"]["interpolated"] == 0
+    assert report["rows_dropped"] == 0
+
+
+def test_duplicates_and_unsorted():
+    df = _hourly({"a": [3.0, 1.0, 2.0, 9.0]}, [2, 0, 1, 1])
+
+    received, report = check_quality(df)
+
+    assert report["duplicates"] == 1
+    assert_frame_equal(received, _hourly({"a": [1.0, 2.0, 3.0]}, [0, 1, 2]))
+
+
+def test_short_gap_interpolated():
+    df = _hourly({"a": [0.0, 1.0, np.nan, 5.0]}, [0, 1, 3, 5])
+
+    received, report = check_quality(df, max_gap_steps=3)
+
+    expected = _hourly({"a": np.arange(6, dtype=float)}, list(range(6)))
+    assert_frame_equal(received, expected)
+    assert report["gaps"] == {"count": 2, "missing_steps": 2, "longest_steps": 1}
+    assert report["columns"]["a"]["missing"] == 1
+    assert report["columns"]["a"]["interpolated"] == 3
+
+
+def test_long_gap_not_interpolated():
+    df = _hourly({"a": [0.0, np.nan, np.nan, 3.0, 10.0]}, [0, 1, 2, 3, 10])
+
+    received, report = check_quality(df, max_gap_steps=1)
+
+    assert report["columns"]["a"]["interpolated"] == 0
+    assert report["rows_dropped"] == 2
+    assert_frame_equal(received, _hourly({"a": [0.0, 3.0, 10.0]}, [0, 3, 10]))
+
+    kept, _ = check_quality(df, max_gap_steps=1, drop_incomplete=False)
+    assert len(kept) == 5
+
+
+def test_flatlines_and_outliers():
+    rng = np.random.default_rng(0)
+    a = rng.normal(0, 1, 100)
+    a[10:25] = 0.5
+    a[50] = 100
+    df = _hourly({"a": a}, list(range(100)))
+
+    received, report = check_quality(df, flatline_steps=12, outlier_threshold=6)
+
+    assert report["columns"]["a"]["flatline_runs"] == 1
+    assert report["columns"]["a"]["flatline_points"] == 15
+    assert report["columns"]["a"]["outliers"] == 1
+    assert_frame_equal(received, df)
+
+
+def test_dst_anomaly():
+    # Generation data recorded in local time loses an hour at spring transition,
+    # 2015-03-29 01:00 UTC in Europe/Helsinki
+    transition = 1_427_590_800
+    df = _hourly({"a": [1.0, 2.0, 3.0]}, [-2, -1, 1], start=transition)
+
+    _, report = check_quality(df)
+
+    assert report["dst_anomalies"] == 1
+
+
+def test_group_column():
+    df = DataFrame(
+        {
+            "station": ["x", "x", "y", "y", "y"],
+            "a": [0.0, 2.0, 10.0, np.nan, 12.0],
+        },
+        index=Index(START + np.array([0, 2, 0, 1, 2]) * HOUR, name="date_time"),
+    )
+
+    received, report = check_quality(df, group_column="station")
+
+    assert report["duplicates"] == 0
+    assert report["gaps"]["count"] == 1
+    assert received["station"].tolist() == ["x", "x", "x", "y", "y", "y"]
+    assert received["a"].tolist() == [0.0, 1.0, 2.0, 10.0, 11.0, 12.0]
+
+
+def test_outliers_within_groups():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, 50)
+    x[20] = 20
+    y = rng.normal(100, 10, 50)
+    y[[5, 30]] = np.nan
+    z = np.ones(50)
+    z[0] = 100
+    df = DataFrame(
+        {"station": np.repeat(["x", "y", "z"], 50), "a": np.concatenate([x, y, z])},
+        index=Index(START + np.tile(np.arange(50), 3) * HOUR, name="date_time"),
+    )
+
+    _, report = check_quality(df, group_column="station", outlier_threshold=6)
+
+    # 20 is an outlier at station x, but within the spread of station y, and
+    # station z has no spread
+    assert report["columns"]["a"]["outliers"] == 1
+
+
+@pytest.mark.parametrize("timezone", ["UTC", "Europe/Helsinki"])
+def test_datetime_index(timezone):
+    index = date_range("2015-03-28 22:00", periods=6, freq="H", tz="UTC")
+    index = index.delete(2).tz_convert(timezone).rename("date_time")
+    df = DataFrame({"a": [0.0, 1.0, 3.0, 4.0, 5.0]}, index=index)
+
+    received, _ = check_quality(df)
+
+    assert received.index.tz == df.index.tz
+    np.testing.assert_array_equal(
+        to_epoch_seconds(received.index), np.arange(6) * HOUR + 1_427_580_000
+    )
+    assert received["a"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+
+from dh_modelling.boosted import BoostedModel
+from dh_modelling.model import Model
+from dh_modelling.scenario import forecast_scenarios, load_forecast, save_forecast
+
+# 2020-10-24 21:00 UTC, local midnight before DST ends in Europe/Helsinki
+START = 1_603_573_200
+
+
+def _model(y0: float, k1: float) -> Model:
+    model = Model()
+    model.params = np.array([y0, k1])
+    return model
+
+
+def _temperatures(shape: tuple[int, int, int]) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.uniform(-25, 25, shape).astype(np.float32)
+
+
+def test_forecast_scenarios():
+    temperatures = _temperatures((5, 60, 2))
+    models = [_model(700, -35), _model(300, -10)]
+
+    received = forecast_scenarios(temperatures, models, START)
+
+    # Reference from long format dataframe
+    times = date_range("2020-10-24 21:00", periods=60, freq="H", tz="UTC")
+    members, hours, sites = np.meshgrid(
+        np.arange(5), np.arange(60), np.arange(2), indexing="ij"
+    )
+    df = DataFrame(
+        {
+            "member": members.ravel(),
+            "date": times.tz_convert("Europe/Helsinki").date[hours.ravel()],
+            "hour": hours.ravel(),
+            "site": sites.ravel(),
+            "dh_MWh": np.concatenate(
+                [
+                    m.predict(temperatures[:, :, s].astype(np.float64))[..., None]
+                    for s, m in enumerate(models)
+                ],
+                axis=2,
+            ).ravel(),
+        }
+    )
+    daily = df.groupby(["member", "date", "site"])["dh_MWh"].sum()
+    expected_daily = daily.to_numpy().reshape(5, 3, 2)
+    expected_total_peak = (
+        df.groupby(["member", "hour"])["dh_MWh"].sum().groupby("member").max()
+    )
+
+    np.testing.assert_array_equal(
+        received.days, np.array(["2020-10-25", "2020-10-26", "2020-10-27"], "M8[D]")
+    )
+    np.testing.assert_array_equal(received.hours_per_day, [25, 24, 11])
+    np.testing.assert_allclose(received.daily_totals, expected_daily)
+    np.testing.assert_allclose(
+        received.peak,
+        df.groupby(["member", "site"])["dh_MWh"].max().to_numpy().reshape(5, 2),
+    )
+    np.testing.assert_allclose(received.total_peak, expected_total_peak.to_numpy())
+    np.testing.assert_allclose(
+        received.hourly_quantiles[1],
+        df.groupby(["hour", "site"])["dh_MWh"].median().to_numpy().reshape(60, 2),
+    )
+    np.testing.assert_allclose(
+        received.daily_quantiles, np.quantile(expected_daily, [0.05, 0.5, 0.95], axis=0)
+    )
+
+
+@pytest.mark.parametrize("max_tile_bytes", [1, 1000, 5000])
+def test_forecast_scenarios_tiles(max_tile_bytes):
+    temperatures = _temperatures((4, 50, 3))
+    models = [_model(700, -35)]
+
+    expected = forecast_scenarios(temperatures, models, START)
+    received = forecast_scenarios(
+        temperatures, models, START, max_tile_bytes=max_tile_bytes
+    )
+
+    np.testing.assert_allclose(received.daily_totals, expected.daily_totals)
+    np.testing.assert_array_equal(received.peak, expected.peak)
+    np.testing.assert_array_equal(received.hourly_quantiles, expected.hourly_quantiles)
+
+
+def test_forecast_scenarios_memory_mapped(tmp_path):
+    temperatures = _temperatures((3, 30, 2))
+    np.save(tmp_path / "scenarios.npy", temperatures)
+    mapped = np.load(tmp_path / "scenarios.npy", mmap_mode="r")
+
+    expected = forecast_scenarios(temperatures, [_model(700, -35)], START)
+    received = forecast_scenarios(mapped, [_model(700, -35)], START, max_tile_bytes=1)
+
+    np.testing.assert_allclose(received.daily_totals, expected.daily_totals)
+
+
+def test_forecast_scenarios_invalid():
+    temperatures = _temperatures((2, 5, 3))
+    with pytest.raises(ValueError):
+        forecast_scenarios(temperatures, [_model(700, -35)] * 2, START)
+    with pytest.raises(ValueError):
+        forecast_scenarios(temperatures[0], [_model(700, -35)], START)
+
+    temperatures[1, 2, 0] = np.nan
+    with pytest.raises(ValueError):
+        forecast_scenarios(temperatures, [_model(700, -35)], START)
+
+
+def test_forecast_scenarios_boosted_model():
+    with pytest.raises(ValueError, match="BoostedModel"):
+        forecast_scenarios(_temperatures((2, 5, 3)), [BoostedModel()], START)
+
+
+def test_save_load_forecast(tmp_path):
+    forecast = forecast_scenarios(_temperatures((2, 30, 1)), [_model(700, -35)], START)
+
+    save_forecast(forecast, tmp_path / "forecast.npz")
+    received = load_forecast(tmp_path / "forecast.npz")
+
+    np.testing.assert_array_equal(received.days, forecast.days)
+    np.testing.assert_array_equal(received.daily_quantiles, forecast.daily_quantiles)
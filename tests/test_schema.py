@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from dh_modelling.helpers import load_intermediate, save_intermediate
+from dh_modelling.model import Model
+from dh_modelling.schema import apply_schema, validate_schema
+
+
+def _features(n: int) -> DataFrame:
+    rng = np.random.default_rng(0)
+    hours = np.arange(n)
+    temperature = np.round(rng.uniform(-25, 30, n), 1)
+    dh = np.where(temperature < 17, 700 - 35 * (temperature - 17), 700)
+    return DataFrame(
+        {
+            "dh_MWh": np.round(dh + rng.normal(0, 10, n), 3),
+            "Ilman lämpötila (degC)": temperature,
+            "hour_of_day": hours % 24,
+            "day_of_week": (hours // 24) % 7,
+            "day_of_year": (hours // 24) % 365 + 1,
+            "epoch_seconds": 1_420_070_400 + hours * 3600,
+            "is_business_day": ((hours // 24) % 7 < 5).astype(np.int32),
+        },
+        index=np.int64(1_420_070_400) + hours * 3600,
+    ).rename_axis("date_time")
+
+
+def test_apply_schema():
+    df = _features(100)
+
+    received = apply_schema(df, "features")
+
+    assert received.dtypes.to_dict() == {
+        "dh_MWh": np.float32,
+        "Ilman lämpötila (degC)": np.float32,
+        "hour_of_day": np.int8,
+        "day_of_week": np.int8,
+        "day_of_year": np.int16,
+        "epoch_seconds": np.int64,
+        "is_business_day": np.int8,
+    }
+    validate_schema(received, "features")
+    # Source decimals are recovered from float32
+    np.testing.assert_array_equal(
+        np.round(received["dh_MWh"].to_numpy(np.float64), 3), df["dh_MWh"]
+    )
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [
+        ("hour_of_day", 24),
+        ("day_of_year", 0),
+        ("is_business_day", 0.5),
+        ("dh_MWh", np.nan),
+        ("Ilman lämpötila (degC)", np.inf),
+    ],
+)
+def test_apply_schema_invalid(column, value):
+    df = _features(10)
+    df[column] = df[column].astype(type(value))
+    df.loc[df.index[3], column] = value
+
+    with pytest.raises(ValueError):
+        apply_schema(df, "features")
+
+
+def test_schema_missing_column():
+    with pytest.raises(ValueError):
+        apply_schema(_features(10).drop(columns="hour_of_day"), "features")
+
+
+def test_prepared_schema_nullable():
+    df = _features(10)[["dh_MWh", "Ilman lämpötila (degC)"]]
+    df.loc[df.index[3], "Ilman lämpötila (degC)"] = np.nan
+
+    validate_schema(apply_schema(df, "prepared"), "prepared")
+    with pytest.raises(ValueError):
+        apply_schema(df, "checked")
+
+
+def test_validate_schema_dtype():
+    with pytest.raises(ValueError):
+        validate_schema(_features(10), "features")
+
+
+def test_save_load_schema(tmp_path):
+    df = _features(100)
+    path = tmp_path / "features.feather"
+
+    save_intermediate(df, path, schema="features")
+    received = load_intermediate(path, utc_epoch=True, schema="features")
+
+    assert received["day_of_year"].dtype == np.int16
+
+    save_intermediate(df, path)
+    with pytest.raises(ValueError):
+        load_intermediate(path, utc_epoch=True, schema="features")
+
+
+def test_precision_contract():
+    df = _features(5000)
+
+    wide = Model()
+    wide.fit(wide.feature_matrix(df), df["dh_MWh"].to_numpy())
+    narrow_df = apply_schema(df, "features")
+    narrow = Model()
+    narrow.fit(narrow.feature_matrix(narrow_df), narrow_df["dh_MWh"].to_numpy())
+
+    np.testing.assert_allclose(narrow.params, wide.params, rtol=1e-6)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from pandas import concat, date_range
+from pandas.testing import assert_frame_equal
+
+from dh_modelling.evaluate import evaluate
+from dh_modelling.featurize import featurize
+from dh_modelling.helpers import load_intermediate
+from dh_modelling.model import Model
+from dh_modelling.prepare import FmiData, GenerationData, merge_dataframes
+from dh_modelling.schema import apply_schema
+from dh_modelling.split import train_test_split_sorted
+from dh_modelling.streaming import merge_batches, run_streaming
+from dh_modelling.train import train
+
+
+@pytest.fixture
+def raw_files(tmp_path):
+    rng = np.random.default_rng(0)
+    utc = date_range("2020-10-24 00:00", "2020-10-26 23:00", freq="H", tz="UTC")
+    temperature = rng.uniform(-10, 25, len(utc)).round(1)
+    dh = np.where(temperature < 17, 700 - 35 * (temperature - 17), 700)
+    dh += rng.normal(0, 10, len(utc))
+
+    local = utc.tz_convert("Europe/Helsinki")
+    helen_lines = ["date_time;dh_MWh"] + [
+        f"{t.day}.{t.month}.{t.year} {t.hour}:00;" + f"{v:.3f}".replace(".", ",")
+        for t, v in zip(local, dh)
+    ]
+    helen_path = tmp_path / "helen.csv"
+    helen_path.write_text("\n".join(helen_lines))
+
+    temperature_text = [f"{v}" for v in temperature]
+    for i in [3, 4, 5, 30, 31, 50]:
+        temperature_text[i] = ""
+    fmi_paths = []
+    for name, rows in [("a", slice(0, 40)), ("b", slice(39, None))]:
+        lines = ["Vuosi,Kk,Pv,Klo,Aikavyöhyke,Ilman lämpötila (degC)"] + [
+            f"{t.year},{t.month},{t.day},{t.hour:02d}:00,UTC,{v}"
+            for t, v in zip(utc[rows], temperature_text[rows])
+        ]
+        fmi_paths.append(tmp_path / f"csv-{name}.csv")
+        fmi_paths[-1].write_text("\n".join(lines), "utf8")
+
+    return GenerationData(helen_path), FmiData("test_station", *fmi_paths)
+
+
+def test_merge_batches(raw_files):
+    generation, weather = raw_files
+    expected = merge_dataframes(generation.load_and_clean(), weather.load_and_clean())
+
+    received = list(merge_batches(generation.load_batches(5), weather.load_batches(7)))
+
+    assert max(len(b) for b in received) <= 5
+    assert_frame_equal(concat(received), expected)
+
+
+def test_merge_batches_unordered(raw_files):
+    _, weather = raw_files
+    batch = weather.load_and_clean()
+
+    with pytest.raises(ValueError):
+        list(merge_batches([batch.iloc[2:4], batch.iloc[:2]], [batch]))
+
+
+@pytest.mark.parametrize("n_weather", [0, 10])
+def test_merge_batches_short_weather(raw_files, n_weather):
+    generation, weather = raw_files
+    df_weather = weather.load_and_clean().iloc[:n_weather]
+    expected = merge_dataframes(generation.load_and_clean(), df_weather)
+
+    received = list(
+        merge_batches(generation.load_batches(5), [df_weather] if n_weather else [])
+    )
+
+    assert expected["Ilman lämpötila (degC)"].isna().sum() == len(expected) - n_weather
+    assert_frame_equal(concat(received), expected)
+
+
+@pytest.mark.parametrize("batch_size", [4, 11, 1000])
+def test_run_streaming(raw_files, tmp_path, batch_size):
+    generation, weather = raw_files
+
+    df_features = featurize(
+        merge_dataframes(generation.load_and_clean(), weather.load_and_clean())
+    )
+    df_train, df_test = train_test_split_sorted(df_features, test_size=0.25)
+    expected_model = Model()
+    train(df_train, expected_model)
+    expected_metrics = evaluate(expected_model, df_test)
+
+    model = Model()
+    features_path = tmp_path / "features.feather"
+    received_metrics = run_streaming(
+        generation,
+        weather,
+        model,
+        test_size=0.25,
+        batch_size=batch_size,
+        features_path=features_path,
+    )
+
+    assert_frame_equal(
+        load_intermediate(features_path, schema="features"),
+        apply_schema(df_features, "features"),
+        check_names=False,
+    )
+    np.testing.assert_allclose(model.params, expected_model.params, rtol=1e-6)
+    for key, value in expected_metrics.items():
+        assert received_metrics[key] == pytest.approx(value, rel=1e-6)
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from dh_modelling.sweep import (
+    SharedFrame,
+    SweepConfig,
+    _subsample,
+    _training_window,
+    load_sweep_params,
+    run_sweep,
+)
+
+
+def _generation_data(n: int, seed: int) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    temperature = rng.uniform(-25, 30, n)
+    dh = np.where(temperature < 17, 700 - 35 * (temperature - 17), 700)
+    return DataFrame(
+        {
+            "Ilman lämpötila (degC)": temperature,
+            "dh_MWh": dh + rng.normal(0, 10, n),
+            "hour_of_day": np.arange(n) % 24,
+            "epoch_seconds": 1_600_000_000 + 3600 * np.arange(n),
+        }
+    )
+
+
+def test_shared_frame():
+    df = _generation_data(10, seed=0)
+    columns = ["Ilman lämpötila (degC)", "dh_MWh"]
+
+    shared, shm = SharedFrame.create(df, columns)
+    try:
+        received, attached = shared.attach()
+        assert_frame_equal(received, df[columns])
+        with pytest.raises(ValueError):
+            received.to_numpy()[0, 0] = 1.0
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_sweep_config_grid():
+    received = SweepConfig.grid(
+        {"hinge_temperature": [16, 17], "train_window_hours": [10, None]}
+    )
+    assert received == [
+        SweepConfig(hinge_temperature=16, train_window_hours=10),
+        SweepConfig(hinge_temperature=16, train_window_hours=None),
+        SweepConfig(hinge_temperature=17, train_window_hours=10),
+        SweepConfig(hinge_temperature=17, train_window_hours=None),
+    ]
+
+
+def test_training_window():
+    df = _generation_data(10, seed=0)
+    # Drop 3 hours, the 24 hour window then has 7 rows
+    df = df.drop(index=[6, 7, 8])
+    assert len(_training_window(df, 24)) == 7
+
+    # Window of 3 hours ends at last row, and excludes the gap
+    np.testing.assert_array_equal(_training_window(df, 3).index, [9])
+
+
+def test_subsample():
+    df = _generation_data(100, seed=0)
+
+    received = _subsample(df, 0.1)
+
+    assert len(received) == 10
+    assert received.index[0] == 0
+    assert received.index[-1] == 99
+    assert_frame_equal(_subsample(df, 1.0), df)
+    assert len(_subsample(df, 0.001)) == 1
+
+
+def test_run_sweep():
+    df_train = _generation_data(500, seed=0)
+    df_test = _generation_data(100, seed=1)
+    configs = [
+        SweepConfig(hinge_temperature=-30),
+        SweepConfig(hinge_temperature=17, train_window_hours=200),
+        SweepConfig(hinge_temperature=17),
+    ]
+
+    received = run_sweep(
+        df_train,
+        df_test,
+        configs,
+        n_workers=2,
+        screening_fraction=0.5,
+        abandon_ratio=1.5,
+    )
+
+    assert list(received["status"]) == ["complete", "complete", "abandoned"]
+    assert list(received["hinge_temperature"]) == [17, 17, -30]
+    assert received["mean_absolute_error"].iloc[:2].lt(10).all()
+    assert np.isnan(received["mean_absolute_error"].iloc[2])
+    assert received["screening_mean_absolute_error"].notna().all()
+
+
+def test_run_sweep_without_screening():
+    df_train = _generation_data(200, seed=0)
+    df_test = _generation_data(50, seed=1)
+
+    received = run_sweep(df_train, df_test, [SweepConfig()], n_workers=1)
+
+    assert list(received["status"]) == ["complete"]
+    assert "screening_mean_absolute_error" not in received
+
+
+def test_load_sweep_params(tmp_path):
+    path = tmp_path / "params.yaml"
+    path.write_text(
+        "prepare:\n  split: 0.2\nsweep:\n  grid:\n    hinge_temperature: [17]\n"
+    )
+
+    assert load_sweep_params(path) == {"grid": {"hinge_temperature": [17]}}
+
+
+def test_run_sweep_boosted():
+    df_train = _generation_data(300, seed=0)
+    df_test = _generation_data(50, seed=1)
+    configs = SweepConfig.grid(
+        {
+            "model_type": ["boosted"],
+            "features": [
+                ["Ilman lämpötila (degC)"],
+                ["Ilman lämpötila (degC)", "hour_of_day"],
+            ],
+        }
+    )
+
+    received = run_sweep(df_train, df_test, configs, n_workers=2)
+
+    assert received["features"].map(len).sort_values().tolist() == [1, 2]
+    assert received["mean_absolute_error"].lt(100).all()
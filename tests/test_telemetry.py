@@ -0,0 +1,108 @@
+import json
+import pstats
+
+import numpy as np
+from pandas import DataFrame
+
+from dh_modelling.telemetry import (
+    StageTelemetry,
+    instrument,
+    peak_rss_mb,
+    record_file_read,
+    record_file_written,
+)
+
+
+@instrument()
+def _double(x: np.ndarray) -> np.ndarray:
+    return np.concatenate([x, x])
+
+
+@instrument("split_in_two")
+def _split(df: DataFrame) -> tuple[DataFrame, DataFrame]:
+    return df[:1], df[1:]
+
+
+def test_instrument_without_telemetry():
+    assert _double(np.arange(3)).shape == (6,)
+
+
+def test_stage_telemetry(tmp_path):
+    in_path = tmp_path / "in.bin"
+    in_path.write_bytes(b"x" * 100)
+    out_path = tmp_path / "out.bin"
+
+    with StageTelemetry("stage") as telemetry:
+        _double(np.arange(3))
+        _double(x=np.arange(4))
+        _split(DataFrame({"a": [1, 2, 3]}))
+        record_file_read(in_path)
+        out_path.write_bytes(b"x" * 10)
+        record_file_written(out_path)
+
+    steps, total = telemetry.steps, telemetry.total
+    assert set(steps) == {"_double", "split_in_two"}
+    assert total.calls == 1
+    assert total.bytes_read == 100
+    assert total.bytes_written == 10
+    assert total.wall_time_s >= steps["_double"].wall_time_s
+    assert steps["_double"].calls == 2
+    assert steps["_double"].rows_in == 7
+    assert steps["_double"].rows_out == 14
+    assert steps["split_in_two"].rows_in == 3
+    assert steps["split_in_two"].rows_out == 3
+    assert steps["split_in_two"].bytes_read == 0
+    assert total.process_peak_rss_mb > 0
+    assert total.peak_rss_growth_mb >= steps["_double"].peak_rss_growth_mb
+
+    telemetry_path = tmp_path / "telemetry.json"
+    telemetry.save(telemetry_path)
+    with open(telemetry_path) as f:
+        received = json.load(f)
+    assert received["stage"] == "stage"
+    assert received["total"]["calls"] == 1
+    assert received["steps"]["_double"]["rows_out"] == 14
+
+
+def test_stage_telemetry_step_named_as_stage():
+    @instrument("stage")
+    def step(x):
+        return x
+
+    with StageTelemetry("stage") as telemetry:
+        step(np.arange(2))
+
+    assert telemetry.total.calls == 1
+    assert telemetry.total.rows_in == 0
+    assert telemetry.steps["stage"].calls == 1
+    assert telemetry.steps["stage"].rows_in == 2
+
+
+def test_stage_telemetry_profile(tmp_path):
+    profile_path = tmp_path / "stage.prof"
+    with StageTelemetry("stage", profile_path=profile_path):
+        _double(np.arange(3))
+
+    stats = pstats.Stats(str(profile_path))
+    assert any(func_name == "_double" for _, _, func_name in stats.stats)
+
+
+def test_stage_telemetry_records_failing_step():
+    @instrument()
+    def fail(x):
+        raise ValueError()
+
+    with StageTelemetry("stage") as telemetry:
+        try:
+            fail(np.arange(2))
+        except ValueError:
+            pass
+
+    assert (
+        telemetry.steps["test_stage_telemetry_records_failing_step.<locals>.fail"].calls
+        == 1
+    )
+
+
+def test_peak_rss_mb():
+    assert peak_rss_mb() > 0
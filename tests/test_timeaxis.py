@@ -0,0 +1,49 @@
+import numpy as np
+from pandas import date_range
+
+from dh_modelling.timeaxis import (
+    UtcOffsetTable,
+    calendar_fields,
+    local_seconds,
+    to_datetime_index,
+    to_epoch_seconds,
+)
+
+
+def test_utc_offset_table():
+    # DST in Finland: 2020-03-29 01:00 UTC to 2020-10-25 01:00 UTC
+    start = 1577836800  # 2020-01-01 00:00 UTC
+    end = 1609459199  # 2020-12-31 23:59:59 UTC
+    table = UtcOffsetTable.for_range(start, end, "Europe/Helsinki")
+
+    np.testing.assert_array_equal(table.transitions[1:], [1585443600, 1603587600])
+    np.testing.assert_array_equal(table.offsets, [7200, 10800, 7200])
+
+    received = table.lookup(np.array([start, 1585443599, 1585443600, 1603587600]))
+    np.testing.assert_array_equal(received, [7200, 7200, 10800, 7200])
+
+
+def test_calendar_fields():
+    idx = date_range("2014-12-25", "2021-01-05", freq="37min", tz="UTC")
+    local = idx.tz_convert("Europe/Helsinki")
+
+    received = calendar_fields(to_epoch_seconds(idx), "Europe/Helsinki")
+
+    np.testing.assert_array_equal(received["hour_of_day"], local.hour)
+    np.testing.assert_array_equal(received["day_of_week"], local.day_of_week)
+    np.testing.assert_array_equal(received["day_of_year"], local.dayofyear)
+    np.testing.assert_array_equal(
+        received["date"], np.array(local.date, dtype="datetime64[D]")
+    )
+
+
+def test_local_seconds_empty():
+    assert local_seconds(np.array([], np.int64), "Europe/Helsinki").shape == (0,)
+
+
+def test_to_datetime_index():
+    idx = date_range("2020-10-24 23:00", periods=4, freq="H", tz="Europe/Helsinki")
+
+    received = to_datetime_index(to_epoch_seconds(idx), "Europe/Helsinki")
+
+    assert received.equals(idx)
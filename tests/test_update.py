@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from dh_modelling.boosted import BoostedModel
+from dh_modelling.model import Model
+from dh_modelling.update import update
+
+
+def test_update():
+    df = DataFrame(
+        {
+            "Ilman lämpötila (degC)": [-20.0, 0, 15, 20, 30],
+            "dh_MWh": [2200.0, 1000, 400, 300, 300],
+        }
+    )
+    expected = Model()
+    expected.fit(df["Ilman lämpötila (degC)"].to_numpy(), df["dh_MWh"].to_numpy())
+
+    model = Model()
+    model.fit(df["Ilman lämpötila (degC)"].to_numpy()[:3], df["dh_MWh"].to_numpy()[:3])
+    update(df.iloc[3:], model)
+
+    np.testing.assert_allclose(model.params, expected.params, rtol=1e-6)
+
+
+def test_update_boosted_model():
+    df = DataFrame({"Ilman lämpötila (degC)": [5.0], "dh_MWh": [800.0]})
+
+    with pytest.raises(ValueError, match="hinge model"):
+        update(df, BoostedModel())